@@ -0,0 +1,31 @@
+from functools import wraps
+from flask import jsonify, current_app
+from api.v1.views import app_views
+from web_app import pool_monitor, slow_request_log
+from flask_jwt_extended import jwt_required, get_current_user
+
+
+def admin_required(view):
+    """
+    Restrict a view to the users whose email is listed in ADMIN_EMAILS.
+    """
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        user = get_current_user()
+        if user.email not in current_app.config.get("ADMIN_EMAILS", []):
+            return jsonify({"error": "unauthorized access"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app_views.route("/slow-requests")
+@admin_required
+def slow_requests():
+    return jsonify({"slow_requests": slow_request_log.recent()}), 200
+
+
+@app_views.route("/pool", strict_slashes=False)
+@admin_required
+def pool():
+    return jsonify(pool_monitor.stats()), 200
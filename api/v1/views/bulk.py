@@ -0,0 +1,23 @@
+from flask import Response, jsonify, request, abort, stream_with_context
+from api.v1.views import app_views
+from web_app.bulk import MODELS, export_ndjson, import_ndjson
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+
+@app_views.route("/bulk", methods=["GET", "POST"])
+@jwt_required()
+def bulk():
+    if request.method == "GET":
+        kinds = request.args.get("type")
+        kinds = tuple(kinds.split(",")) if kinds else tuple(MODELS)
+        if not all(kind in MODELS for kind in kinds):
+            abort(400)
+        batch_size = request.args.get("batch_size", 1000, type=int)
+        return Response(stream_with_context(export_ndjson(kinds, max(batch_size, 1))),
+                        mimetype="application/x-ndjson")
+    batch_size = request.args.get("batch_size", 1000, type=int)
+    # rows are always created for the authenticated user
+    report = import_ndjson(request.stream, batch_size=max(batch_size, 1),
+                           user_id=int(get_jwt_identity()))
+    status = 201 if any(report.inserted.values()) else 400
+    return jsonify(report.to_dict()), status
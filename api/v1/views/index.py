@@ -1,6 +1,6 @@
 from flask import jsonify
 from api.v1.views import app_views
-from web_app.models import Post
+from web_app.models.stats import get_count, get_stats
 
 @app_views.route("/status", strict_slashes=False)
 def status():
@@ -9,5 +9,9 @@ def status():
 
 @app_views.route("/all_post", strict_slashes=False)
 def posts_num():
-    posts = Post.query.all()
-    return jsonify({"all_posts": len(posts)}), 200
\ No newline at end of file
+    return jsonify({"all_posts": get_count("posts")}), 200
+
+
+@app_views.route("/stats", strict_slashes=False)
+def stats():
+    return jsonify(get_stats()), 200
@@ -1,18 +1,60 @@
-from flask import jsonify, request, abort 
+from flask import jsonify, request, abort, current_app
 from api.v1.views import app_views
 from web_app.models import User, Post, Comment
-from web_app import db
+from web_app.conditional import conditional, post_version, posts_version
+from web_app.models.pagination import keyset_paginate, keyset_requested
+from web_app.models.serializers import post_schema, comment_schema
+from web_app.models.threads import load_thread, reply_parent
+from web_app import db, cache, search
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 @app_views.route("/posts")
+@conditional(posts_version)
+@cache.cached(tags=lambda: ["posts"])
 def all_posts():
-    page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 5, type=int)
-    posts = Post.query.paginate(page=page, per_page=per_page)
+    schema = post_schema.for_request(keep=(Post.date_posted, Post.id))
+    query = schema.query().filter(Post.visible())
+    if keyset_requested():
+        posts = keyset_paginate(query, (Post.date_posted, Post.id),
+                                cursor=request.args.get("cursor"), per_page=per_page,
+                                count=request.args.get("count", current_app.config["PAGINATION_COUNT"]))
+        return jsonify({
+                        "posts": schema.dump_many(posts),
+                        "meta": posts.meta()
+                        }), 200
+    page = request.args.get("page", 1, type=int)
+    posts = query.paginate(page=page, per_page=per_page)
     if not posts:
         abort(400)
     return jsonify({
-                    "posts": [post.to_dict() for post in posts],
+                    "posts": schema.dump_many(posts),
+                    "meta": {
+                        "page": posts.page,
+                        "per_page": posts.per_page,
+                        "total_page": posts.pages,
+                        "total_items": posts.total
+                        }
+                    }), 200
+
+
+@app_views.route("/search")
+@conditional(posts_version)
+@cache.cached(tags=lambda: ["posts"])
+def search_posts():
+    q = request.args.get("q", "").strip()
+    if not q:
+        abort(400)
+    schema = post_schema.for_request(keep=(Post.id,))
+
+    def load(ids):
+        rows = {row.id: row for row in schema.query().filter(Post.id.in_(ids), Post.visible())}
+        return [rows[post_id] for post_id in ids if post_id in rows]
+
+    posts = search.search(q, page=request.args.get("page", 1, type=int),
+                          per_page=request.args.get("per_page", 5, type=int), load=load)
+    return jsonify({
+                    "posts": schema.dump_many(posts),
                     "meta": {
                         "page": posts.page,
                         "per_page": posts.per_page,
@@ -23,9 +65,14 @@ def all_posts():
 
 
 @app_views.route("/posts/<int:post_id>")
+@conditional(post_version)
+@cache.cached(tags=lambda post_id: [f"post:{post_id}"])
 def get_post(post_id):
-    post = Post.query.get_or_404(post_id)
-    return jsonify(post.to_dict()), 200
+    schema = post_schema.for_request()
+    post = schema.query().filter(Post.id == post_id, Post.visible()).first()
+    if not post:
+        abort(404)
+    return jsonify(schema.dump(post)), 200
 
 @app_views.route("/posts/<int:post_id>", methods=["PUT", "PATCH", "DELETE"])
 @jwt_required()
@@ -50,18 +97,33 @@ def update_post(post_id):
 
 @app_views.route("/posts/<int:post_id>/comments", methods=["GET", "POST"])
 @jwt_required(optional=True)
+@conditional(post_version)
+@cache.cached(tags=lambda post_id: [f"post:{post_id}"])
 def post_comments(post_id):
-    post = Post.query.filter_by(id=post_id).first()
+    post = db.session.query(Post.id).filter(Post.id == post_id, Post.visible()).first()
     if not post:
         abort(404)
-    page = request.args.get("page", 1, type=int)
-    per_page = request.args.get("per_page", 5, type=int)
-    comments = Comment.query.filter_by(post_id=post_id).paginate(page=page, per_page=per_page)
-    if not comments:
-        abort(404)
     if request.method == "GET":
+        if request.args.get("thread", "").lower() in ("1", "true"):
+            return _thread_response(post_id)
+        per_page = request.args.get("per_page", 5, type=int)
+        schema = comment_schema.for_request(keep=(Comment.date_commented, Comment.id))
+        query = schema.query().filter(Comment.post_id == post_id, Comment.visible())
+        if keyset_requested():
+            comments = keyset_paginate(query, (Comment.date_commented, Comment.id),
+                                       cursor=request.args.get("cursor"), per_page=per_page,
+                                       descending=False,
+                                       count=request.args.get("count", current_app.config["PAGINATION_COUNT"]))
+            return jsonify({
+                "post_comments": schema.dump_many(comments),
+                "meta": comments.meta()
+            }), 200
+        page = request.args.get("page", 1, type=int)
+        comments = query.paginate(page=page, per_page=per_page)
+        if not comments:
+            abort(404)
         return jsonify({
-            "post_comments": [comment.to_dict() for comment in comments],
+            "post_comments": schema.dump_many(comments),
             "meta": {
                 "page": comments.page,
                 "per_page": comments.per_page,
@@ -76,15 +138,62 @@ def post_comments(post_id):
         if not "content" in data:
             return jsonify({"error": "Missing required field"}), 400
         user_id = get_jwt_identity()
-        comment = Comment(content=data["content"], post_id=post_id, user_id=user_id)
+        parent_id = data.get("parent_id")
+        if parent_id is not None:
+            parent = Comment.query.filter(Comment.id == parent_id, Comment.post_id == post_id,
+                                          Comment.visible()).first()
+            if parent is None:
+                return jsonify({"error": "parent_id is not a comment of this post"}), 400
+            parent_id = reply_parent(parent).id
+        comment = Comment(content=data["content"], post_id=post_id, user_id=user_id, parent_id=parent_id)
         db.session.add(comment)
         db.session.commit()
         return jsonify(comment.to_dict()), 201
 
 
+# columns the thread pages need, whatever fields were asked for
+THREAD_KEYS = (Comment.id, Comment.parent_id, Comment.path, Comment.depth, Comment.reply_count)
+
+
+def _dump_thread(nodes, dump):
+    return [{**dump(node.comment),
+             "replies": _dump_thread(node.replies, dump),
+             "more_replies": node.more_replies,
+             "replies_cursor": node.replies_cursor} for node in nodes]
+
+
+def _thread_response(post_id, parent=None):
+    schema = comment_schema.for_request(keep=THREAD_KEYS)
+    config = current_app.config
+    page = load_thread(schema.query(), post_id, parent=parent,
+                       cursor=request.args.get("cursor"),
+                       per_page=request.args.get("per_page", config["COMMENTS_PER_PAGE"], type=int),
+                       depth=request.args.get("depth", config["COMMENT_DEPTH"], type=int),
+                       replies=request.args.get("replies", config["COMMENT_REPLIES"], type=int))
+    return jsonify({
+        "comments": _dump_thread(page.items, schema.dump),
+        "meta": page.meta()
+    }), 200
+
+
+@app_views.route("/posts/<int:post_id>/comments/<int:comment_id>/replies")
+@conditional(lambda post_id, comment_id: post_version(post_id))
+@cache.cached(tags=lambda post_id, comment_id: [f"post:{post_id}"])
+def comment_replies(post_id, comment_id):
+    parent = (db.session.query(Comment.id, Comment.path, Comment.depth, Comment.reply_count)
+              .join(Post, Post.id == Comment.post_id)
+              .filter(Comment.id == comment_id, Comment.post_id == post_id,
+                      Comment.visible(), Post.visible()).first())
+    if not parent:
+        abort(404)
+    return _thread_response(post_id, parent)
+
+
 @app_views.route("/posts/<int:post_id>/comments/<int:comment_id>")
 def get_comment(post_id, comment_id):
-    comment = Comment.filter_by(id=comment_id, post_id=post_id).first()
+    comment = (Comment.query.join(Post, Post.id == Comment.post_id)
+               .filter(Comment.id == comment_id, Comment.post_id == post_id,
+                       Comment.visible(), Post.visible()).first())
     if not comment:
         abort(400)
     return jsonify(comment.to_dict())
@@ -1,22 +1,36 @@
-from flask import jsonify, request, abort
+from flask import jsonify, request, abort, current_app
 from api.v1.views import app_views
-from web_app import db, bcrypt
+from web_app import db, hasher, account_purger
 from web_app.models import User, Post
+from web_app.conditional import conditional, user_posts_version
+from web_app.models.pagination import keyset_paginate, keyset_requested
+from web_app.models.serializers import post_schema, user_schema
+from web_app.identity import jwt_claims
 from flask_jwt_extended import create_access_token
-from flask_jwt_extended import get_jwt_identity
+from flask_jwt_extended import get_current_user
 from flask_jwt_extended import jwt_required
 
 
 @app_views.route("/users", methods=["GET", "POST"])
 def get_users():
     if request.method == 'GET':
-        page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 5, type=int)
-        users = User.query.paginate(page=page, per_page=per_page)
+        schema = user_schema.for_request(keep=(User.id,))
+        if keyset_requested():
+            users = keyset_paginate(schema.query(), (User.id,),
+                                    cursor=request.args.get("cursor"), per_page=per_page,
+                                    descending=False,
+                                    count=request.args.get("count", current_app.config["PAGINATION_COUNT"]))
+            return jsonify({
+                            "users": schema.dump_many(users),
+                            "meta": users.meta()
+                            }), 200
+        page = request.args.get("page", 1, type=int)
+        users = schema.query().paginate(page=page, per_page=per_page)
         if not users:
             abort(404)
         return jsonify({
-                        "users": [user.to_dict() for user in users],
+                        "users": schema.dump_many(users),
                         "meta": {
                             "page": users.page,
                             "per_page": users.per_page,
@@ -39,7 +53,7 @@ def get_users():
                 return jsonify({"msg": "email is taken choose a different one"}), 400
             new_user = User(username=data["username"],
                         email=data["email"],
-                        password=bcrypt.generate_password_hash(data["password"]))
+                        password=hasher.hash(data["password"]))
             db.session.add(new_user)
             db.session.commit()
             return jsonify(new_user.to_dict()), 201
@@ -54,10 +68,11 @@ def login():
     data = request.get_json()
     if not all(field in data for field in ["email", "password"]):
         abort(400)
-    user = User.query.filter_by(email=data["email"]).first()
-    if not user or not bcrypt.check_password_hash(user.password, data["password"]):
+    user = User.query.filter_by(email=data["email"], deleted_at=None).first()
+    if not user or not user.verify_pwd(data["password"]):
         return jsonify({"error": "Invalid email or password"}), 401
-    jwt_token = create_access_token(identity=user.id)
+    db.session.commit()
+    jwt_token = create_access_token(identity=str(user.id), additional_claims=jwt_claims(user))
     return jsonify({
                 "jwt_token": jwt_token,
                 "user_id": user.id
@@ -66,7 +81,7 @@ def login():
 @app_views.route("/users/<int:user_id>", methods=["GET", "PUT", "PATCH", "DELETE"])
 @jwt_required()
 def user(user_id):
-    curr_user_id = get_jwt_identity()
+    curr_user_id = get_current_user().id
     user = User.query.get_or_404(user_id)
     if request.method == "GET":
         return jsonify(user.to_dict())
@@ -81,27 +96,40 @@ def user(user_id):
         if "email" in data:
             user.email = data["email"]
         if "password" in data:
-            user.password = bcrypt.generate_password_hash(data["password"])
+            user.set_pwd(data["password"])
         db.session.commit()
         return jsonify(user.to_dict()), 200
     elif request.method == "DELETE":
         if curr_user_id != user_id:
             return jsonify({"error": "unauthorized access"}), 403
-        db.session.delete(user)
-        db.session.commit()
-        return jsonify({}), 200
+        if account_purger.delete_account(user):
+            return jsonify({}), 200
+        # large accounts are purged in the background
+        return jsonify({"status": "scheduled"}), 202
 
 @app_views.route("/users/<int:user_id>/posts", methods=["GET", "POST"])
 @jwt_required()
+@conditional(user_posts_version)
 def user_posts(user_id):
-    user = User.query.get_or_404(user_id)
-    curr_user_id = get_jwt_identity()
+    if not db.session.query(User.id).filter_by(id=user_id).first():
+        abort(404)
+    curr_user_id = get_current_user().id
     if request.method == "GET":
-        page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 5, type=int)
-        posts = Post.query.filter_by(user_id=user_id).paginate(page=page, per_page=per_page)
+        schema = post_schema.for_request(keep=(Post.date_posted, Post.id))
+        query = schema.query().filter(Post.user_id == user_id, Post.visible())
+        if keyset_requested():
+            posts = keyset_paginate(query, (Post.date_posted, Post.id),
+                                    cursor=request.args.get("cursor"), per_page=per_page,
+                                    count=request.args.get("count", current_app.config["PAGINATION_COUNT"]))
+            return jsonify({
+                            "posts": schema.dump_many(posts),
+                            "meta": posts.meta()
+                          }), 200
+        page = request.args.get("page", 1, type=int)
+        posts = query.paginate(page=page, per_page=per_page)
         return jsonify({
-                        "posts": [post.to_dict() for post in posts],
+                        "posts": schema.dump_many(posts),
                         "meta": {
                             "page": posts.page,
                             "per_page": posts.per_page,
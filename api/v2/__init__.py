@@ -0,0 +1,56 @@
+"""
+This package is the /api/v2 app: an asynchronous ASGI sibling of the read
+endpoints of /api/v1.
+
+The v1 API runs under gunicorn, where a request holds a worker thread for as
+long as its queries take. The v2 app serves the same reads with async views on
+SQLAlchemy's asyncio extension, so a worker keeps serving other requests while
+queries wait on the database. It uses the models, serializers and pagination
+of `web_app`, and returns the same JSON as v1, except that the `meta` of offset
+pages always has `total_pages` and `total_items`.
+
+Endpoints:
+- GET /api/v2/posts
+- GET /api/v2/posts/<post_id>
+- GET /api/v2/posts/<post_id>/comments
+- GET /api/v2/users/<user_id>/posts (JWT required)
+
+Run it with an ASGI server next to the Flask app, e.g.
+`uvicorn api.v2.app:app --workers 2`, and route /api/v2 to it.
+"""
+from quart import Quart, jsonify
+from werkzeug.exceptions import BadRequest, NotFound
+from web_app.config import Config
+from api.v2.db import AsyncDatabase
+
+async_db = AsyncDatabase()
+
+
+def create_app(config_class=Config):
+    """
+    Create and configure the /api/v2 application.
+
+    Args:
+        config_class (class, optional): The configuration class to use. Defaults to Config.
+
+    Returns:
+        Quart app: The configured ASGI application instance.
+    """
+    app = Quart(__name__)
+    app.config.from_object(config_class)
+    async_db.init_app(app)
+    from api.v2 import auth
+    auth.init_app(app)
+
+    from api.v2.views import app_views
+    app.register_blueprint(app_views)
+
+    @app.errorhandler(NotFound)
+    async def not_found_error(error):
+        return jsonify({"error": "Not found"}), 404
+
+    @app.errorhandler(BadRequest)
+    async def bad_request_error(error):
+        return jsonify({"error": "Bad Request"}), 400
+
+    return app
@@ -0,0 +1,6 @@
+"""
+The /api/v2 ASGI application, e.g. `uvicorn api.v2.app:app`.
+"""
+from api.v2 import create_app
+
+app = create_app()
@@ -0,0 +1,134 @@
+"""
+This module authenticates the requests of the /api/v2 app with the JWT access
+tokens issued by POST /api/v1/login.
+
+Tokens are decoded by Flask-JWT-Extended itself, with the JWTManager of the v1
+app, so that both APIs accept the same tokens: the keys (JWT_SECRET_KEY, or
+JWT_PUBLIC_KEY for asymmetric algorithms), JWT_DECODE_ALGORITHMS, the audience
+and issuer, the leeway, the identity claim, and the blocklist and claims
+verification loaders apply alike. As Flask-JWT-Extended reads them from a Flask
+app, the v2 app keeps a bare Flask app holding its configuration for decoding.
+The checks of `verify_jwt_in_request` are run with helpers of
+`flask_jwt_extended.internal_utils`, which is not public API: requirement.txt
+pins Flask-JWT-Extended to the exact version they were checked against, and
+upgrading it means checking them again (and test_api_v2_auth.py).
+
+Tokens are only read from the header: the app refuses to start when
+JWT_TOKEN_LOCATION leaves out "headers", rather than accept tokens v1 would not.
+
+The user of a token is rebuilt from its "user" claim when it has one (see
+web_app/identity.py), or else read from the database.
+"""
+from functools import wraps
+from flask import Flask
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.config import config as jwt_config
+from flask_jwt_extended.exceptions import JWTExtendedException, RevokedTokenError, UserClaimsVerificationError
+from flask_jwt_extended.internal_utils import (custom_verification_for_token, verify_token_not_blocklisted,
+                                               verify_token_type)
+from jwt import ExpiredSignatureError, InvalidTokenError, get_unverified_header
+from quart import current_app, g, jsonify, request
+from sqlalchemy import select
+from web_app import jwt
+from web_app.identity import FIELDS, UserSnapshot
+from web_app.models import User
+from api.v2 import async_db
+
+
+def init_app(app):
+    """
+    Set up the decoding of the tokens with the configuration of the app.
+
+    Args:
+        app (Quart): The /api/v2 application instance.
+
+    Raises:
+        RuntimeError: If the tokens are not read from the headers.
+    """
+    settings = Flask(app.import_name)
+    settings.config.update(app.config)
+    jwt.init_app(settings)
+    with settings.app_context():
+        if "headers" not in jwt_config.token_location:
+            raise RuntimeError("/api/v2 only reads the tokens from the headers, "
+                               "JWT_TOKEN_LOCATION must include 'headers'")
+    app.extensions["jwt_settings"] = settings
+
+
+def _error(message, status):
+    with current_app.extensions["jwt_settings"].app_context():
+        key = jwt_config.error_msg_key
+    return jsonify({key: message}), status
+
+
+def _read_header():
+    header_name, header_type = jwt_config.header_name, jwt_config.header_type
+    header = request.headers.get(header_name, "").strip().strip(",")
+    if not header:
+        return None, (f"Missing {header_name} Header", 401)
+    if not header_type:
+        return header, None
+    scheme, _, token = header.partition(" ")
+    if scheme != header_type or not token or " " in token:
+        return None, (f"Bad {header_name} header. Expected '{header_name}: {header_type} <JWT>'", 422)
+    return token, None
+
+
+def _decode(token):
+    # the checks of verify_jwt_in_request, with the same errors
+    claims = decode_token(token)
+    header = get_unverified_header(token)
+    verify_token_type(claims, refresh=False)
+    verify_token_not_blocklisted(header, claims)
+    custom_verification_for_token(header, claims)
+    return claims
+
+
+async def _load_user(identity, claims):
+    if "user" in claims:
+        return UserSnapshot.from_claims(identity, claims["user"])
+    async with async_db.session() as session:
+        row = (await session.execute(
+            select(*(getattr(User, field) for field in FIELDS))
+            .where(User.id == int(identity), User.deleted_at.is_(None))
+        )).first()
+    return UserSnapshot.from_user(row) if row is not None else None
+
+
+def jwt_required(view):
+    """
+    Reject the requests without a valid access token of an existing user.
+    """
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        with current_app.extensions["jwt_settings"].app_context():
+            token, error = _read_header()
+            if error is not None:
+                return _error(*error)
+            try:
+                claims = _decode(token)
+            except ExpiredSignatureError:
+                return _error("Token has expired", 401)
+            except RevokedTokenError:
+                return _error("Token has been revoked", 401)
+            except UserClaimsVerificationError:
+                return _error("User claims verification failed", 400)
+            except (InvalidTokenError, JWTExtendedException) as e:
+                return _error(str(e), 422)
+            identity = claims[jwt_config.identity_claim_key]
+        user = await _load_user(identity, claims)
+        if user is None:
+            return _error(f"Error loading the user {identity}", 401)
+        g.jwt_user = user
+        return await view(*args, **kwargs)
+    return wrapper
+
+
+def get_current_user():
+    """
+    Get the user of the access token of the request, in a `jwt_required` view.
+
+    Returns:
+        UserSnapshot: The user.
+    """
+    return g.jwt_user
@@ -0,0 +1,110 @@
+"""
+This module paginates the `select()` statements of the /api/v2 views on an
+AsyncSession, with the same arguments and results as the v1 API:
+- `page` and `per_page` for offset pagination
+- `cursor`, `per_page` and `count` for keyset pagination, see web_app/models/pagination.py
+"""
+from quart import abort, current_app, request
+from sqlalchemy import func, select
+from web_app.models.pagination import (COUNT_MODES, decode_cursor, explain_statement,
+                                       keyset_filter, keyset_page)
+
+
+def keyset_requested():
+    """
+    Tell whether the current request should be paginated with cursors.
+
+    Returns:
+        bool: True for keyset pagination, see `web_app.models.pagination.keyset_requested`.
+    """
+    if "cursor" in request.args:
+        return True
+    if "page" in request.args:
+        return False
+    return current_app.config.get("PAGINATION_MODE") == "keyset"
+
+
+async def count_rows(session, statement, mode="exact"):
+    """
+    Count the rows of a statement.
+
+    Args:
+        session (AsyncSession): The session.
+        statement (Select): The statement to count.
+        mode (str): One of `COUNT_MODES`.
+
+    Returns:
+        int: The number of rows, None when mode is "none".
+    """
+    if mode == "none":
+        return None
+    statement = statement.order_by(None)
+    dialect = session.bind.dialect
+    if mode == "approximate" and dialect.name == "postgresql":
+        plan = (await session.execute(explain_statement(statement, dialect))).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return (await session.execute(select(func.count()).select_from(statement.subquery()))).scalar()
+
+
+async def keyset_paginate(session, statement, columns, cursor=None, per_page=5, descending=True,
+                          count="exact"):
+    """
+    Paginate a statement on a unique sort key, aborting with 400 on a malformed
+    cursor or count mode.
+
+    Args:
+        session (AsyncSession): The session.
+        statement (Select): The unordered statement to paginate.
+        columns (tuple): The columns making up a unique sort key.
+        cursor (str, optional): The cursor of the requested page, None for the first page.
+        per_page (int, optional): The maximum number of rows in a page. Defaults to 5.
+        descending (bool, optional): Whether rows are shown newest first. Defaults to True.
+        count (str, optional): One of `COUNT_MODES`. Defaults to "exact".
+
+    Returns:
+        KeysetPage: The requested page.
+    """
+    try:
+        if count not in COUNT_MODES:
+            raise ValueError(f"unknown count mode {count!r}")
+        direction, values = decode_cursor(cursor, columns) if cursor else ("next", None)
+    except ValueError:
+        abort(400)
+    per_page = max(per_page, 1)
+    total = await count_rows(session, statement, count)
+    statement = keyset_filter(statement, columns, direction, values, per_page, descending)
+    rows = (await session.execute(statement)).all()
+    return keyset_page(rows, columns, direction, values, per_page, total)
+
+
+async def offset_paginate(session, statement, columns, page=1, per_page=5, descending=True):
+    """
+    Paginate a statement with an offset, like Flask-SQLAlchemy's `paginate`.
+
+    Aborts with 404 on a page number or size below 1, or past the last page.
+
+    Args:
+        session (AsyncSession): The session.
+        statement (Select): The unordered statement to paginate.
+        columns (tuple): The columns the rows are ordered by.
+        page (int, optional): The page number, from 1. Defaults to 1.
+        per_page (int, optional): The maximum number of rows in a page. Defaults to 5.
+        descending (bool, optional): Whether rows are shown newest first. Defaults to True.
+
+    Returns:
+        tuple: The rows of the page and the `meta` block of the response.
+    """
+    if page < 1 or per_page < 1:
+        abort(404)
+    order = [c.desc() if descending else c.asc() for c in columns]
+    rows = (await session.execute(
+        statement.order_by(*order).limit(per_page).offset((page - 1) * per_page))).all()
+    if not rows and page != 1:
+        abort(404)
+    total = await count_rows(session, statement)
+    return rows, {
+        "page": page,
+        "per_page": per_page,
+        "total_pages": -(-total // per_page),
+        "total_items": total,
+    }
@@ -0,0 +1,7 @@
+from quart import Blueprint
+
+
+app_views = Blueprint("app_views", __name__, url_prefix="/api/v2")
+
+from api.v2.views.posts import *
+from api.v2.views.users import *
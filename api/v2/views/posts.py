@@ -0,0 +1,66 @@
+from quart import jsonify, request, abort, current_app
+from sqlalchemy import select
+from api.v2 import async_db
+from api.v2.views import app_views
+from api.v2.pagination import keyset_paginate, keyset_requested, offset_paginate
+from web_app.models import Post, Comment
+from web_app.models.serializers import post_schema, comment_schema
+
+
+@app_views.route("/posts")
+async def all_posts():
+    per_page = request.args.get("per_page", 5, type=int)
+    schema = post_schema.for_request(keep=(Post.date_posted, Post.id), args=request.args)
+    statement = select(*schema.columns).where(Post.visible())
+    async with async_db.session() as session:
+        if keyset_requested():
+            posts = await keyset_paginate(session, statement, (Post.date_posted, Post.id),
+                                          cursor=request.args.get("cursor"), per_page=per_page,
+                                          count=request.args.get("count", current_app.config["PAGINATION_COUNT"]))
+            return jsonify({
+                            "posts": schema.dump_many(posts),
+                            "meta": posts.meta()
+                            }), 200
+        posts, meta = await offset_paginate(session, statement, (Post.date_posted, Post.id),
+                                            page=request.args.get("page", 1, type=int),
+                                            per_page=per_page)
+    return jsonify({
+                    "posts": schema.dump_many(posts),
+                    "meta": meta
+                    }), 200
+
+
+@app_views.route("/posts/<int:post_id>")
+async def get_post(post_id):
+    schema = post_schema.for_request(args=request.args)
+    async with async_db.session() as session:
+        post = (await session.execute(select(*schema.columns).where(Post.id == post_id, Post.visible()))).first()
+    if not post:
+        abort(404)
+    return jsonify(schema.dump(post)), 200
+
+
+@app_views.route("/posts/<int:post_id>/comments")
+async def post_comments(post_id):
+    per_page = request.args.get("per_page", 5, type=int)
+    schema = comment_schema.for_request(keep=(Comment.date_commented, Comment.id), args=request.args)
+    statement = select(*schema.columns).where(Comment.post_id == post_id, Comment.visible())
+    async with async_db.session() as session:
+        if not (await session.execute(select(Post.id).where(Post.id == post_id, Post.visible()))).first():
+            abort(404)
+        if keyset_requested():
+            comments = await keyset_paginate(session, statement, (Comment.date_commented, Comment.id),
+                                             cursor=request.args.get("cursor"), per_page=per_page,
+                                             descending=False,
+                                             count=request.args.get("count", current_app.config["PAGINATION_COUNT"]))
+            return jsonify({
+                "post_comments": schema.dump_many(comments),
+                "meta": comments.meta()
+            }), 200
+        comments, meta = await offset_paginate(session, statement, (Comment.date_commented, Comment.id),
+                                               page=request.args.get("page", 1, type=int),
+                                               per_page=per_page, descending=False)
+    return jsonify({
+        "post_comments": schema.dump_many(comments),
+        "meta": meta
+    }), 200
@@ -0,0 +1,34 @@
+from quart import jsonify, request, abort, current_app
+from sqlalchemy import select
+from api.v2 import async_db
+from api.v2.auth import jwt_required
+from api.v2.views import app_views
+from api.v2.pagination import keyset_paginate, keyset_requested, offset_paginate
+from web_app.models import User, Post
+from web_app.models.serializers import post_schema
+
+
+@app_views.route("/users/<int:user_id>/posts")
+@jwt_required
+async def user_posts(user_id):
+    per_page = request.args.get("per_page", 5, type=int)
+    schema = post_schema.for_request(keep=(Post.date_posted, Post.id), args=request.args)
+    statement = select(*schema.columns).where(Post.user_id == user_id, Post.visible())
+    async with async_db.session() as session:
+        if not (await session.execute(select(User.id).where(User.id == user_id))).first():
+            abort(404)
+        if keyset_requested():
+            posts = await keyset_paginate(session, statement, (Post.date_posted, Post.id),
+                                          cursor=request.args.get("cursor"), per_page=per_page,
+                                          count=request.args.get("count", current_app.config["PAGINATION_COUNT"]))
+            return jsonify({
+                            "posts": schema.dump_many(posts),
+                            "meta": posts.meta()
+                          }), 200
+        posts, meta = await offset_paginate(session, statement, (Post.date_posted, Post.id),
+                                            page=request.args.get("page", 1, type=int),
+                                            per_page=per_page)
+    return jsonify({
+                    "posts": schema.dump_many(posts),
+                    "meta": meta
+                  }), 200
@@ -0,0 +1,105 @@
+"""
+Benchmark of GET /api/v1/posts?per_page=100 before and after the schema serializers.
+
+"before" serves the page the way the endpoint used to: full ORM instances,
+`Post.to_dict` and the default JSON provider. "after" is the current endpoint,
+selecting only the serialized columns and dumping them with `post_schema`, with
+the default and the orjson JSON providers. The database is a seeded SQLite file
+so the numbers measure the Python side of a request.
+
+Usage:
+    python -m benchmarks.api_serialization [--posts 1000] [--seconds 3]
+"""
+import argparse
+import os
+import tempfile
+import time
+from flask import jsonify, request
+
+URL = "/api/v1/posts?per_page=100"
+
+
+def make_app(database, json_provider):
+    from web_app import create_app
+    from web_app.config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{database}"
+        SECRET_KEY = "benchmark"
+        JWT_SECRET_KEY = "benchmark" * 4
+        CACHE_TYPE = "null"
+        JSON_PROVIDER = json_provider
+
+    app = create_app(BenchConfig)
+
+    @app.route("/bench/orm-posts")
+    def orm_posts():
+        from web_app.models import Post
+        per_page = request.args.get("per_page", 5, type=int)
+        posts = Post.query.paginate(page=1, per_page=per_page)
+        return jsonify({
+                        "posts": [post.to_dict() for post in posts],
+                        "meta": {
+                                 "page": posts.page,
+                                 "per_page": posts.per_page,
+                                 "total_page": posts.pages,
+                                 "total_items": posts.total
+                                 }
+                        }), 200
+    return app
+
+
+def seed(app, count):
+    from web_app import db
+    from web_app.models import User, Post
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f"bench{i}", email=f"bench{i}@example.com", password="x")
+                 for i in range(10)]
+        db.session.add_all(users)
+        db.session.flush()
+        for i in range(count):
+            db.session.add(Post(title=f"Post {i}", content="Lorem ipsum dolor sit amet. " * 20,
+                                user_id=users[i % len(users)].id))
+        db.session.commit()
+
+
+def requests_per_second(app, url, seconds):
+    """
+    Request `url` with the test client for about `seconds`.
+
+    Returns:
+        float: Requests per second.
+    """
+    client = app.test_client()
+    assert client.get(url).status_code == 200
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        client.get(url)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "bench.db")
+        seed(make_app(database, "default"), args.posts)
+        runs = [("before: ORM + to_dict", "default", "/bench/orm-posts?per_page=100"),
+                ("after: schema", "default", URL),
+                ("after: schema + orjson", "orjson", URL)]
+        baseline = None
+        print(f"{'variant':<24} {'req/s':>8} {'speedup':>8}")
+        for name, provider, url in runs:
+            rate = requests_per_second(make_app(database, provider), url, args.seconds)
+            baseline = baseline or rate
+            print(f"{name:<24} {rate:>8.1f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
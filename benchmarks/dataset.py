@@ -0,0 +1,162 @@
+"""
+Reproducible dataset of users, posts and comments for the benchmarks.
+
+The same seed gives the same rows. Sizes follow the shapes of real blogs:
+- a few users write most of the posts (Pareto distributed authors)
+- post bodies are log-normally distributed around `post_length` characters
+- a few posts get most of the comments, so there is always a heavily
+  commented "hot" post
+- dates are spread over the last year
+
+The tables are created by the migrations and the rows through the models, so
+the database has the production indexes and the counters are maintained.
+
+Usage:
+    python -m benchmarks.dataset --database-url sqlite:////tmp/bench.db [--posts 2000]
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+from datetime import datetime, timedelta
+import bcrypt
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+PASSWORD = "benchmark-password"
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+         "exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute irure "
+         "in reprehenderit voluptate velit esse cillum eu fugiat nulla pariatur excepteur "
+         "sint occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim "
+         "id est laborum flask python database cache query index server request").split()
+
+
+def make_app(database_url, **config):
+    """
+    Create the app on a benchmark database.
+
+    Args:
+        database_url (str): The database URI.
+        **config: Other configuration values.
+
+    Returns:
+        Flask: The app.
+    """
+    from web_app import create_app
+    from web_app.config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SECRET_KEY = "benchmark"
+        JWT_SECRET_KEY = "benchmark" * 4
+        WTF_CSRF_ENABLED = False
+        CACHE_TYPE = "null"
+        SLOW_REQUEST_THRESHOLD_MS = 0
+
+    for key, value in config.items():
+        setattr(BenchConfig, key, value)
+    return create_app(BenchConfig)
+
+
+def _text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length].strip() or "lorem"
+
+
+def _pareto_picker(rng, items, alpha):
+    # weights drawn once, then items picked proportionally to them
+    cumulative = list(itertools.accumulate(rng.paretovariate(alpha) for _ in items))
+    total = cumulative[-1]
+
+    def pick():
+        return items[bisect.bisect(cumulative, rng.random() * total)]
+    return pick
+
+
+def seed(app, users=50, posts=2000, comments=10000, post_length=1500, seed=42, batch_size=500):
+    """
+    Fill an empty database.
+
+    Args:
+        app (Flask): The app, on the database to fill.
+        users (int, optional): Number of users. Defaults to 50.
+        posts (int, optional): Number of posts. Defaults to 2000.
+        comments (int, optional): Number of comments. Defaults to 10000.
+        post_length (int, optional): Median length of a post body in characters. Defaults to 1500.
+        seed (int, optional): Seed of the random generator. Defaults to 42.
+        batch_size (int, optional): Rows per transaction. Defaults to 500.
+
+    Returns:
+        dict: The parameters and what the scenarios need: the password of the
+            users, the username of the most prolific author, the id of the most
+            commented post and a search term.
+    """
+    from flask_migrate import upgrade
+    from web_app import db
+    from web_app.models import User, Post, Comment
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1)
+    # every user shares one cheap hash, logins are not what is measured
+    password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(4)).decode()
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+        user_rows = [User(username=f"user{i}", email=f"user{i}@example.com",
+                          password=password, is_verified=True) for i in range(users)]
+        db.session.add_all(user_rows)
+        db.session.commit()
+        user_ids = [user.id for user in user_rows]
+        pick_author = _pareto_picker(rng, user_ids, 1.2)
+
+        post_ids = []
+        for start in range(0, posts, batch_size):
+            batch = []
+            for _ in range(min(batch_size, posts - start)):
+                length = min(int(rng.lognormvariate(0, 0.8) * post_length), 20000)
+                batch.append(Post(title=_text(rng, rng.randint(20, 90)),
+                                  content=_text(rng, max(length, 20)),
+                                  user_id=pick_author(),
+                                  date_posted=now - timedelta(seconds=rng.randint(0, 365 * 86400))))
+            db.session.add_all(batch)
+            db.session.commit()
+            post_ids.extend(post.id for post in batch)
+
+        pick_post = _pareto_picker(rng, post_ids, 1.1) if post_ids else None
+        for start in range(0, comments if post_ids else 0, batch_size):
+            db.session.add_all([Comment(content=_text(rng, rng.randint(10, 100)),
+                                        post_id=pick_post(), user_id=rng.choice(user_ids),
+                                        date_commented=now - timedelta(seconds=rng.randint(0, 365 * 86400)))
+                                for _ in range(min(batch_size, comments - start))])
+            db.session.commit()
+
+        top_author = db.session.query(User.username).order_by(User.post_count.desc()).first()
+        hot_post = db.session.query(Post.id).order_by(Post.comment_count.desc()).first()
+        return {"users": users, "posts": posts, "comments": comments,
+                "post_length": post_length, "seed": seed,
+                "password": PASSWORD,
+                "top_author": top_author[0] if top_author else None,
+                "hot_post_id": hot_post[0] if hot_post else None,
+                "search_term": "flask query"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", required=True, help="Empty database to fill.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--comments", type=int, default=10000)
+    parser.add_argument("--post-length", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    info = seed(make_app(args.database_url), args.users, args.posts, args.comments,
+                args.post_length, args.seed)
+    print(info)
+
+
+if __name__ == "__main__":
+    main()
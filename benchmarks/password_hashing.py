@@ -0,0 +1,53 @@
+"""
+Benchmark of password verification at each bcrypt cost factor.
+
+A login costs one bcrypt verification, so the number of verifications a core
+can do per second is the number of logins per second it can serve. Use it to
+pick BCRYPT_LOG_ROUNDS and PASSWORD_HASH_WORKERS.
+
+Usage:
+    python -m benchmarks.password_hashing [--costs 10 11 12 13] [--seconds 2]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+
+PASSWORD = b"correct horse battery staple"
+
+
+def logins_per_second(hashed, seconds):
+    """
+    Verify a password against a hash for about `seconds` on one core.
+
+    Returns:
+        float: Verifications per second.
+    """
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        bcrypt.checkpw(PASSWORD, hashed)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--costs", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'cost':>4} {'ms/login':>9} {'logins/s/core':>14} {'logins/s (' + str(args.workers) + ' procs)':>20}")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for cost in args.costs:
+            hashed = bcrypt.hashpw(PASSWORD, bcrypt.gensalt(cost))
+            per_core = logins_per_second(hashed, args.seconds)
+            total = sum(pool.map(logins_per_second, [hashed] * args.workers,
+                                 [args.seconds] * args.workers))
+            print(f"{cost:>4} {1000 / per_core:>9.1f} {per_core:>14.1f} {total:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
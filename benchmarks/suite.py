@@ -0,0 +1,430 @@
+"""
+Load test of the HTML pages and the /api endpoints on a seeded dataset.
+
+`run` seeds a database with benchmarks/dataset.py, then requests each scenario
+for a while and reports its latency percentiles, requests per second and SQL
+queries per request:
+- `--mode client` goes through the Flask test client, one request at a time, in
+  this process: it measures the application code, without a server or network
+- `--mode gunicorn` starts `gunicorn run:app` on a free local port and loads it
+  from `--concurrency` threads; queries per request are read from its /metrics
+- `--mode asgi` starts `uvicorn api.v2.app:app` the same way and loads the
+  /api/v2 endpoints under the names of their /api/v1 counterparts, so that
+  `compare` of a gunicorn run and an asgi run puts v1 and v2 side by side
+The results are written as JSON, by default to benchmarks/results/, and
+`compare` prints the changes between two result files, so that a regression
+shows up run to run. Runs are only comparable on the same machine, dataset and
+options, which are recorded in the file.
+
+Usage:
+    python -m benchmarks.suite run [--mode client|gunicorn|asgi] [--database-url URL] [--posts 2000]
+    python -m benchmarks.suite compare benchmarks/results/A.json benchmarks/results/B.json
+
+Without --database-url a temporary SQLite file is used. A given database must be
+empty, its tables are created by the benchmark.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event
+from benchmarks.dataset import make_app, seed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS = os.path.join(ROOT, "benchmarks", "results")
+
+
+def scenarios(info, mode="client"):
+    """
+    The requests measured, on the rows of the dataset.
+
+    Args:
+        info (dict): What `seed` returned.
+        mode (str, optional): The mode of the run; "asgi" only has the /api/v2
+            endpoints. Defaults to "client".
+
+    Returns:
+        list: (name, path) pairs.
+    """
+    post, author, term = info["hot_post_id"], info["top_author"], info["search_term"].replace(" ", "+")
+    if mode == "asgi":
+        return [
+            ("api posts", "/api/v2/posts?per_page=20"),
+            ("api post", f"/api/v2/posts/{post}"),
+            ("api post comments", f"/api/v2/posts/{post}/comments"),
+        ]
+    return [
+        ("home", "/"),
+        ("home page 3", "/?page=3"),
+        ("post", f"/post/{post}"),
+        ("user posts", f"/user/{author}"),
+        ("search", f"/search?q={term}"),
+        ("api posts", "/api/v1/posts?per_page=20"),
+        ("api post", f"/api/v1/posts/{post}"),
+        ("api post comments", f"/api/v1/posts/{post}/comments"),
+        ("api search", f"/api/v1/search?q={term}"),
+    ]
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def summarize(latencies, elapsed, errors, queries):
+    """
+    Summarize the requests of a scenario.
+
+    Args:
+        latencies (list): Durations of the requests, in seconds.
+        elapsed (float): Wall time of the scenario, in seconds.
+        errors (int): Requests that failed or did not return 200.
+        queries (float): SQL queries per request, None if unknown.
+
+    Returns:
+        dict: The count, rate, latency percentiles in ms, queries per request and errors.
+    """
+    values = sorted(latencies)
+    if not values:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(values),
+        "rps": round(len(values) / elapsed, 1),
+        "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(values, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2),
+        "queries_per_request": round(queries, 2) if queries is not None else None,
+        "errors": errors,
+    }
+
+
+def run_client(app, routes, seconds, warmup):
+    """
+    Request each route in turn through the Flask test client.
+
+    Args:
+        app (Flask): The app, on the seeded database.
+        routes (list): (name, path) pairs.
+        seconds (float): Time spent on each route.
+        warmup (int): Requests made before measuring.
+
+    Returns:
+        dict: The summary of each route, by name.
+    """
+    from web_app import db
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    client = app.test_client()
+    results = {}
+    try:
+        for name, path in routes:
+            for _ in range(warmup):
+                client.get(path)
+            latencies, errors = [], 0
+            queries[0] = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < seconds:
+                before = time.perf_counter()
+                response = client.get(path)
+                latencies.append(time.perf_counter() - before)
+                errors += response.status_code != 200
+            elapsed = time.perf_counter() - start
+            results[name] = summarize(latencies, elapsed, errors, queries[0] / max(len(latencies), 1))
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count)
+    return results
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(connection, path):
+    connection.request("GET", path)
+    response = connection.getresponse()
+    body = response.read()
+    return response.status, body
+
+
+def _query_totals(port):
+    # sum and count of db_queries_per_request over the endpoints, /metrics excluded
+    from prometheus_client.parser import text_string_to_metric_families
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        _, body = _get(connection, "/metrics")
+    finally:
+        connection.close()
+    totals = {"sum": 0.0, "count": 0.0}
+    for family in text_string_to_metric_families(body.decode()):
+        if family.name != "db_queries_per_request":
+            continue
+        for sample in family.samples:
+            suffix = sample.name.rsplit("_", 1)[-1]
+            if suffix in totals and sample.labels.get("endpoint") != "metrics":
+                totals[suffix] += sample.value
+    return totals
+
+
+def _load(port, path, seconds, concurrency):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        mine, failed = [], 0
+        while time.perf_counter() < deadline:
+            before = time.perf_counter()
+            try:
+                status, _ = _get(connection, path)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                failed += 1
+                continue
+            mine.append(time.perf_counter() - before)
+            failed += status != 200
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start, errors[0]
+
+
+def run_gunicorn(database_url, routes, seconds, warmup, concurrency, workers, threads):
+    """
+    Start gunicorn on the seeded database and load each route in turn.
+
+    Args:
+        database_url (str): The seeded database.
+        routes (list): (name, path) pairs.
+        seconds (float): Time spent on each route.
+        warmup (int): Requests made before measuring.
+        concurrency (int): Client threads.
+        workers (int): gunicorn worker processes.
+        threads (int): Threads per gunicorn worker.
+
+    Returns:
+        dict: The summary of each route, by name.
+    """
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        env = dict(_server_env(database_url),
+                   PROMETHEUS_MULTIPROC_DIR=metrics_dir,
+                   GUNICORN_BIND=f"127.0.0.1:{port}",
+                   GUNICORN_WORKERS=str(workers),
+                   GUNICORN_THREADS=str(threads))
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "run:app"]
+        return _run_server(command, env, port, routes, seconds, warmup, concurrency, count_queries=True)
+
+
+def run_asgi(database_url, routes, seconds, warmup, concurrency, workers):
+    """
+    Start uvicorn with the /api/v2 app on the seeded database and load each route in turn.
+
+    Args:
+        database_url (str): The seeded database.
+        routes (list): (name, path) pairs.
+        seconds (float): Time spent on each route.
+        warmup (int): Requests made before measuring.
+        concurrency (int): Client threads.
+        workers (int): uvicorn worker processes.
+
+    Returns:
+        dict: The summary of each route, by name; the app has no /metrics, so
+            queries per request are unknown.
+    """
+    port = _free_port()
+    command = [sys.executable, "-m", "uvicorn", "api.v2.app:app", "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers),
+               "--no-access-log", "--log-level", "warning"]
+    return _run_server(command, _server_env(database_url), port, routes, seconds, warmup,
+                       concurrency, count_queries=False)
+
+
+def _server_env(database_url):
+    return dict(os.environ,
+                DATABASE_URL=database_url,
+                SECRET_KEY="benchmark",
+                JWT_SECRET_KEY="benchmark" * 4,
+                CACHE_TYPE=os.getenv("CACHE_TYPE", "null"),
+                SLOW_REQUEST_THRESHOLD_MS="0")
+
+
+def _run_server(command, env, port, routes, seconds, warmup, concurrency, count_queries):
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        _wait_for(port, server)
+        results = {}
+        for name, path in routes:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            for _ in range(warmup):
+                _get(connection, path)
+            connection.close()
+            before = _query_totals(port) if count_queries else None
+            latencies, elapsed, errors = _load(port, path, seconds, concurrency)
+            queries = None
+            if count_queries:
+                after = _query_totals(port)
+                count = after["count"] - before["count"]
+                queries = (after["sum"] - before["sum"]) / count if count else None
+            results[name] = summarize(latencies, elapsed, errors, queries)
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def _wait_for(port, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"the server exited with code {server.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"the server did not listen on port {port} within {timeout}s")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    temporary = None
+    database_url = args.database_url
+    if database_url is None:
+        temporary = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        temporary.close()
+        database_url = f"sqlite:///{temporary.name}"
+    try:
+        app = make_app(database_url)
+        print("seeding...", file=sys.stderr)
+        info = seed(app, args.users, args.posts, args.comments, args.post_length, args.seed)
+        routes = [(name, path) for name, path in scenarios(info, args.mode)
+                  if not args.only or name in args.only]
+        if args.mode == "client":
+            results = run_client(app, routes, args.seconds, args.warmup)
+        elif args.mode == "asgi":
+            results = run_asgi(database_url, routes, args.seconds, args.warmup,
+                               args.concurrency, args.workers)
+        else:
+            results = run_gunicorn(database_url, routes, args.seconds, args.warmup,
+                                   args.concurrency, args.workers, args.threads)
+    finally:
+        if temporary is not None:
+            os.unlink(temporary.name)
+
+    report = {
+        "meta": {
+            "time": datetime.utcnow().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "mode": args.mode,
+            "database": database_url.split(":", 1)[0],
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "seconds": args.seconds,
+            "concurrency": args.concurrency if args.mode != "client" else 1,
+            "workers": args.workers if args.mode != "client" else None,
+            "threads": args.threads if args.mode == "gunicorn" else None,
+            "dataset": {key: info[key] for key in ("users", "posts", "comments", "post_length", "seed")},
+        },
+        "scenarios": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{args.mode}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"{'scenario':<20} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:<20} {result.get('rps', 0):>9} {result.get('p50_ms', '-'):>9} "
+              f"{result.get('p95_ms', '-'):>9} {result.get('p99_ms', '-'):>9} "
+              f"{str(result.get('queries_per_request', '-')):>8} {result['errors']:>7}")
+    print(f"written to {output}")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    for key in ("mode", "dataset", "concurrency"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"warning: the runs differ in {key}: {baseline['meta'].get(key)} != {current['meta'].get(key)}")
+    print(f"{'scenario':<20} {'metric':<20} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request", "errors"):
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else ""
+            print(f"{name:<20} {metric:<20} {old:>10} {new:>10} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Seed a database and measure the scenarios.")
+    run_parser.add_argument("--mode", choices=("client", "gunicorn", "asgi"), default="client")
+    run_parser.add_argument("--database-url", help="Empty database to use, a temporary SQLite file by default.")
+    run_parser.add_argument("--users", type=int, default=50)
+    run_parser.add_argument("--posts", type=int, default=2000)
+    run_parser.add_argument("--comments", type=int, default=10000)
+    run_parser.add_argument("--post-length", type=int, default=1500)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--seconds", type=float, default=5, help="Time spent on each scenario.")
+    run_parser.add_argument("--warmup", type=int, default=10, help="Requests made before measuring.")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="Client threads, gunicorn and asgi modes.")
+    run_parser.add_argument("--workers", type=int, default=2, help="gunicorn or uvicorn workers.")
+    run_parser.add_argument("--threads", type=int, default=4, help="Threads per gunicorn worker.")
+    run_parser.add_argument("--only", nargs="*", help="Names of the scenarios to run.")
+    run_parser.add_argument("-o", "--output", help="Result file, in benchmarks/results/ by default.")
+    compare_parser = commands.add_parser("compare", help="Compare two result files.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
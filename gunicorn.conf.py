@@ -0,0 +1,20 @@
+"""
+gunicorn settings of the application.
+
+Start with `PROMETHEUS_MULTIPROC_DIR=<empty directory> gunicorn run:app` so that
+/metrics aggregates the metrics of all the workers, see web_app/metrics.py.
+"""
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+# read by the app, which divides its process pools among the workers
+os.environ["GUNICORN_WORKERS"] = str(workers)
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+
+def child_exit(server, worker):
+    # the files of a dead worker would keep its in-progress gauge alive
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,26 @@
+"""comment replies index
+
+Revision ID: 7e0ae9fe8994
+Revises: abd75f9ac2d9
+Create Date: 2026-10-18 18:18:59.277569
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e0ae9fe8994'
+down_revision = 'abd75f9ac2d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index('ix_comment_post_id_parent_id_id', ['post_id', 'parent_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_comment_post_id_parent_id_id')
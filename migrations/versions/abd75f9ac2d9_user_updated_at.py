@@ -0,0 +1,36 @@
+"""user updated_at
+
+Revision ID: abd75f9ac2d9
+Revises: f2c9d4a6b8e1
+Create Date: 2026-10-18 18:16:48.717663
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'abd75f9ac2d9'
+down_revision = 'f2c9d4a6b8e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # add the column nullable, backfill it, then make it required
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # the dates of the app are naive UTC, CURRENT_TIMESTAMP is local to the server
+    op.execute(sa.table('user', sa.column('updated_at')).update().values(updated_at=datetime.utcnow()))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_user_updated_at', ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_updated_at')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,39 @@
+"""post search vector
+
+Revision ID: c41d5e7f9a20
+Revises: 489c6a77270d
+Create Date: 2026-10-18 17:30:12.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d5e7f9a20'
+down_revision = '489c6a77270d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # full-text search only has a PostgreSQL backend, other databases use the
+    # in-memory index of web_app/search.py
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # a stored generated column (PostgreSQL 12+) rewrites the table once and is
+    # then kept up to date by PostgreSQL itself
+    op.execute(
+        "ALTER TABLE post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED"
+    )
+    op.create_index('ix_post_search_vector', 'post', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_post_search_vector', table_name='post', postgresql_using='gin')
+    op.drop_column('post', 'search_vector')
@@ -0,0 +1,53 @@
+"""cascading deletes
+
+Revision ID: f2c9d4a6b8e1
+Revises: e5a8b3f1c7d2
+Create Date: 2026-10-18 20:12:47.104388
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c9d4a6b8e1'
+down_revision = 'e5a8b3f1c7d2'
+branch_labels = None
+depends_on = None
+
+# the foreign keys of the initial schema have no name in the migrations: the
+# database named them, and SQLite keeps them unnamed, in which case batch mode
+# finds them through this convention
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+FOREIGN_KEYS = {
+    'post': [('user_id', 'user')],
+    'comment': [('user_id', 'user'), ('post_id', 'post'), ('parent_id', 'comment')],
+}
+
+
+def _replace_foreign_keys(ondelete):
+    inspector = sa.inspect(op.get_bind())
+    for table, columns in FOREIGN_KEYS.items():
+        names = {tuple(fk['constrained_columns']): fk['name'] for fk in inspector.get_foreign_keys(table)}
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred in columns:
+                name = f'fk_{table}_{column}_{referred}'
+                batch_op.drop_constraint(names.get((column,)) or name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_user_deleted_at', ['deleted_at'], unique=False)
+
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_deleted_at')
+        batch_op.drop_column('deleted_at')
@@ -6,7 +6,10 @@ It sets up the application context and starts the server.
 from web_app import create_app, db
 from web_app.models import User, Post
 
-app = create_app()
+# the password hashing processes import this script again as __mp_main__,
+# they must not create an app of their own
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     with app.app_context():
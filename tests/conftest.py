@@ -0,0 +1,81 @@
+"""
+Fixtures of the test suite: an app on an in-memory SQLite database with a few
+users, posts and comments, and a counter of the SQL statements it runs.
+"""
+import os
+
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("JWT_SECRET_KEY", "test" * 8)
+os.environ.setdefault("SECURITY_PASSWORD_SALT", "test")
+
+import pytest
+from sqlalchemy import event
+from web_app import create_app, db
+from web_app.config import Config
+from web_app.models import User, Post, Comment
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_WORKERS = 0
+    CACHE_TYPE = "null"
+    FRAGMENT_CACHE_TYPE = "null"
+    IDENTITY_CACHE_TYPE = "null"
+    MAIL_QUEUE_MODE = "sync"
+    ACCOUNT_PURGE_MODE = "sync"
+    TEMPLATE_WARMUP = False
+    STATIC_PRECOMPRESS = False
+
+
+@pytest.fixture
+def config():
+    """
+    The configuration class of the app, a subclass of TestConfig each test may change.
+    """
+    return type("Config", (TestConfig,), {})
+
+
+@pytest.fixture
+def app(config):
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        users = [User(username=f"user{i}", email=f"user{i}@example.com", password="x", is_verified=True)
+                 for i in range(3)]
+        db.session.add_all(users)
+        db.session.flush()
+        for i in range(12):
+            post = Post(title=f"post {i}", content="content", user_id=users[i % 3].id)
+            db.session.add(post)
+            db.session.flush()
+            for user in users:
+                db.session.add(Comment(content="comment", post_id=post.id, user_id=user.id))
+        db.session.commit()
+    # no context is left pushed: each request gets its own session, as in production
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements(app):
+    """
+    The SQL statements run since the fixture was requested, cleared with `.clear()`.
+    """
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
@@ -0,0 +1,66 @@
+"""
+The /api/v2 app accepts the tokens the v1 app does, with the same settings.
+"""
+import asyncio
+import pytest
+from flask_jwt_extended import create_access_token, create_refresh_token
+from web_app import create_app, db, jwt
+from web_app.models import User
+from api.v2 import create_app as create_v2_app
+
+
+@pytest.fixture
+def config(config, tmp_path):
+    # the async engine has its own connections: the database must be a file
+    class Config(config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'blog.db'}"
+    return Config
+
+
+@pytest.fixture
+def v1(config):
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="user0", email="user0@example.com", password="x"))
+        db.session.commit()
+    return app
+
+
+def get_posts(v2, token):
+    async def request():
+        return await v2.test_client().get("/api/v2/users/1/posts",
+                                          headers={"Authorization": f"Bearer {token}"})
+    return asyncio.run(request()).status_code
+
+
+def test_same_tokens_as_v1(v1, config):
+    v2 = create_v2_app(config)
+    with v1.app_context():
+        access, refresh = create_access_token(identity="1"), create_refresh_token(identity="1")
+    assert get_posts(v2, access) == 200
+    assert get_posts(v2, refresh) == 422
+
+
+def test_audience_is_checked(v1, config):
+    config.JWT_DECODE_AUDIENCE = "blog"
+    v2 = create_v2_app(config)
+    with v1.app_context():
+        token = create_access_token(identity="1")
+        audience = create_access_token(identity="1", additional_claims={"aud": "blog"})
+    assert get_posts(v2, token) == 422
+    assert get_posts(v2, audience) == 200
+
+
+def test_blocklist_loader_applies(v1, config, monkeypatch):
+    monkeypatch.setattr(jwt, "_token_in_blocklist_callback", lambda header, payload: True)
+    v2 = create_v2_app(config)
+    with v1.app_context():
+        token = create_access_token(identity="1")
+    assert get_posts(v2, token) == 401
+
+
+def test_tokens_outside_the_headers_are_refused(config):
+    config.JWT_TOKEN_LOCATION = ["cookies"]
+    with pytest.raises(RuntimeError):
+        create_v2_app(config)
@@ -0,0 +1,50 @@
+"""
+Invalidation of the response cache after writes.
+"""
+import pytest
+from datetime import datetime
+from web_app import db
+from web_app.models import User
+
+
+@pytest.fixture
+def app(app):
+    app.config["CACHE_TYPE"] = "lru"
+    from web_app import cache
+    cache.init_app(app)
+    yield app
+    app.config["CACHE_TYPE"] = "null"
+    cache.init_app(app)
+
+
+@pytest.mark.parametrize("url", ["/post/1", "/post/2"])
+def test_profile_change_invalidates_post_pages(app, client, url):
+    assert client.get(url).headers["X-Cache"] == "MISS"
+    assert client.get(url).headers["X-Cache"] == "HIT"
+    with app.app_context():
+        # user1 commented on every post and wrote post 2
+        db.session.get(User, 2).username = "renamed"
+        db.session.commit()
+    response = client.get(url)
+    assert response.headers["X-Cache"] == "MISS"
+    assert b"renamed" in response.data
+
+
+def test_unrelated_user_change_keeps_post_pages(app, client):
+    client.get("/post/1")
+    with app.app_context():
+        db.session.get(User, 2).email = "new@example.com"
+        db.session.commit()
+    assert client.get("/post/1").headers["X-Cache"] == "HIT"
+
+
+@pytest.mark.parametrize("url, status", [("/post/1", 200), ("/post/3", 404)])
+def test_account_deletion_invalidates_post_pages(app, client, url, status):
+    client.get(url)
+    with app.app_context():
+        # user2 commented on post 1 and wrote post 3
+        db.session.get(User, 3).deleted_at = datetime.utcnow()
+        db.session.commit()
+    response = client.get(url)
+    assert response.status_code == status
+    assert b"user2" not in response.data
@@ -0,0 +1,32 @@
+"""
+Conditional GET requests: a 304 only while the page would render the same.
+"""
+import pytest
+from web_app import db
+from web_app.models import User
+
+
+def revalidate(client, url):
+    etag = client.get(url).headers["ETag"]
+    return client.get(url, headers={"If-None-Match": etag})
+
+
+@pytest.mark.parametrize("url", ["/", "/post/1", "/user/user1", "/api/v1/posts", "/api/v1/posts/1"])
+def test_not_modified(client, url):
+    assert revalidate(client, url).status_code == 304
+
+
+@pytest.mark.parametrize("url", ["/", "/post/1", "/post/1/comment/2/replies", "/user/user1"])
+@pytest.mark.parametrize("change", [{"username": "renamed"}, {"image_file": "0123456789abcdef.jpg"}])
+def test_profile_change_modifies_pages(app, client, url, change):
+    etag = client.get(url).headers["ETag"]
+    with app.app_context():
+        user = db.session.get(User, 2)
+        for name, value in change.items():
+            setattr(user, name, value)
+        db.session.commit()
+    # the user page is looked up by name
+    url = url.replace("user1", change.get("username", "user1"))
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
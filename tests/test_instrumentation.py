@@ -0,0 +1,60 @@
+"""
+The statements and templates of a request are timed once, for the metrics and
+the slow request log alike.
+"""
+import pytest
+from flask_jwt_extended import create_access_token
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from web_app import db, slow_request_log
+
+
+@pytest.fixture
+def config(config):
+    config.SLOW_REQUEST_THRESHOLD_MS = 0.001
+    config.ADMIN_EMAILS = ["user0@example.com"]
+    return config
+
+
+def test_slow_log_reads_the_request_timings(client):
+    client.get("/post/1")
+    entry = slow_request_log.recent()[0]
+    assert entry["endpoint"] == "posts.post"
+    assert entry["sql_count"] == len(entry["statements"]) == 3
+    assert entry["templates"] and entry["template_ms"] > 0
+
+
+def test_failed_statement_is_not_left_on_the_connection(app):
+    with app.app_context():
+        connection = db.session.connection()
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM missing"))
+        assert connection.info.get("query_start") == []
+        db.session.rollback()
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_streamed_page_is_measured_to_the_end(app, client, streaming):
+    app.config["POST_STREAMING"] = streaming
+    labels = {"endpoint": "posts.post"}
+    before = REGISTRY.get_sample_value("db_queries_per_request_sum", labels) or 0
+    in_progress = REGISTRY.get_sample_value("http_requests_in_progress")
+    response = client.get("/post/1")
+    response.get_data()
+    response.close()
+    entry = slow_request_log.recent()[0]
+    assert entry["sql_count"] == 3
+    assert any(name == "post.html" for name in (t["name"] for t in entry["templates"]))
+    assert REGISTRY.get_sample_value("db_queries_per_request_sum", labels) - before == 3
+    assert REGISTRY.get_sample_value("http_requests_in_progress") == in_progress
+
+
+def test_pool_stats_are_for_admins(app, client):
+    with app.app_context():
+        admin, user = create_access_token(identity="1"), create_access_token(identity="2")
+    assert client.get("/api/v1/pool").status_code == 401
+    assert client.get("/api/v1/pool", headers={"Authorization": f"Bearer {user}"}).status_code == 403
+    response = client.get("/api/v1/pool", headers={"Authorization": f"Bearer {admin}"})
+    assert response.status_code == 200
+    assert "checkouts" in response.get_json()
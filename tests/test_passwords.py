@@ -0,0 +1,23 @@
+"""
+Password hashing in a pool of processes shared by the app processes.
+"""
+import pytest
+from flask import Flask
+from web_app.passwords import PasswordHasher
+
+
+@pytest.mark.parametrize("workers, processes, share", [(2, 1, 2), (2, 2, 1), (2, 4, 1), (8, 3, 2), (0, 4, 0)])
+def test_pool_is_divided_among_the_app_processes(workers, processes, share):
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_WORKERS=workers, APP_PROCESSES=processes)
+    assert PasswordHasher(app).workers == share
+
+
+def test_hash_in_pool():
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_WORKERS=1, BCRYPT_LOG_ROUNDS=4)
+    hasher = PasswordHasher(app)
+    hashed = hasher.hash("secret")
+    assert hasher.verify(hashed, "secret")
+    assert not hasher.verify(hashed, "wrong")
+    hasher._executor.shutdown()
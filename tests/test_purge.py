@@ -0,0 +1,88 @@
+"""
+The posts of an account being purged are hidden at once.
+"""
+import asyncio
+import re
+import pytest
+from datetime import datetime
+from web_app import db
+from web_app.models import User, Comment
+from api.v2 import create_app as create_v2_app
+
+
+@pytest.fixture
+def config(config, tmp_path):
+    # the /api/v2 app has connections of its own: the database must be a file
+    config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'blog.db'}"
+    return config
+
+
+@pytest.fixture
+def deleted(app):
+    with app.app_context():
+        # user2 wrote posts 3, 6, 9 and 12
+        db.session.get(User, 3).deleted_at = datetime.utcnow()
+        db.session.commit()
+
+
+def titles(response):
+    return set(re.findall(rb"post \d+", response.data))
+
+
+@pytest.mark.parametrize("url", ["/", "/?cursor=", "/api/v1/posts?per_page=20", "/api/v1/posts?cursor=&per_page=20"])
+def test_listings_leave_out_deleted_accounts(app, client, url):
+    before = client.get(url)
+    # the newest posts come first, user2 wrote post 11
+    assert {b"post 11", b"post 10"} <= titles(before)
+    with app.app_context():
+        db.session.get(User, 3).deleted_at = datetime.utcnow()
+        db.session.commit()
+    after = client.get(url, headers={"If-None-Match": before.headers["ETag"]})
+    assert after.status_code == 200
+    assert b"post 11" not in titles(after)
+    assert b"post 10" in titles(after)
+
+
+def test_user_page_of_deleted_account(client, deleted):
+    assert client.get("/user/user2").status_code == 404
+
+
+@pytest.mark.parametrize("url", ["/post/3", "/post/3/comment/7/replies", "/api/v1/posts/3",
+                                 "/api/v1/posts/3/comments", "/api/v1/posts/3/comments?thread=1",
+                                 "/api/v1/posts/1/comments/3/replies"])
+def test_detail_of_deleted_account_is_not_found(client, deleted, url):
+    # post 3 and comment 3, on post 1, are user2's
+    assert client.get(url).status_code == 404
+
+
+def test_comments_of_deleted_account_are_hidden(client, deleted):
+    assert b"user2" not in client.get("/post/1").data
+    comments = client.get("/api/v1/posts/1/comments").get_json()["post_comments"]
+    assert {comment["user_id"] for comment in comments} == {1, 2}
+    thread = client.get("/api/v1/posts/1/comments?thread=1").get_json()["comments"]
+    assert {comment["user_id"] for comment in thread} == {1, 2}
+    # like a comment that does not exist
+    assert client.get("/api/v1/posts/1/comments/3").status_code == 400
+
+
+def test_replies_to_deleted_account_are_hidden(app, client):
+    with app.app_context():
+        reply = Comment(content="reply", post_id=1, user_id=1, parent_id=3)
+        db.session.add(reply)
+        db.session.commit()
+        reply_id = reply.id
+    thread = client.get("/api/v1/posts/1/comments?thread=1").get_json()["comments"]
+    assert reply_id in [r["id"] for c in thread for r in c["replies"]]
+    with app.app_context():
+        db.session.get(User, 3).deleted_at = datetime.utcnow()
+        db.session.commit()
+    thread = client.get("/api/v1/posts/1/comments?thread=1").get_json()["comments"]
+    assert reply_id not in [r["id"] for c in thread for r in c["replies"]]
+
+
+def test_v2_detail_of_deleted_account_is_not_found(config, deleted, tmp_path):
+    async def get(url):
+        return (await create_v2_app(config).test_client().get(url)).status_code
+    assert asyncio.run(get("/api/v2/posts/3")) == 404
+    assert asyncio.run(get("/api/v2/posts/3/comments")) == 404
+    assert asyncio.run(get("/api/v2/posts/1")) == 200
@@ -0,0 +1,48 @@
+"""
+Number of SQL statements run by the pages listing posts and comments.
+
+Each page loads its rows with a loader strategy (see web_app/models/loaders.py),
+so the count does not grow with the rows shown: a lazy load per row would add
+statements and fail these tests.
+"""
+import pytest
+from web_app import db
+from web_app.models import User, Post, Comment
+
+
+@pytest.mark.parametrize("url, expected", [
+    # conditional GET version, posts counter, page, count
+    ("/", 4),
+    # conditional GET version, post with its author, comment threads with their authors
+    ("/post/1", 3),
+    # user, conditional GET version, posts counter, page, count
+    ("/user/user0", 5),
+])
+def test_page_query_count(client, statements, url, expected):
+    client.get(url)  # first request: e.g. the counters table is read once per process
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert len(statements) == expected, statements
+
+
+@pytest.mark.parametrize("url", ["/", "/post/1", "/user/user0"])
+def test_query_count_does_not_grow_with_rows(app, client, statements, url):
+    client.get(url)
+    statements.clear()
+    client.get(url)
+    before = len(statements)
+    # every post of the pages and every comment of post 1 by a different user
+    with app.app_context():
+        for i in range(5):
+            user = User(username=f"other{i}", email=f"other{i}@example.com", password="x")
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(Post(title="other", content="content", user_id=user.id))
+            db.session.add(Comment(content="comment", post_id=1, user_id=user.id))
+        db.session.add(Post(title="mine", content="content", user_id=1))
+        db.session.commit()
+    client.get(url)
+    statements.clear()
+    client.get(url)
+    assert len(statements) == before, statements
@@ -0,0 +1,32 @@
+"""
+The schema serializers give the same dicts as `to_dict`.
+"""
+import pytest
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import BadRequest
+from web_app import db
+from web_app.models import Post, Comment
+from web_app.models.serializers import post_schema, comment_schema
+
+
+def test_dump_matches_to_dict(app):
+    with app.app_context():
+        for schema, model in ((post_schema, Post), (comment_schema, Comment)):
+            rows = schema.query().order_by(model.id).all()
+            assert schema.dump_many(rows) == [item.to_dict() for item in db.session.query(model).order_by(model.id)]
+
+
+def test_subset_and_extra_fields(app):
+    with app.app_context():
+        schema = post_schema.only(["id", "excerpt"], keep=[Post.date_posted])
+        row = schema.query().filter(Post.id == 1).one()
+        assert schema.dump(row) == {"id": 1, "excerpt": db.session.get(Post, 1).content[:200]}
+
+
+def test_fields_of_any_request_args():
+    # the /api/v2 views pass the arguments of their Quart request
+    schema = post_schema.for_request(keep=(Post.id,), args=MultiDict({"fields": "title, excerpt"}))
+    assert schema.names == ["title", "excerpt"]
+    assert post_schema.for_request(args=MultiDict()) is post_schema
+    with pytest.raises(BadRequest):
+        post_schema.for_request(args=MultiDict({"fields": "title,password"}))
@@ -0,0 +1,134 @@
+"""
+Thread pages read a bounded number of replies per comment, and the paths,
+depths and reply counts they rely on are kept up to date.
+"""
+import pytest
+from sqlalchemy import func, insert, select, text
+from web_app import db
+from web_app.models import Comment
+from web_app.models.comments import MAX_DEPTH, fill_paths, path_segment
+from web_app.models.pagination import encode_cursor
+from web_app.models.threads import load_thread, reply_parent, thread_query
+
+
+def reply(parent, user_id=1):
+    comment = Comment(content="reply", post_id=parent.post_id, user_id=user_id, parent_id=parent.id)
+    db.session.add(comment)
+    db.session.flush()
+    return comment
+
+
+@pytest.fixture
+def thread(app):
+    """
+    Comment 1, the first of post 1, gets 5 replies; the first of them gets 4.
+    """
+    with app.app_context():
+        root = db.session.get(Comment, 1)
+        replies = [reply(root) for _ in range(5)]
+        nested = [reply(replies[0]) for _ in range(4)]
+        db.session.commit()
+        return [comment.id for comment in replies], [comment.id for comment in nested]
+
+
+def ids(nodes):
+    return [node.comment.id for node in nodes]
+
+
+def test_pages_and_replies_limit(app, thread):
+    replies, nested = thread
+    with app.app_context():
+        page = load_thread(Comment.query, 1, per_page=2, depth=3, replies=2)
+        assert ids(page.items) == [1, 2]
+        first = page.items[0]
+        assert ids(first.replies) == replies[:2]
+        assert first.more_replies == 3
+        assert ids(first.replies[0].replies) == nested[:2]
+        assert first.replies[0].more_replies == 2
+        assert page.next_cursor is not None
+
+        last = load_thread(Comment.query, 1, cursor=page.next_cursor, per_page=2, depth=3, replies=2)
+        assert ids(last.items) == [3]
+        assert last.next_cursor is None
+
+        # the replies cursor continues the replies of comment 1
+        parent = db.session.get(Comment, 1)
+        rest = load_thread(Comment.query, 1, parent=parent, cursor=first.replies_cursor, per_page=10, depth=1)
+        assert ids(rest.items) == replies[2:]
+        assert rest.total == 5
+
+
+def test_rows_read_are_bounded(app, thread):
+    replies, nested = thread
+    with app.app_context():
+        rows = thread_query(Comment.query, 1, per_page=1, depth=3, replies=2).all()
+        # comment 1, 2 of its replies and 2 replies to the first of them, plus
+        # comment 2, telling there is a next page
+        assert [row.id for row in rows] == [1, replies[0], *nested[:2], replies[1], 2]
+
+        rows = thread_query(Comment.query, 1, per_page=1, depth=3, replies=0).all()
+        assert [row.id for row in rows] == [1, 2]
+
+
+def test_replies_are_read_with_their_index(app, thread):
+    with app.app_context():
+        statement = thread_query(Comment.query, 1, per_page=1, depth=2, replies=2).statement
+        compiled = statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+        plan = " ".join(row[-1] for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_comment_post_id_parent_id_id" in plan
+
+
+@pytest.mark.parametrize("path", ["abc", "12", path_segment(1) + "x"])
+def test_malformed_cursor(app, client, path):
+    cursor = encode_cursor("next", (path,))
+    with app.app_context():
+        with pytest.raises(ValueError):
+            load_thread(Comment.query, 1, cursor=cursor, error_out=False)
+    assert client.get(f"/api/v1/posts/1/comments?thread=1&cursor={cursor}").status_code == 400
+
+
+def test_reply_count(app):
+    with app.app_context():
+        comment = reply(db.session.get(Comment, 1))
+        db.session.commit()
+        assert db.session.get(Comment, 1).reply_count == 1
+        db.session.delete(comment)
+        db.session.commit()
+        db.session.expire_all()
+        assert db.session.get(Comment, 1).reply_count == 0
+
+
+def test_fill_paths(app):
+    with app.app_context():
+        start = db.session.scalar(select(func.max(Comment.id))) + 1
+        rows = [
+            {"id": start + 1, "parent_id": None},
+            # the reply has a lower id than the comment it answers
+            {"id": start, "parent_id": start + 1},
+            {"id": start + 2, "parent_id": 2},
+        ]
+        connection = db.session.connection()
+        connection.execute(insert(Comment.__table__),
+                           [{**row, "content": "core", "post_id": 1, "user_id": 1} for row in rows])
+        fill_paths(connection, [1])
+        paths = dict(connection.execute(select(Comment.id, Comment.path).where(Comment.id >= start)).all())
+        depths = dict(connection.execute(select(Comment.id, Comment.depth).where(Comment.id >= start)).all())
+    assert paths == {
+        start: path_segment(start + 1) + path_segment(start),
+        start + 1: path_segment(start + 1),
+        start + 2: path_segment(2) + path_segment(start + 2),
+    }
+    assert depths == {start: 1, start + 1: 0, start + 2: 1}
+
+
+def test_reply_parent_at_max_depth(app):
+    with app.app_context():
+        chain = [db.session.get(Comment, 1)]
+        while chain[-1].depth < MAX_DEPTH:
+            chain.append(reply(chain[-1]))
+        assert reply_parent(chain[-2]) is chain[-2]
+        # a reply to the deepest comment is attached to its parent, at MAX_DEPTH
+        assert reply_parent(chain[-1]) is chain[-2]
+        deepest = reply(reply_parent(chain[-1]))
+        assert deepest.depth == MAX_DEPTH
+        db.session.commit()
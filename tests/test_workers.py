@@ -0,0 +1,58 @@
+"""
+The background workers start with the first request of the process, without
+waiting for new work to be queued.
+"""
+import time
+from datetime import datetime
+import pytest
+from web_app import db
+from web_app.mail_queue import MailQueue
+from web_app.purge import AccountPurger
+from web_app.models import OutgoingMail, User
+
+
+@pytest.fixture
+def config(config, tmp_path):
+    # the workers need connections of their own: an in-memory database has only one
+    config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'blog.db'}"
+    return config
+
+
+def wait_for(check, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_mail_left_by_a_restart_is_delivered(app, client):
+    app.config.update(MAIL_QUEUE_MODE="thread", MAIL_QUEUE_POLL_INTERVAL=3600)
+    queue = MailQueue(app)
+    with app.app_context():
+        db.session.add(OutgoingMail(subject="left over", sender="blog@example.com",
+                                    recipients="user0@example.com", body="body"))
+        db.session.commit()
+    client.get("/")
+
+    def delivered():
+        with app.app_context():
+            return db.session.query(OutgoingMail.status).scalar() == "sent"
+    assert wait_for(delivered)
+    assert queue._thread.is_alive()
+
+
+def test_account_left_by_a_restart_is_purged(app, client):
+    app.config.update(ACCOUNT_PURGE_MODE="thread", ACCOUNT_PURGE_POLL_INTERVAL=3600, ACCOUNT_PURGE_PAUSE=0)
+    purger = AccountPurger(app)
+    with app.app_context():
+        db.session.get(User, 3).deleted_at = datetime.utcnow()
+        db.session.commit()
+    client.get("/")
+
+    def purged():
+        with app.app_context():
+            return db.session.get(User, 3) is None
+    assert wait_for(purged)
+    assert purger._thread.is_alive()
@@ -5,32 +5,65 @@ The `create_app` function is responsible for setting up the application with the
 configurations and registering the blueprints for different parts of the application. 
 
 Extensions initialized in this module:
+- PoolMonitor for configuring and measuring the database connection pool
+- ReplicaRouter for sending the reads of read-only requests to replicas
 - SQLAlchemy for database management
 - Flask-Migrate for handling database migrations
-- Bcrypt for password hashing
+- PasswordHasher for password hashing
 - Flask-Login for user session management
+- IdentityCache for caching the identity of the authenticated users
 - Flask-Mail for sending emails
+- ResponseCache for caching anonymous read responses
+- MailQueue for delivering emails in the background
+- AccountPurger for deleting large accounts in the background
+- PostSearch for full-text search of posts
+- Metrics for exporting request, query and template metrics to Prometheus
+- SlowRequestLog for logging slow requests with their queries and profile
+- TemplateCache for caching compiled templates and rendered template fragments
+- StaticAssets for serving fingerprinted, precompressed static files
 """
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_mail import Mail
 from web_app.config import Config
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from web_app.cache import ResponseCache
+from web_app.mail_queue import MailQueue
+from web_app.purge import AccountPurger
+from web_app.passwords import PasswordHasher
+from web_app.search import PostSearch
+from web_app.db_pool import PoolMonitor
+from web_app.replicas import ReplicaRouter, RoutingSession
+from web_app.metrics import Metrics
+from web_app.slowlog import SlowRequestLog
+from web_app.templating import TemplateCache
+from web_app.identity import IdentityCache
+from web_app.assets import StaticAssets
 
-db = SQLAlchemy()
-bcrypt = Bcrypt()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+pool_monitor = PoolMonitor()
+replica_router = ReplicaRouter()
+hasher = PasswordHasher()
 login_manager = LoginManager()
 login_manager.login_view = 'users.login'
 login_manager.login_message_category = 'info'
+identities = IdentityCache()
 jwt = JWTManager() 
 
 mail = Mail()
+mail_queue = MailQueue()
+account_purger = AccountPurger()
 migrate = Migrate()
 cors = CORS()
+cache = ResponseCache()
+search = PostSearch()
+metrics = Metrics()
+slow_request_log = SlowRequestLog()
+template_cache = TemplateCache()
+static_assets = StaticAssets()
 def create_app(config_class=Config):
     """
     Create and configure the Flask application.
@@ -42,16 +75,30 @@ def create_app(config_class=Config):
         Flask app: The configured Flask application instance.
     """
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+
+    from web_app.json_provider import init_json
+    init_json(app)
 
     """Initialize extensions with the app"""
+    template_cache.init_app(app)
+    metrics.init_app(app)
+    slow_request_log.init_app(app)
+    pool_monitor.init_app(app)
+    replica_router.init_app(app)
     db.init_app(app)
-    bcrypt.init_app(app)
+    hasher.init_app(app)
     login_manager.init_app(app)
+    identities.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
+    mail_queue.init_app(app)
+    account_purger.init_app(app)
     migrate.init_app(app, db)
     cors.init_app(app, resources={r"/*": {"origins": "0.0.0.0"}})
+    cache.init_app(app)
+    search.init_app(app)
+    static_assets.init_app(app)
 
     from web_app.users.routes import users
     from web_app.posts.routes import posts
@@ -65,4 +112,12 @@ def create_app(config_class=Config):
     app.register_blueprint(errors)
     app.register_blueprint(app_views)
 
+    from web_app.users.avatars import avatar_url
+    app.jinja_env.globals["avatar_url"] = avatar_url
+    if app.config.get("TEMPLATE_WARMUP"):
+        template_cache.warm_up(app)
+
+    from web_app.cli import register_commands
+    register_commands(app)
+
     return app
@@ -0,0 +1,284 @@
+"""
+This module serves the files of web_app/static under fingerprinted names, precompressed.
+
+Fingerprints: `url_for("static", filename="main.css")` builds the URL of
+"main.<hash>.css", where the hash is taken from the content of the file. The URL
+changes whenever the file does, so the response is cached for STATIC_MAX_AGE
+with `Cache-Control: immutable` and browsers and CDNs never ask for it again. A
+name with a hash that no longer matches the file, e.g. from a page rendered
+before a deploy, gets the current file with the default caching of Flask.
+Hashes are computed once per process, when a file is first linked or served,
+and by `flask build-assets` and the start of the app for the text files.
+
+Compression: each text file (CSS, JS, SVG...) is compressed beforehand to
+"<name>.gz" and, when the optional `brotli` package is installed, "<name>.br"
+next to it, at the maximum level since it is done once. A request whose
+Accept-Encoding allows it gets the smallest variant with its Content-Encoding.
+Images are served as they are.
+
+Sending: the files are sent with `send_file`, through the `wsgi.file_wrapper` of
+the server (sendfile(2) on gunicorn), or as an X-Sendfile header with Flask's
+USE_X_SENDFILE. Behind nginx, STATIC_ACCEL_REDIRECT hands the file over with an
+X-Accel-Redirect to an internal location serving web_app/static, which should
+have `gzip_static on;` (and `brotli_static on;` with the brotli module), as nginx
+picks the compressed variant itself.
+
+Configuration:
+- STATIC_FINGERPRINT: Link the static files by fingerprinted names
+- STATIC_PRECOMPRESS: Compress the text files when the app starts
+- STATIC_MAX_AGE: Lifetime in seconds of the responses of fingerprinted names
+- STATIC_ACCEL_REDIRECT: Prefix of the internal nginx location of the static files, e.g. "/_static/"
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from collections import namedtuple
+from flask import current_app, request, send_file
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE = frozenset({".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".html", ".xml", ".ico"})
+# best first, as (encoding, suffix of the precompressed file)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+DIGEST_LENGTH = 12
+_FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$" % DIGEST_LENGTH)
+
+Asset = namedtuple("Asset", ("path", "mtime", "digest", "mimetype", "encodings"))
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def fingerprinted_name(filename, digest):
+    """
+    Insert a digest in a file name, before its extension.
+
+    Args:
+        filename (str): The name relative to the static folder, e.g. "main.css".
+        digest (str): The digest of the content.
+
+    Returns:
+        str: The fingerprinted name, e.g. "main.0123456789ab.css".
+    """
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+def _write_atomic(path, data):
+    # the workers may start at the same time: never expose a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class AssetManifest:
+    """
+    The fingerprints and compressed variants of the files of a static folder.
+
+    Args:
+        folder (str): The static folder.
+        precompress (bool): Write the missing compressed variants of the text files.
+    """
+    def __init__(self, folder, precompress=True):
+        self.folder = folder
+        self.precompress = precompress
+        self._assets = {}
+
+    def get(self, filename, check=False):
+        """
+        Get a file of the folder, hashing and compressing it the first time.
+
+        Args:
+            filename (str): The name relative to the folder.
+            check (bool, optional): Hash the file again if it changed since.
+
+        Returns:
+            Asset: The file, None if it does not exist.
+        """
+        asset = self._assets.get(filename)
+        if asset is not None and not check:
+            return asset
+        path = os.path.join(self.folder, *filename.split("/"))
+        if os.path.commonpath([self.folder, os.path.abspath(path)]) != self.folder:
+            return None
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        if asset is None or asset.mtime != mtime:
+            asset = self._assets[filename] = self._load(path, mtime)
+        return asset
+
+    def _load(self, path, mtime):
+        with open(path, "rb") as f:
+            data = f.read()
+        ext = os.path.splitext(path)[1].lower()
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        encodings = self._compress(path, mtime, data) if ext in COMPRESSIBLE else ()
+        return Asset(path, mtime, hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH], mimetype, encodings)
+
+    def _compress(self, path, mtime, data):
+        encodings = []
+        for encoding, suffix in ENCODINGS:
+            variant = path + suffix
+            try:
+                fresh = os.stat(variant).st_mtime >= mtime
+            except OSError:
+                fresh = False
+            if not fresh and self.precompress:
+                if encoding == "br":
+                    brotli = _brotli()
+                    if brotli is None:
+                        continue
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) >= len(data):
+                    continue
+                try:
+                    _write_atomic(variant, compressed)
+                except OSError as e:
+                    logger.warning("could not write %s: %s", variant, e)
+                    continue
+                fresh = True
+            if fresh:
+                encodings.append((encoding, variant))
+        return tuple(encodings)
+
+    def build(self):
+        """
+        Hash and compress every text file of the folder.
+
+        Returns:
+            int: The number of files.
+        """
+        count = 0
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                ext = os.path.splitext(name)[1].lower()
+                if ext not in COMPRESSIBLE:
+                    continue
+                filename = os.path.relpath(os.path.join(root, name), self.folder).replace(os.sep, "/")
+                if self.get(filename, check=True) is not None:
+                    count += 1
+        return count
+
+    def url_name(self, filename, check=False):
+        """
+        Get the fingerprinted name of a file.
+
+        Args:
+            filename (str): The name relative to the folder.
+            check (bool, optional): Hash the file again if it changed since.
+
+        Returns:
+            str: The fingerprinted name, the name itself if the file does not exist.
+        """
+        asset = self.get(filename, check)
+        return fingerprinted_name(filename, asset.digest) if asset is not None else filename
+
+    def resolve(self, name, check=False):
+        """
+        Find the file a requested name stands for.
+
+        Args:
+            name (str): The requested name, fingerprinted or not.
+            check (bool, optional): Hash the file again if it changed since.
+
+        Returns:
+            tuple: The filename, its Asset or None, and whether the name carries
+                the current fingerprint of the file.
+        """
+        match = _FINGERPRINTED.match(name)
+        if match is not None:
+            filename = match["stem"] + match["ext"]
+            asset = self.get(filename, check)
+            if asset is not None:
+                return filename, asset, asset.digest == match["digest"]
+        return name, self.get(name, check), False
+
+
+class StaticAssets:
+    """
+    Flask extension serving the static folder under fingerprinted names, precompressed.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Replace the static view of the app and compress its text files.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        if not app.has_static_folder:
+            return
+        manifest = AssetManifest(os.path.abspath(app.static_folder),
+                                 precompress=app.config.get("STATIC_PRECOMPRESS", True))
+        app.extensions["static_assets"] = manifest
+        if app.config.get("STATIC_FINGERPRINT", True):
+            app.url_defaults(self._fingerprint)
+        app.view_functions["static"] = self.send_static_file
+        if manifest.precompress:
+            manifest.build()
+
+    @staticmethod
+    def _fingerprint(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            manifest = current_app.extensions["static_assets"]
+            values["filename"] = manifest.url_name(values["filename"], check=current_app.debug)
+
+    @staticmethod
+    def send_static_file(filename):
+        """
+        View sending a static file, in the best encoding the client accepts.
+
+        Args:
+            filename (str): The requested name, fingerprinted or not.
+
+        Returns:
+            Response: The file, 404 if it does not exist.
+        """
+        app = current_app._get_current_object()
+        manifest = app.extensions["static_assets"]
+        filename, asset, immutable = manifest.resolve(filename, check=app.debug)
+        if asset is None:
+            return app.send_static_file(filename)
+        if immutable:
+            max_age = app.config.get("STATIC_MAX_AGE", 31536000)
+        else:
+            max_age = app.get_send_file_max_age(filename)
+        accel_prefix = app.config.get("STATIC_ACCEL_REDIRECT")
+        encoding = None
+        if accel_prefix:
+            response = app.response_class(mimetype=asset.mimetype)
+            response.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + filename
+        else:
+            path = asset.path
+            for name, variant in asset.encodings:
+                if request.accept_encodings[name]:
+                    encoding, path = name, variant
+                    break
+            response = send_file(path, mimetype=asset.mimetype, conditional=True, max_age=max_age)
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        if asset.encodings:
+            response.vary.add("Accept-Encoding")
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            response.cache_control.immutable = True
+        return response
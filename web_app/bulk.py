@@ -0,0 +1,285 @@
+"""
+This module imports and exports posts and comments as NDJSON.
+
+Each line of an NDJSON stream is a JSON object with a "type" of "post" or
+"comment" and the fields of the row:
+
+    {"type": "post", "title": "...", "content": "...", "user_id": 1}
+    {"type": "comment", "content": "...", "post_id": 3, "user_id": 2}
+    {"type": "comment", "content": "...", "post_id": 3, "user_id": 1, "parent_id": 7}
+
+Importing validates every line on its own and inserts the valid ones in batches,
+with one executemany INSERT and one commit per batch instead of one commit per
+row. Lines that cannot be imported are reported with their line number and the
+reason, the rest of the stream is still imported. Within a batch the posts are
+inserted before the comments, so a comment may refer to a post imported earlier
+in the same stream when ids are kept, and a reply to a comment imported earlier.
+
+Exporting streams the rows in the format above, ordered by id, through a
+server-side cursor fetching `batch_size` rows at a time, so the memory used does
+not depend on the number of rows.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import DBAPIError
+from web_app import db, cache, search
+from web_app.models import User, Post, Comment
+from web_app.models.comments import fill_paths
+from web_app.models.stats import count_inserted
+from web_app.models.serializers import post_schema, comment_schema
+
+MODELS = {"post": Post, "comment": Comment}
+EXPORT_SCHEMAS = {"post": post_schema, "comment": comment_schema}
+# beyond this many, failed lines are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def _field(record, name, kind, max_length=None, required=True):
+    value = record.get(name)
+    if value is None:
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    if kind is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"{name} must be an integer")
+    elif kind is str:
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"{name} must be a non empty string")
+        if max_length and len(value) > max_length:
+            raise ValueError(f"{name} must be at most {max_length} characters")
+    elif kind is datetime:
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be an ISO 8601 date") from None
+    return value
+
+
+def parse_line(line, keep_ids=False, user_id=None):
+    """
+    Validate a line of an NDJSON import.
+
+    Args:
+        line (str): The line.
+        keep_ids (bool, optional): Whether the line carries the id of the row. Defaults to False.
+        user_id (int, optional): The user all rows must belong to, e.g. the
+            authenticated user; used when the line has no user_id.
+
+    Returns:
+        tuple: The type of the row and the values to insert.
+
+    Raises:
+        ValueError: If the line cannot be imported, with the reason.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise ValueError("invalid JSON") from None
+    if not isinstance(record, dict):
+        raise ValueError("a line must be a JSON object")
+    kind = record.get("type")
+    if kind not in MODELS:
+        raise ValueError("type must be 'post' or 'comment'")
+    if user_id is not None:
+        record.setdefault("user_id", user_id)
+        if record["user_id"] != user_id:
+            raise ValueError("user_id must be the id of the authenticated user")
+    now = datetime.utcnow()
+    if kind == "post":
+        row = {"title": _field(record, "title", str, 100),
+               "content": _field(record, "content", str),
+               "user_id": _field(record, "user_id", int),
+               "date_posted": _field(record, "date_posted", datetime, required=False) or now}
+    else:
+        row = {"content": _field(record, "content", str, 100),
+               "user_id": _field(record, "user_id", int),
+               "post_id": _field(record, "post_id", int),
+               "date_commented": _field(record, "date_commented", datetime, required=False) or now,
+               "parent_id": _field(record, "parent_id", int, required=False)}
+    if keep_ids:
+        row["id"] = _field(record, "id", int)
+    return kind, row
+
+
+class ImportReport:
+    """
+    Outcome of an NDJSON import.
+
+    Attributes:
+        inserted (dict): Number of inserted rows by type.
+        failed (int): Number of lines that were not imported.
+        errors (list): {"line": number, "error": reason} of the first failed lines.
+    """
+    def __init__(self):
+        self.inserted = {kind: 0 for kind in MODELS}
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line_no, reason):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": reason})
+
+    def to_dict(self):
+        return {"inserted": self.inserted, "failed": self.failed, "errors": self.errors}
+
+
+def _existing_ids(model, ids):
+    if not ids:
+        return set()
+    return {row[0] for row in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+def _insert(model, rows, report):
+    """
+    Insert rows of one type with a single executemany, row by row if it fails.
+
+    Args:
+        model: Post or Comment.
+        rows (list): (line number, values) tuples.
+        report (ImportReport): The report to record the outcome in.
+    """
+    if not rows:
+        return
+    kind = "post" if model is Post else "comment"
+    # the foreign keys are checked up front so that one bad row does not fail the batch
+    parents = [(User, "user_id")] + ([(Post, "post_id")] if model is Comment else [])
+    for parent, key in parents:
+        existing = _existing_ids(parent, {values[key] for _, values in rows})
+        for line_no, values in rows:
+            if values[key] not in existing:
+                report.error(line_no, f"{key} {values[key]} does not exist")
+        rows = [(line_no, values) for line_no, values in rows if values[key] in existing]
+    if model is Comment:
+        rows = _check_parents(rows, report)
+    if not rows:
+        return
+    try:
+        with db.session.begin_nested():
+            connection = db.session.connection()
+            connection.execute(insert(model.__table__), [values for _, values in rows])
+            count_inserted(connection, model, [values for _, values in rows])
+        report.inserted[kind] += len(rows)
+    except DBAPIError:
+        # e.g. a duplicate id: find the offending rows
+        for line_no, values in rows:
+            try:
+                with db.session.begin_nested():
+                    connection = db.session.connection()
+                    connection.execute(insert(model.__table__), values)
+                    count_inserted(connection, model, [values])
+                report.inserted[kind] += 1
+            except DBAPIError as e:
+                report.error(line_no, str(e.orig).strip().splitlines()[0])
+    if model is Comment:
+        fill_paths(db.session.connection(), {values["post_id"] for _, values in rows})
+
+
+def _check_parents(rows, report):
+    """
+    Drop the replies whose parent is not a comment of the same post.
+
+    The parent may be imported in the same batch when ids are kept: the rows
+    are sorted by id so that it is inserted first.
+    """
+    parent_ids = {values["parent_id"] for _, values in rows if values["parent_id"] is not None}
+    if not parent_ids:
+        return rows
+    posts = dict(db.session.query(Comment.id, Comment.post_id).filter(Comment.id.in_(parent_ids)))
+    posts.update((values["id"], values["post_id"]) for _, values in rows if "id" in values)
+    kept = []
+    for line_no, values in rows:
+        parent_id = values["parent_id"]
+        if parent_id is not None and posts.get(parent_id) != values["post_id"]:
+            report.error(line_no, f"parent_id {parent_id} is not a comment of post {values['post_id']}")
+        else:
+            kept.append((line_no, values))
+    return sorted(kept, key=lambda row: row[1].get("id", 0))
+
+
+def _reset_sequences():
+    # explicit ids do not advance the PostgreSQL sequences of the id columns
+    if db.engine.dialect.name != "postgresql":
+        return
+    for model in MODELS.values():
+        table = model.__tablename__
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"))
+
+
+def import_ndjson(lines, batch_size=1000, keep_ids=False, user_id=None):
+    """
+    Import posts and comments from NDJSON lines.
+
+    Args:
+        lines (iterable): The lines, str or bytes.
+        batch_size (int, optional): Number of lines inserted per transaction. Defaults to 1000.
+        keep_ids (bool, optional): Insert the rows with the id of each line, e.g.
+            to load an export into an empty database. Defaults to False.
+        user_id (int, optional): The user all rows must belong to.
+
+    Returns:
+        ImportReport: The number of inserted rows and the failed lines.
+    """
+    report = ImportReport()
+    batch = defaultdict(list)
+    touched_posts = set()
+
+    def flush():
+        _insert(Post, batch["post"], report)
+        _insert(Comment, batch["comment"], report)
+        touched_posts.update(values["post_id"] for _, values in batch["comment"])
+        db.session.commit()
+        batch.clear()
+
+    pending = 0
+    for line_no, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        try:
+            kind, values = parse_line(line, keep_ids, user_id)
+        except ValueError as e:
+            report.error(line_no, str(e))
+            continue
+        batch[kind].append((line_no, values))
+        pending += 1
+        if pending >= batch_size:
+            flush()
+            pending = 0
+    flush()
+    if keep_ids:
+        _reset_sequences()
+        db.session.commit()
+    if any(report.inserted.values()):
+        # Core inserts are not seen by the cache listeners
+        cache.invalidate("posts", "users", *(f"post:{post_id}" for post_id in touched_posts))
+        search.reset()
+    return report
+
+
+def export_ndjson(kinds=("post", "comment"), batch_size=1000):
+    """
+    Export posts and comments as NDJSON lines.
+
+    Args:
+        kinds (tuple, optional): The types of rows to export, in order. Defaults to both.
+        batch_size (int, optional): Number of rows fetched at a time. Defaults to 1000.
+
+    Yields:
+        str: The lines, each ending with a newline.
+    """
+    dumps = current_app.json.dumps
+    for kind in kinds:
+        schema = EXPORT_SCHEMAS[kind]
+        query = (select(*schema.columns)
+                 .order_by(MODELS[kind].id)
+                 .execution_options(yield_per=batch_size))
+        for row in db.session.execute(query):
+            yield dumps({"type": kind, **schema.dump(row)}) + "\n"
@@ -0,0 +1,291 @@
+"""
+This module provides a response cache for the anonymous read endpoints.
+
+Cached responses are stored in a pluggable backend:
+- lru: an in-process LRU cache bounded in size, with a time to live
+- redis: any client speaking the Redis commands GET, SET, DEL, MGET and INCR
+- null: caching disabled
+
+Invalidation is tag based. Each cached view declares the tags its response depends
+on (e.g. "posts" for the feed, "post:42" for a post page). Every tag has a version
+number that is part of the cache key, so bumping the version of a tag makes every
+response depending on it unreachable. Versions are bumped after a successful commit
+touching a Post, Comment or User, so writes from the blueprints and the API alike
+invalidate exactly the pages that show the changed rows.
+
+With several worker processes, the lru backend only invalidates the cache of the
+worker that handled the write; other workers serve stale pages for up to the
+time to live. Use the redis backend to share the cache between workers.
+
+Configuration:
+- CACHE_TYPE: "lru", "redis" or "null"
+- CACHE_DEFAULT_TIMEOUT: Time to live of cached responses in seconds
+- CACHE_MAX_ENTRIES: Maximum number of responses kept by the lru backend
+- CACHE_REDIS_URL: URL of the Redis server used by the redis backend
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+
+class NullCache:
+    """
+    Backend that never stores anything.
+    """
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def get_versions(self, tags):
+        return [0] * len(tags)
+
+    def bump(self, tags):
+        pass
+
+
+class LRUCache:
+    """
+    In-process backend evicting the least recently used entries.
+
+    Args:
+        max_entries (int): Maximum number of entries kept.
+    """
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+
+class RedisCache:
+    """
+    Backend storing entries in Redis, shared by all worker processes.
+
+    Args:
+        client: A Redis client, or any object implementing get, set, delete, mget and incr.
+        prefix (str, optional): Prefix of all the keys. Defaults to "simpleblog:".
+    """
+    def __init__(self, client, prefix="simpleblog:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, timeout):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=int(timeout))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def get_versions(self, tags):
+        if not tags:
+            return []
+        versions = self.client.mget([self.prefix + "tag:" + tag for tag in tags])
+        return [int(v) if v is not None else 0 for v in versions]
+
+    def bump(self, tags):
+        for tag in tags:
+            self.client.incr(self.prefix + "tag:" + tag)
+
+
+def _tags_for(obj, session):
+    """
+    Get the tags invalidated by a change to a model instance.
+
+    Args:
+        obj: The changed Post, Comment or User.
+        session (Session): The session the change was flushed from.
+
+    Returns:
+        set: The tags to bump.
+    """
+    from web_app.models import User, Post, Comment
+    if isinstance(obj, Post):
+        tags = {"posts", f"post:{obj.id}"}
+        author = session.identity_map.get(identity_key(User, obj.user_id))
+        # the user pages are keyed on the username, fall back to all of them
+        tags.add(f"user:{author.username}" if author is not None else "users")
+        return tags
+    if isinstance(obj, Comment):
+        # listings of posts carry their comment count
+        return {"posts", f"post:{obj.post_id}"}
+    if isinstance(obj, User):
+        # author names and pictures appear on the listings and the user pages,
+        # the post pages showing the user are found by `_collect_user_pages`
+        return {"posts", "users"}
+    return set()
+
+
+def _profile_changed(user):
+    from web_app.models.users import PROFILE_FIELDS
+    state = inspect(user)
+    return any(state.attrs[name].history.has_changes() for name in PROFILE_FIELDS)
+
+
+class ResponseCache:
+    """
+    Flask extension caching whole responses of anonymous GET requests.
+    """
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.default_timeout = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Set up the backend from the app configuration and listen for commits.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        cache_type = app.config.get("CACHE_TYPE", "null")
+        self.default_timeout = app.config.get("CACHE_DEFAULT_TIMEOUT", 60)
+        if cache_type == "lru":
+            self.backend = LRUCache(app.config.get("CACHE_MAX_ENTRIES", 1000))
+        elif cache_type == "redis":
+            self.backend = RedisCache.from_url(app.config["CACHE_REDIS_URL"])
+        else:
+            self.backend = NullCache()
+        if not event.contains(Session, "after_flush", self._collect_tags):
+            event.listen(Session, "before_flush", self._collect_user_pages)
+            event.listen(Session, "after_flush", self._collect_tags)
+            event.listen(Session, "after_commit", self._invalidate)
+            event.listen(Session, "after_soft_rollback", self._discard)
+
+    def _collect_user_pages(self, session, flush_context, instances):
+        from web_app.models import Post, Comment, User
+        if isinstance(self.backend, NullCache):
+            return
+        # the pages of the posts a user wrote or commented on show their name and
+        # picture; when the user is deleted, the database deletes those rows and
+        # the pages are only known before the flush
+        ids = [obj.id for obj in session.deleted if isinstance(obj, User)]
+        ids += [obj.id for obj in session.dirty
+                if isinstance(obj, User) and _profile_changed(obj)]
+        if not ids:
+            return
+        post_ids = session.execute(
+            select(Post.id).where(Post.user_id.in_(ids))
+            .union(select(Comment.post_id).where(Comment.user_id.in_(ids)))).scalars()
+        session.info.setdefault("cache_tags", set()).update(f"post:{post_id}" for post_id in post_ids)
+
+    def _collect_tags(self, session, flush_context):
+        tags = session.info.setdefault("cache_tags", set())
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            tags |= _tags_for(obj, session)
+
+    def _invalidate(self, session):
+        tags = session.info.pop("cache_tags", None)
+        if tags:
+            self.invalidate(*tags)
+
+    def _discard(self, session, previous_transaction):
+        session.info.pop("cache_tags", None)
+
+    def invalidate(self, *tags):
+        """
+        Make every cached response depending on one of the tags stale.
+
+        Args:
+            *tags (str): The tags to invalidate.
+        """
+        self.backend.bump(sorted(tags))
+
+    @staticmethod
+    def _cacheable():
+        if request.method != "GET" or "Authorization" in request.headers:
+            return False
+        if "_flashes" in session:
+            return False
+        return not current_user.is_authenticated
+
+    def cached(self, tags, timeout=None):
+        """
+        Cache the responses of a view for anonymous GET requests.
+
+        Args:
+            tags (callable): Called with the view arguments, returns the tags the
+                response depends on.
+            timeout (int, optional): Time to live in seconds. Defaults to CACHE_DEFAULT_TIMEOUT.
+
+        Returns:
+            callable: The decorator.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if isinstance(self.backend, NullCache) or not self._cacheable():
+                    return view(*args, **kwargs)
+                view_tags = sorted(tags(**kwargs))
+                versions = self.backend.get_versions(view_tags)
+                key = "view:{}:{}:{}".format(
+                    request.endpoint, request.full_path,
+                    ",".join(f"{t}={v}" for t, v in zip(view_tags, versions)))
+                hit = self.backend.get(key)
+                if hit is not None:
+                    body, status, headers = hit
+                    response = Response(body, status=status, headers=headers)
+                    response.headers["X-Cache"] = "HIT"
+                    return response
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    headers = [(k, v) for k, v in response.headers.items()
+                               if k.lower() not in ("set-cookie", "content-length")]
+                    self.backend.set(key, (response.get_data(), response.status_code, headers),
+                                     timeout or self.default_timeout)
+                    response.headers["X-Cache"] = "MISS"
+                return response
+            return wrapper
+        return decorator
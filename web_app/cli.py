@@ -0,0 +1,148 @@
+"""
+This module defines the `flask` command line commands of the application.
+
+Commands:
+- check-indexes: EXPLAIN the queries of the hot pages and report whether they use their index
+- mail-worker: deliver the emails of the mail queue
+- purge-accounts: purge the accounts marked deleted
+- bulk-import: import posts and comments from an NDJSON file
+- bulk-export: export posts and comments as NDJSON
+- build-assets: fingerprint and compress the static files
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from web_app import db, mail_queue, account_purger
+from web_app.bulk import MODELS, export_ndjson, import_ndjson
+from web_app.models import Post, Comment
+from web_app.models.threads import thread_query
+
+
+def _index_checks():
+    """
+    Build the queries issued by the hot endpoints together with the index each should use.
+
+    Returns:
+        list: (name, index name, query) tuples.
+    """
+    return [
+        ("main.home", "ix_post_date_posted_id",
+         Post.query.order_by(Post.date_posted.desc(), Post.id.desc()).limit(5)),
+        ("users.user_posts", "ix_post_user_id_date_posted_id",
+         Post.query.filter_by(user_id=1).order_by(Post.date_posted.desc(), Post.id.desc()).limit(5)),
+        ("posts.post", "ix_comment_post_id_path",
+         thread_query(Comment.query, post_id=1)),
+        ("api.post_comments", "ix_comment_post_id_date_commented_id",
+         Comment.query.filter_by(post_id=1).order_by(Comment.date_commented, Comment.id).limit(5)),
+    ]
+
+
+def explain(query):
+    """
+    Get the query plan of a query.
+
+    Args:
+        query (Query): The query to explain.
+
+    Returns:
+        str: The plan as reported by the database.
+    """
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    with db.engine.connect() as conn:
+        if dialect.name == "postgresql":
+            # small tables are cheaper to scan, make the planner show the index path
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            rows = conn.execute(text(f"EXPLAIN {sql}")).scalars()
+        elif dialect.name == "sqlite":
+            rows = (row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+        else:
+            rows = (" ".join(str(col) for col in row) for row in conn.execute(text(f"EXPLAIN {sql}")))
+        return "\n".join(rows)
+
+
+@click.command("check-indexes")
+@click.option("--verbose", "-v", is_flag=True, help="Print the full query plans.")
+@with_appcontext
+def check_indexes(verbose):
+    """EXPLAIN the hot queries and check they use their index."""
+    missing = 0
+    for name, index, query in _index_checks():
+        plan = explain(query)
+        used = index in plan
+        missing += not used
+        click.echo(f"{'ok' if used else 'MISSING':8}{name:22}{index}")
+        if verbose or not used:
+            click.echo("\n".join("    " + line for line in plan.splitlines()))
+    if missing:
+        raise SystemExit(1)
+
+
+@click.command("mail-worker")
+@click.option("--once", is_flag=True, help="Exit once no email is due.")
+@with_appcontext
+def mail_worker(once):
+    """Deliver queued emails, for MAIL_QUEUE_MODE=external."""
+    mail_queue.run(current_app._get_current_object(), once=once)
+
+
+@click.command("purge-accounts")
+@click.option("--once", is_flag=True, help="Exit once no account is left to purge.")
+@with_appcontext
+def purge_accounts(once):
+    """Purge the accounts marked deleted, for ACCOUNT_PURGE_MODE=external."""
+    account_purger.run(current_app._get_current_object(), once=once)
+
+
+@click.command("bulk-import")
+@click.argument("file", type=click.File("rb"))
+@click.option("--batch-size", default=1000, show_default=True, help="Lines inserted per transaction.")
+@click.option("--keep-ids", is_flag=True, help="Insert the rows with the ids of the file, e.g. an export.")
+@with_appcontext
+def bulk_import(file, batch_size, keep_ids):
+    """Import posts and comments from an NDJSON FILE, - for stdin."""
+    report = import_ndjson(file, batch_size=max(batch_size, 1), keep_ids=keep_ids)
+    for error in report.errors:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(", ".join(f"{count} {kind}s" for kind, count in report.inserted.items())
+               + f" imported, {report.failed} lines failed")
+    if report.failed:
+        raise SystemExit(1)
+
+
+@click.command("bulk-export")
+@click.option("--type", "kinds", type=click.Choice(list(MODELS)), multiple=True,
+              help="Type of rows to export, repeatable. Defaults to all.")
+@click.option("--output", "-o", type=click.File("w"), default="-", help="Output file, stdout by default.")
+@click.option("--batch-size", default=1000, show_default=True, help="Rows fetched at a time.")
+@with_appcontext
+def bulk_export(kinds, output, batch_size):
+    """Export posts and comments as NDJSON."""
+    for line in export_ndjson(kinds or tuple(MODELS), max(batch_size, 1)):
+        output.write(line)
+
+
+@click.command("build-assets")
+@with_appcontext
+def build_assets():
+    """Fingerprint and compress the static text files, e.g. when building a release."""
+    manifest = current_app.extensions["static_assets"]
+    manifest.precompress = True
+    count = manifest.build()
+    click.echo(f"{count} static files compressed")
+
+
+def register_commands(app):
+    """
+    Register the command line commands with the app.
+
+    Args:
+        app (Flask): The application instance.
+    """
+    app.cli.add_command(check_indexes)
+    app.cli.add_command(mail_worker)
+    app.cli.add_command(purge_accounts)
+    app.cli.add_command(bulk_import)
+    app.cli.add_command(bulk_export)
+    app.cli.add_command(build_assets)
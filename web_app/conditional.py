@@ -0,0 +1,134 @@
+"""
+This module provides conditional GET support for the read endpoints.
+
+A view decorated with `conditional` first asks a validator function for the
+version of the rows its response is built from. The version is read with a
+single cheap query (the `updated_at` column and the denormalized counters), from
+which a strong ETag, and for single resources a Last-Modified date, is derived.
+When the client already holds that version (If-None-Match / If-Modified-Since)
+a 304 is returned without running the view, so nothing is rendered or serialized.
+
+Pages and documents show the name and picture of the authors and commenters,
+so every validator includes the last change to a user profile: renaming a user
+or changing their picture changes the version of every response, which is
+rare enough not to be worth tracking per page.
+
+Validators return a tuple `(parts, last_modified)`, where `parts` is a tuple of
+values identifying the version and `last_modified` a naive UTC datetime or None,
+or None when the resource does not exist, in which case the view runs as usual.
+"""
+import hashlib
+from datetime import timezone
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func, select
+from web_app import db
+from web_app.models import User, Post
+from web_app.models.stats import get_count
+
+
+def make_etag(*parts):
+    """
+    Derive a strong ETag from the parts identifying a version.
+
+    Returns:
+        str: The ETag value, without quotes.
+    """
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional(validator, per_user=False):
+    """
+    Answer conditional GET requests to a view with 304 when nothing changed.
+
+    Args:
+        validator (callable): Called with the view arguments, returns the
+            version of the resource as described in the module docstring.
+        per_user (bool, optional): Whether the response depends on the logged in
+            user, as HTML pages do. Defaults to False.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            if per_user and "_flashes" in session:
+                return view(*args, **kwargs)
+            version = validator(**kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+            parts, last_modified = version
+            if per_user:
+                parts = (*parts, current_user.get_id())
+            etag = make_etag(request.full_path, *parts)
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+            if per_user:
+                response.vary.add("Cookie")
+            return response
+        return wrapper
+    return decorator
+
+
+def _profiles_version():
+    # the last change to any username or picture, read from ix_user_updated_at
+    return select(func.max(User.updated_at)).scalar_subquery()
+
+
+def post_version(post_id):
+    """
+    Version of a post, including its comments.
+
+    Adding or removing a comment updates the comment count, which in turn
+    touches the post `updated_at`.
+    """
+    row = (db.session.query(Post.updated_at, Post.comment_count, _profiles_version().label("profiles"))
+           .filter_by(id=post_id).first())
+    if row is None:
+        return None
+    last_modified = max(row.updated_at, row.profiles or row.updated_at)
+    return (post_id, row.updated_at, row.comment_count, row.profiles), last_modified
+
+
+def posts_version():
+    """
+    Version of the listing of all posts.
+
+    Deleting a post does not move the latest `updated_at`, the posts counter does change.
+    """
+    latest, profiles = db.session.query(func.max(Post.updated_at), _profiles_version()).one()
+    return (latest, profiles, get_count("posts")), None
+
+
+def user_posts_version(username=None, user_id=None):
+    """
+    Version of the listing of the posts of a user, looked up by username or id.
+    """
+    query = db.session.query(User.id, User.post_count, User.updated_at)
+    user = (query.filter_by(username=username) if username is not None
+            else query.filter_by(id=user_id)).first()
+    if user is None:
+        return None
+    # only the user is shown next to their posts
+    latest = db.session.query(func.max(Post.updated_at)).filter_by(user_id=user.id).scalar()
+    return (user.id, user.updated_at, latest, user.post_count), None
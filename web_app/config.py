@@ -5,15 +5,59 @@ It includes database configuration, email settings, and secret keys.
 
 Configuration Parameters:
 - SECRET_KEY: Key used for session encryption and security
-- SQLALCHEMY_DATABASE_URI: URI for the PostgreSQL database connection
+- SQLALCHEMY_DATABASE_URI: URI for the PostgreSQL database connection, DATABASE_URL overrides it
+- ASYNC_DATABASE_URI: URI of the database for the /api/v2 app, with an async driver, ASYNC_DATABASE_URL sets it; derived from SQLALCHEMY_DATABASE_URI when unset
+- DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING: Connection pool settings, see web_app/db_pool.py
+- DB_STATEMENT_TIMEOUT: Milliseconds after which PostgreSQL cancels a statement, 0 for none
+- DB_POOLER: "pgbouncer" when connecting through a transaction mode pooler, else "none"
+- DB_REPLICA_URIS: Comma separated URIs of read replicas, see web_app/replicas.py
+- DB_REPLICA_STICKY_SECONDS: How long a client reads from the primary after writing
+- DB_REPLICA_RETRY_SECONDS: How long a failing replica is left out
 - MAIL_SERVER: SMTP server for sending emails
 - MAIL_PORT: Port for the SMTP server
 - MAIL_USE_TLS: Enable TLS for email communication
+- MAIL_QUEUE_MODE: How queued emails are delivered, "thread", "external" or "sync"
+- MAIL_QUEUE_*: Batch size, retries and polling of the mail queue, see web_app/mail_queue.py
 - MAIL_USERNAME: Email username for authentication
 - MAIL_PASSWORD: Email password for authentication
 - MAIL_DEFAULT_SENDER: Default sender for outgoing emails
+- ACCOUNT_PURGE_MODE: How large accounts are purged, "thread", "external" or "sync"
+- ACCOUNT_PURGE_*: Size threshold, batch size, pauses and polling of the background deletion of accounts, see web_app/purge.py
+- AVATAR_WORKERS: Number of threads processing uploaded profile pictures
+- AVATAR_MAX_PIXELS: Largest accepted width x height of uploaded profile pictures
 - FLASK_ADMIN_SWATCH: Admin theme for Flask-Admin
 - SECURITY_PASSWORD_SALT: Salt for password hashing
+- BCRYPT_LOG_ROUNDS: bcrypt cost factor of new password hashes
+- PASSWORD_HASH_WORKERS: Number of processes hashing passwords, divided among the app processes (at least one each), 0 to hash in the request thread
+- APP_PROCESSES: Number of app processes on the host, GUNICORN_WORKERS sets it
+- PAGINATION_MODE: Default pagination of listings, "offset" or "keyset"
+- PAGINATION_COUNT: How keyset pages count their total, "exact", "approximate" or "none"
+- COMMENTS_PER_PAGE: Top level comments, or replies, per page of a comment thread
+- COMMENT_DEPTH: Levels of replies loaded with a page of a comment thread
+- COMMENT_REPLIES: Replies loaded per comment with a page of a comment thread
+- POST_STREAMING: Stream the post page, sending the comments as they are read
+- POST_STREAM_COMMENTS: Top level comments per page of a streamed post page, 0 for all
+- POST_STREAM_CHUNK_SIZE: Comments fetched at a time from the database by a streamed post page
+- STREAM_BUFFER_SIZE: Bytes of a streamed page buffered before they are sent
+- CACHE_TYPE: Response cache backend, "lru", "redis" or "null"
+- CACHE_DEFAULT_TIMEOUT: Time to live of cached responses in seconds
+- CACHE_MAX_ENTRIES: Maximum number of responses kept by the lru cache
+- CACHE_REDIS_URL: Redis server used by the redis cache
+- IDENTITY_CACHE_*: Backend, time to live and size of the cache of the authenticated users, see web_app/identity.py
+- JWT_IDENTITY_CLAIMS: Put the identity of the user in the access tokens, sparing JWT requests the user lookup
+- TEMPLATE_BYTECODE_CACHE_DIR: Directory of the compiled templates shared by the workers, "none" to disable
+- TEMPLATE_WARMUP: Compile all templates when the app starts instead of on first use
+- FRAGMENT_CACHE_*: Backend, time to live and size of the cache of rendered template fragments, see web_app/templating.py
+- STATIC_FINGERPRINT: Link the static files by names carrying a hash of their content
+- STATIC_PRECOMPRESS: Write gzip and brotli variants of the static text files when the app starts
+- STATIC_MAX_AGE: Lifetime in seconds of the immutable responses of fingerprinted static files
+- STATIC_ACCEL_REDIRECT: Internal nginx location of web_app/static, to send the static files with X-Accel-Redirect
+- USE_X_SENDFILE: Send the static files with an X-Sendfile header, for Apache or lighttpd
+- JSON_PROVIDER: JSON encoder of responses, "default" or "orjson"
+- SEARCH_BACKEND: Full-text search of posts, "postgres", "python" or "auto"
+- METRICS_TOKEN: Bearer token required by /metrics, if set
+- ADMIN_EMAILS: Comma separated emails of the users allowed on the admin API endpoints
+- SLOW_REQUEST_*: Threshold, log file and profiling of the slow request log, see web_app/slowlog.py
 """
 
 import os
@@ -36,13 +80,77 @@ db_name = os.getenv("BLOG_POSTGRESQL_DB")
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
     """SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{db_user}:{db_pwd}@{db_host}/{db_name}" """
-    SQLALCHEMY_DATABASE_URI = f"postgresql://{db_user}:{db_pwd}@{db_host}/{db_name}"
-    MAIL_SERVER = "smtp.googlemail.com"
-    MAIL_PORT = 587
-    MAIL_USE_TLS = True
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL") or f"postgresql://{db_user}:{db_pwd}@{db_host}/{db_name}"
+    ASYNC_DATABASE_URI = os.getenv("ASYNC_DATABASE_URL")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 0))
+    DB_POOLER = os.getenv("DB_POOLER", "none")
+    DB_REPLICA_URIS = os.getenv("DB_REPLICA_URIS", "")
+    DB_REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", 5))
+    DB_REPLICA_RETRY_SECONDS = int(os.getenv("DB_REPLICA_RETRY_SECONDS", 30))
+    MAIL_SERVER = os.getenv("MAIL_SERVER", "smtp.googlemail.com")
+    MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
+    MAIL_USE_TLS = os.getenv("MAIL_USE_TLS", "true").lower() == "true"
     MAIL_USERNAME = os.getenv("EMAIL_USER")
     MAIL_PASSWORD = os.getenv("EMAIL_PWD")
     MAIL_DEFAULT_SENDER = ('simpleblog', 'no-reply@simpleblog.com')
+    MAIL_QUEUE_MODE = os.getenv("MAIL_QUEUE_MODE", "thread")
+    MAIL_QUEUE_BATCH_SIZE = int(os.getenv("MAIL_QUEUE_BATCH_SIZE", 20))
+    MAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv("MAIL_QUEUE_MAX_ATTEMPTS", 5))
+    MAIL_QUEUE_RETRY_DELAY = int(os.getenv("MAIL_QUEUE_RETRY_DELAY", 30))
+    MAIL_QUEUE_POLL_INTERVAL = int(os.getenv("MAIL_QUEUE_POLL_INTERVAL", 5))
+    MAIL_QUEUE_LEASE = int(os.getenv("MAIL_QUEUE_LEASE", 600))
+    ACCOUNT_PURGE_MODE = os.getenv("ACCOUNT_PURGE_MODE", "thread")
+    ACCOUNT_PURGE_THRESHOLD = int(os.getenv("ACCOUNT_PURGE_THRESHOLD", 1000))
+    ACCOUNT_PURGE_BATCH_SIZE = int(os.getenv("ACCOUNT_PURGE_BATCH_SIZE", 500))
+    ACCOUNT_PURGE_PAUSE = float(os.getenv("ACCOUNT_PURGE_PAUSE", 0.1))
+    ACCOUNT_PURGE_POLL_INTERVAL = int(os.getenv("ACCOUNT_PURGE_POLL_INTERVAL", 60))
+    AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", 2))
+    AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", 4096 * 4096))
     FLASK_ADMIN_SWATCH = "sandstone"
     SECURITY_PASSWORD_SALT=os.getenv("SECURITY_PASSWORD_SALT")
     JWT_SECRET_KEY=os.getenv("JWT_SECRET_KEY")
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    APP_PROCESSES = int(os.getenv("GUNICORN_WORKERS", 1))
+    PAGINATION_MODE = os.getenv("PAGINATION_MODE", "offset")
+    PAGINATION_COUNT = os.getenv("PAGINATION_COUNT", "exact")
+    COMMENTS_PER_PAGE = int(os.getenv("COMMENTS_PER_PAGE", 10))
+    COMMENT_DEPTH = int(os.getenv("COMMENT_DEPTH", 3))
+    COMMENT_REPLIES = int(os.getenv("COMMENT_REPLIES", 3))
+    POST_STREAMING = os.getenv("POST_STREAMING", "false").lower() == "true"
+    POST_STREAM_COMMENTS = int(os.getenv("POST_STREAM_COMMENTS", 500))
+    POST_STREAM_CHUNK_SIZE = int(os.getenv("POST_STREAM_CHUNK_SIZE", 500))
+    STREAM_BUFFER_SIZE = int(os.getenv("STREAM_BUFFER_SIZE", 8192))
+    CACHE_TYPE = os.getenv("CACHE_TYPE", "null")
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv("CACHE_DEFAULT_TIMEOUT", 60))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1000))
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    IDENTITY_CACHE_TYPE = os.getenv("IDENTITY_CACHE_TYPE", "lru")
+    IDENTITY_CACHE_TIMEOUT = int(os.getenv("IDENTITY_CACHE_TIMEOUT", 30))
+    IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", 10000))
+    JWT_IDENTITY_CLAIMS = os.getenv("JWT_IDENTITY_CLAIMS", "false").lower() == "true"
+    TEMPLATE_BYTECODE_CACHE_DIR = os.getenv("TEMPLATE_BYTECODE_CACHE_DIR")
+    TEMPLATE_WARMUP = os.getenv("TEMPLATE_WARMUP", "true").lower() == "true"
+    FRAGMENT_CACHE_TYPE = os.getenv("FRAGMENT_CACHE_TYPE", "lru")
+    FRAGMENT_CACHE_TIMEOUT = int(os.getenv("FRAGMENT_CACHE_TIMEOUT", 300))
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", 5000))
+    STATIC_FINGERPRINT = os.getenv("STATIC_FINGERPRINT", "true").lower() == "true"
+    STATIC_PRECOMPRESS = os.getenv("STATIC_PRECOMPRESS", "true").lower() == "true"
+    STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", 365 * 24 * 3600))
+    STATIC_ACCEL_REDIRECT = os.getenv("STATIC_ACCEL_REDIRECT")
+    USE_X_SENDFILE = os.getenv("USE_X_SENDFILE", "false").lower() == "true"
+    JSON_PROVIDER = os.getenv("JSON_PROVIDER", "default")
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    ADMIN_EMAILS = [email.strip() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()]
+    SLOW_REQUEST_THRESHOLD_MS = int(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 500))
+    SLOW_REQUEST_LOG = os.getenv("SLOW_REQUEST_LOG")
+    SLOW_REQUEST_LOG_MAX_BYTES = int(os.getenv("SLOW_REQUEST_LOG_MAX_BYTES", 10 * 1024 * 1024))
+    SLOW_REQUEST_LOG_BACKUPS = int(os.getenv("SLOW_REQUEST_LOG_BACKUPS", 5))
+    SLOW_REQUEST_KEEP = int(os.getenv("SLOW_REQUEST_KEEP", 50))
+    SLOW_REQUEST_PROFILE_RATE = float(os.getenv("SLOW_REQUEST_PROFILE_RATE", 0))
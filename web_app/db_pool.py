@@ -0,0 +1,188 @@
+"""
+This module configures the database connection pool and measures its use.
+
+Each app process holds a pool of DB_POOL_SIZE connections, plus up to
+DB_MAX_OVERFLOW extra ones under load. When gunicorn workers x threads exceed
+that, requests wait up to DB_POOL_TIMEOUT seconds for a connection; the pool
+records how many checkouts there were, how long they waited, how many timed out
+and how many connections were invalidated, so an undersized pool shows up.
+
+Behind an external pooler in transaction mode (DB_POOLER=pgbouncer), a server
+connection is only ours for the duration of a transaction: session settings
+would leak to other clients, so the statement timeout is set with SET LOCAL at
+the start of each transaction instead of once per connection. psycopg2 does not
+use server-side prepared statements, so it needs nothing else.
+
+SQLite databases keep the pool chosen by Flask-SQLAlchemy and are not measured.
+Their foreign keys are enforced on every connection, as the ON DELETE CASCADE of
+the models needs it.
+
+Configuration:
+- DB_POOL_SIZE: Connections kept open per process
+- DB_MAX_OVERFLOW: Extra connections opened under load
+- DB_POOL_TIMEOUT: Seconds to wait for a connection before failing
+- DB_POOL_RECYCLE: Seconds after which a connection is replaced
+- DB_POOL_PRE_PING: Test connections on checkout, replacing those the server closed
+- DB_STATEMENT_TIMEOUT: Milliseconds after which PostgreSQL cancels a statement, 0 for none
+- DB_POOLER: "none", or "pgbouncer" for a transaction mode pooler
+"""
+import sqlite3
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """
+    Counters of the use of a connection pool.
+
+    Attributes:
+        checkouts (int): Connections handed out.
+        connects (int): Connections opened.
+        invalidations (int): Connections discarded because they failed or were stale.
+        timeouts (int): Checkouts that gave up after DB_POOL_TIMEOUT.
+        wait_seconds_total (float): Time spent waiting for a connection.
+        wait_seconds_max (float): Longest wait for a connection.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def waited(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self.timeouts += timed_out
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def to_dict(self, pool=None):
+        """
+        Get the counters, and the current state of the pool.
+
+        Args:
+            pool (Pool, optional): The pool the counters are for.
+
+        Returns:
+            dict: The counters and, for a queue pool, its size, checked out
+                connections and overflow.
+        """
+        with self._lock:
+            stats = {"checkouts": self.checkouts,
+                     "connects": self.connects,
+                     "invalidations": self.invalidations,
+                     "timeouts": self.timeouts,
+                     "wait_seconds_total": round(self.wait_seconds_total, 6),
+                     "wait_seconds_max": round(self.wait_seconds_max, 6)}
+        if isinstance(pool, QueuePool):
+            stats.update(size=pool.size(), checked_out=pool.checkedout(),
+                         overflow=max(pool.overflow(), 0))
+        return stats
+
+
+def instrumented_pool_class(metrics, statement_timeout=0, set_local=False):
+    """
+    Create a QueuePool subclass recording its use in `metrics`.
+
+    A class rather than listeners on a pool instance, because the engine
+    replaces its pool instance when it is disposed.
+
+    Args:
+        metrics (PoolMetrics): The counters to update.
+        statement_timeout (int, optional): Statement timeout in ms set with SET
+            LOCAL in each transaction, 0 for none.
+        set_local (bool, optional): Whether to set the statement timeout per transaction.
+
+    Returns:
+        type: The pool class.
+    """
+    class InstrumentedQueuePool(QueuePool):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except PoolTimeoutError:
+                metrics.waited(time.perf_counter() - start, timed_out=True)
+                raise
+            metrics.waited(time.perf_counter() - start)
+            return connection
+
+    InstrumentedQueuePool.metrics = metrics
+    InstrumentedQueuePool.local_statement_timeout = statement_timeout if set_local else 0
+    for name, counter in (("checkout", "checkouts"), ("connect", "connects"),
+                          ("invalidate", "invalidations"), ("soft_invalidate", "invalidations")):
+        event.listen(InstrumentedQueuePool, name,
+                     lambda *args, counter=counter: metrics.count(counter))
+    return InstrumentedQueuePool
+
+
+@event.listens_for(Engine, "begin")
+def _set_local_statement_timeout(conn):
+    timeout = getattr(conn.engine.pool, "local_statement_timeout", 0)
+    if timeout:
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute("PRAGMA foreign_keys = ON")
+
+
+class PoolMonitor:
+    """
+    Flask extension configuring the connection pool from the app configuration
+    and recording its use. Must be initialized before Flask-SQLAlchemy.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Fill SQLALCHEMY_ENGINE_OPTIONS with the pool settings; explicit options are kept.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        metrics = PoolMetrics()
+        app.extensions["pool_metrics"] = metrics
+        uri = app.config.get("SQLALCHEMY_DATABASE_URI") or ""
+        if uri.startswith("sqlite"):
+            return
+        config = app.config
+        pgbouncer = config.get("DB_POOLER", "none") == "pgbouncer"
+        statement_timeout = int(config.get("DB_STATEMENT_TIMEOUT", 0))
+        options = dict(config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+        options.setdefault("poolclass", instrumented_pool_class(
+            metrics, statement_timeout, set_local=pgbouncer))
+        options.setdefault("pool_size", config.get("DB_POOL_SIZE", 5))
+        options.setdefault("max_overflow", config.get("DB_MAX_OVERFLOW", 10))
+        options.setdefault("pool_timeout", config.get("DB_POOL_TIMEOUT", 30))
+        options.setdefault("pool_recycle", config.get("DB_POOL_RECYCLE", 1800))
+        options.setdefault("pool_pre_ping", config.get("DB_POOL_PRE_PING", True))
+        if statement_timeout and not pgbouncer and uri.startswith("postgres"):
+            connect_args = options.setdefault("connect_args", {})
+            connect_args.setdefault("options", f"-c statement_timeout={statement_timeout}")
+        config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    def stats(self):
+        """
+        Get the pool counters of the current app.
+
+        Returns:
+            dict: See `PoolMetrics.to_dict`.
+        """
+        from flask import current_app
+        from web_app import db
+        return current_app.extensions["pool_metrics"].to_dict(db.engine.pool)
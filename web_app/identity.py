@@ -0,0 +1,183 @@
+"""
+This module caches the identity of the authenticated users.
+
+Every request of a logged in user, or carrying a JWT, needs the user it is made
+by. Instead of loading the User row each time, `current_user` (Flask-Login) and
+`get_current_user()` (Flask-JWT-Extended) are a `UserSnapshot`: an immutable copy
+of the columns identifying the user, kept in a small cache with a short time to
+live. A view changing the user loads the row itself, e.g.
+`db.session.get(User, current_user.id)`.
+
+A snapshot is dropped from the cache after a successful commit changing or
+deleting its user, whichever view or thread made the change. With several worker
+processes, the lru backend only drops the snapshot of the worker that handled
+the write; other workers use it for up to the time to live. Use the redis backend
+to share the cache between workers.
+
+With JWT_IDENTITY_CLAIMS, the access tokens carry the snapshot in a "user" claim
+and JWT requests do not read the cache nor the database at all. A token keeps the
+identity it was issued with until it expires, including after the user changed
+or was deleted.
+
+Configuration:
+- IDENTITY_CACHE_TYPE: Identity cache backend, "lru", "redis" or "null"
+- IDENTITY_CACHE_TIMEOUT: Time to live of cached identities in seconds
+- IDENTITY_CACHE_MAX_ENTRIES: Maximum number of identities kept by the lru backend
+- JWT_IDENTITY_CLAIMS: Put the identity of the user in the access tokens
+"""
+from collections import namedtuple
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from web_app.cache import LRUCache, NullCache, RedisCache
+
+FIELDS = ("id", "username", "email", "image_file", "is_verified")
+
+
+class UserSnapshot(UserMixin, namedtuple("UserSnapshot", FIELDS)):
+    """
+    Read-only copy of the identity of a user.
+
+    It compares equal to the User with the same id, so templates can keep
+    comparing `post.author == current_user`.
+
+    Attributes:
+        id (int): The id of the user.
+        username (str): The username.
+        email (str): The email address.
+        image_file (str): Filename of the user's profile picture.
+        is_verified (bool): Whether the email address is verified.
+    """
+    __slots__ = ()
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @classmethod
+    def from_user(cls, user):
+        """
+        Copy the identity of a user.
+
+        Args:
+            user: A User, or a row with the same attributes.
+
+        Returns:
+            UserSnapshot: The snapshot.
+        """
+        return cls(*(getattr(user, field) for field in FIELDS))
+
+    @classmethod
+    def from_claims(cls, subject, claims):
+        """
+        Rebuild a snapshot from the claims of a JWT.
+
+        Args:
+            subject (str): The subject of the token, the id of the user.
+            claims (dict): The "user" claim, see `jwt_claims`.
+
+        Returns:
+            UserSnapshot: The snapshot.
+        """
+        return cls(int(subject), *(claims.get(field) for field in FIELDS[1:]))
+
+    def __repr__(self):
+        return f"UserSnapshot({self.id}, '{self.username}')"
+
+
+def jwt_claims(user):
+    """
+    Get the additional claims of an access token of a user.
+
+    Args:
+        user: The User logging in.
+
+    Returns:
+        dict: The "user" claim when JWT_IDENTITY_CLAIMS is set, else no claims.
+    """
+    if not current_app.config.get("JWT_IDENTITY_CLAIMS"):
+        return {}
+    snapshot = UserSnapshot.from_user(user)
+    return {"user": {field: getattr(snapshot, field) for field in FIELDS[1:]}}
+
+
+class IdentityCache:
+    """
+    Flask extension caching the UserSnapshot of the authenticated users.
+    """
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.timeout = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Set up the backend from the app configuration and listen for commits.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        cache_type = app.config.get("IDENTITY_CACHE_TYPE", "lru")
+        self.timeout = app.config.get("IDENTITY_CACHE_TIMEOUT", 30)
+        if cache_type == "lru":
+            self.backend = LRUCache(app.config.get("IDENTITY_CACHE_MAX_ENTRIES", 10000))
+        elif cache_type == "redis":
+            self.backend = RedisCache.from_url(app.config["CACHE_REDIS_URL"])
+        else:
+            self.backend = NullCache()
+        if not event.contains(Session, "after_flush", self._collect_users):
+            event.listen(Session, "after_flush", self._collect_users)
+            event.listen(Session, "after_commit", self._invalidate)
+            event.listen(Session, "after_soft_rollback", self._discard)
+        app.extensions["identity_cache"] = self
+
+    @staticmethod
+    def _key(user_id):
+        return f"identity:{user_id}"
+
+    def get(self, user_id):
+        """
+        Get the snapshot of a user, from the cache or else from the database.
+
+        Args:
+            user_id (int): The id of the user.
+
+        Returns:
+            UserSnapshot: The snapshot, None when the user does not exist.
+        """
+        from web_app import db
+        from web_app.models import User
+        key = self._key(user_id)
+        snapshot = self.backend.get(key)
+        if snapshot is None:
+            row = (db.session.query(*(getattr(User, field) for field in FIELDS))
+                   .filter(User.id == user_id, User.deleted_at.is_(None)).first())
+            if row is None:
+                return None
+            snapshot = UserSnapshot.from_user(row)
+            self.backend.set(key, snapshot, self.timeout)
+        return snapshot
+
+    def _collect_users(self, session, flush_context):
+        from web_app.models import User
+        ids = session.info.setdefault("identity_ids", set())
+        ids.update(obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User))
+
+    def _invalidate(self, session):
+        ids = session.info.pop("identity_ids", None)
+        if ids:
+            self.invalidate(*ids)
+
+    def _discard(self, session, previous_transaction):
+        session.info.pop("identity_ids", None)
+
+    def invalidate(self, *user_ids):
+        """
+        Drop the cached snapshots of users.
+
+        Args:
+            *user_ids (int): The ids of the users.
+        """
+        for user_id in user_ids:
+            self.backend.delete(self._key(user_id))
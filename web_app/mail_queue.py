@@ -0,0 +1,182 @@
+"""
+This module delivers emails in the background from a durable queue table.
+
+Sending an email through SMTP takes one or more network round trips to the mail
+server, which used to happen inside the request. Instead, `MailQueue.send` stores
+the message in the `outgoing_mail` table and returns; a worker claims the due
+emails in batches, delivers each batch over a single SMTP connection, and retries
+failed deliveries with exponential backoff.
+
+Modes (MAIL_QUEUE_MODE):
+- thread: a daemon thread in each app process delivers the queue, started by
+  the first request of the process so that the emails left by a restart go out
+- external: emails are only queued, `flask mail-worker` delivers them
+- sync: emails are sent inside the request, as before
+
+Configuration:
+- MAIL_QUEUE_BATCH_SIZE: Maximum number of emails sent over one SMTP connection
+- MAIL_QUEUE_MAX_ATTEMPTS: Number of attempts before an email is marked failed
+- MAIL_QUEUE_RETRY_DELAY: Delay before the first retry in seconds, doubled on each attempt
+- MAIL_QUEUE_POLL_INTERVAL: How often the worker looks for due emails in seconds
+- MAIL_QUEUE_LEASE: How long a claimed email is reserved for the worker sending it in seconds
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from email.utils import formataddr
+from flask import current_app
+from flask_mail import Message
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+    """
+    Flask extension queuing emails and delivering them in the background.
+    """
+    def __init__(self, app=None):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the extension with the app.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        app.extensions["mail_queue"] = self
+        if app.config.get("MAIL_QUEUE_MODE", "thread") == "thread":
+            app.before_request(lambda: self._start_worker(app))
+
+    def send(self, msg):
+        """
+        Queue an email for delivery.
+
+        The email is committed to the queue with the current session.
+
+        Args:
+            msg (Message): The Flask-Mail message to send.
+        """
+        from web_app import db, mail
+        from web_app.models import OutgoingMail
+        app = current_app._get_current_object()
+        if app.config.get("MAIL_QUEUE_MODE", "thread") == "sync":
+            mail.send(msg)
+            return
+        sender = formataddr(msg.sender) if isinstance(msg.sender, tuple) else msg.sender
+        db.session.add(OutgoingMail(subject=msg.subject, sender=sender,
+                                    recipients=",".join(msg.recipients),
+                                    body=msg.body, html=msg.html))
+        db.session.commit()
+        if app.config.get("MAIL_QUEUE_MODE", "thread") == "thread":
+            self._start_worker(app)
+            self._wakeup.set()
+
+    def _start_worker(self, app):
+        # started lazily so that each gunicorn worker runs its own thread after the fork
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, args=(app,),
+                                                name="mail-queue", daemon=True)
+                self._thread.start()
+
+    def run(self, app, once=False):
+        """
+        Deliver due emails until stopped, or until the queue has no due email.
+
+        Args:
+            app (Flask): The application instance.
+            once (bool, optional): Return when no email is due. Defaults to False.
+        """
+        while True:
+            with app.app_context():
+                try:
+                    while self.deliver_batch():
+                        pass
+                except Exception:
+                    logger.exception("mail queue delivery failed")
+            if once:
+                return
+            self._wakeup.wait(app.config.get("MAIL_QUEUE_POLL_INTERVAL", 5))
+            self._wakeup.clear()
+
+    def _claim(self):
+        """
+        Reserve a batch of due emails for this worker.
+
+        Returns:
+            list: The ids of the claimed emails.
+        """
+        from web_app import db
+        from web_app.models import OutgoingMail
+        config = current_app.config
+        now = datetime.utcnow()
+        rows = (OutgoingMail.query
+                .filter(OutgoingMail.status.in_(("pending", "sending")),
+                        OutgoingMail.next_attempt_at <= now)
+                .order_by(OutgoingMail.next_attempt_at)
+                .limit(config.get("MAIL_QUEUE_BATCH_SIZE", 20))
+                .with_for_update(skip_locked=True)
+                .all())
+        lease = now + timedelta(seconds=config.get("MAIL_QUEUE_LEASE", 600))
+        for row in rows:
+            row.status = "sending"
+            row.next_attempt_at = lease
+        ids = [row.id for row in rows]
+        db.session.commit()
+        return ids
+
+    def deliver_batch(self):
+        """
+        Claim a batch of due emails and send them over a single SMTP connection.
+
+        Returns:
+            int: The number of emails claimed.
+        """
+        from web_app import db, mail
+        from web_app.models import OutgoingMail
+        ids = self._claim()
+        if not ids:
+            return 0
+        batch = OutgoingMail.query.filter(OutgoingMail.id.in_(ids)).all()
+        try:
+            with mail.connect() as conn:
+                for outgoing in batch:
+                    outgoing.attempts += 1
+                    try:
+                        conn.send(Message(outgoing.subject,
+                                          sender=outgoing.sender,
+                                          recipients=outgoing.recipients.split(","),
+                                          body=outgoing.body,
+                                          html=outgoing.html))
+                    except Exception as e:
+                        self._failed(outgoing, e)
+                    else:
+                        outgoing.status = "sent"
+                        outgoing.sent_at = datetime.utcnow()
+        except Exception as e:
+            # the connection could not be opened, or broke: retry the unsent emails
+            for outgoing in batch:
+                if outgoing.status == "sending":
+                    outgoing.attempts += 1
+                    self._failed(outgoing, e)
+        db.session.commit()
+        return len(ids)
+
+    @staticmethod
+    def _failed(outgoing, error):
+        config = current_app.config
+        outgoing.last_error = str(error)
+        if outgoing.attempts >= config.get("MAIL_QUEUE_MAX_ATTEMPTS", 5):
+            outgoing.status = "failed"
+            logger.error("giving up on mail %s to %s: %s", outgoing.id, outgoing.recipients, error)
+            return
+        delay = config.get("MAIL_QUEUE_RETRY_DELAY", 30) * 2 ** (outgoing.attempts - 1)
+        outgoing.status = "pending"
+        outgoing.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
@@ -2,30 +2,56 @@
 main.py
 -------
 
-This module defines the main routes for the Flask blogging application, including the home and about pages.
+This module defines the main routes for the Flask blogging application, including the home, search and about pages.
 """
 
 from flask import render_template, request, Blueprint
+from web_app import cache, search as post_search
+from web_app.conditional import conditional, posts_version
 from web_app.models import Post
+from web_app.models.loaders import load_with
+from web_app.models.pagination import keyset_paginate, keyset_requested
 
 main = Blueprint("main", __name__)
 
 @main.route("/")
 @main.route("/home")
+@conditional(posts_version, per_user=True)
+@cache.cached(tags=lambda: ["posts"])
 def home():
     """
     Display the home page with a list of blog posts.
 
-    The posts are paginated, showing 5 posts per page. The page number is 
-    retrieved from the request arguments.
+    The posts are paginated, showing 5 posts per page. The page number, or the
+    cursor when keyset pagination is used, is retrieved from the request arguments.
 
     Returns:
         Response: Rendered home page with blog posts.
     """
+    query = load_with(Post.query, "feed").filter(Post.visible())
+    if keyset_requested():
+        posts = keyset_paginate(query, (Post.date_posted, Post.id),
+                                cursor=request.args.get("cursor"), per_page=5, count="none")
+        return render_template("home.html", posts=posts)
     page = request.args.get("page", 1, type=int)
-    posts = Post.query.order_by(Post.date_posted.desc()).paginate(page=page, per_page=5)
+    posts = query.order_by(Post.date_posted.desc()).paginate(page=page, per_page=5)
     return render_template("home.html", posts=posts)
 
+@main.route("/search")
+@conditional(posts_version, per_user=True)
+@cache.cached(tags=lambda: ["posts"])
+def search():
+    """
+    Display the posts matching the words of the `q` argument, best match first.
+
+    Returns:
+        Response: Rendered search page, 5 results per page.
+    """
+    q = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+    posts = post_search.search(q, page=page, per_page=5) if q else None
+    return render_template("search.html", title="search", q=q, posts=posts)
+
 @main.route("/about")
 def about():
     """
@@ -0,0 +1,220 @@
+"""
+This module records request, query and template metrics and exports them for Prometheus.
+
+For every request it records the latency by endpoint, the count by status, the
+number of requests in progress, and the number of SQL queries the request issued
+with the time spent in them; for every template, the render time. They are served
+in the Prometheus text format at /metrics.
+
+Under gunicorn each worker is a separate process with its own counters. Set the
+PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory before
+starting gunicorn: the workers then write their metrics to files there and
+/metrics aggregates the files of all the workers, whichever worker answers.
+gunicorn.conf.py removes the files of the workers that exit.
+
+The statements and template renders of a request are timed once, by the hooks
+of this module, into a `RequestTimings` kept in `g.request_timings`, which the
+slow request log reads as well (see web_app/slowlog.py). The start of a
+statement is kept on its connection, with its execution context, until the
+statement completes or fails.
+
+A streamed response, e.g. the post page with POST_STREAMING, runs its queries
+and renders its templates after the after_request hooks: its request is
+recorded when the server closes the response, once the body is sent.
+
+Configuration:
+- METRICS_TOKEN: If set, /metrics requires an "Authorization: Bearer <token>" header
+"""
+import hmac
+import os
+import time
+from flask import Response, abort, current_app, g, has_request_context, request, before_render_template, template_rendered
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Gauge, Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request.", ["endpoint", "method"])
+REQUESTS = Counter(
+    "http_requests_total", "Requests handled.", ["endpoint", "method", "status"])
+IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being handled.", multiprocess_mode="livesum")
+REQUEST_QUERIES = Histogram(
+    "db_queries_per_request", "SQL queries issued by a request.", ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf")))
+REQUEST_QUERY_TIME = Histogram(
+    "db_query_seconds_per_request", "Time a request spent in SQL queries.", ["endpoint"])
+TEMPLATE_RENDER_TIME = Histogram(
+    "template_render_seconds", "Time spent rendering a template.", ["template"])
+
+
+# bounds the statements kept for requests issuing a lot of queries
+MAX_STATEMENTS = 100
+
+
+class RequestTimings:
+    """
+    The time a request spent in SQL statements and in templates.
+
+    Attributes:
+        start (float): `time.perf_counter()` at the start of the request.
+        sql_count (int): Number of statements.
+        sql_time (float): Seconds spent in the statements.
+        statements (list): The first MAX_STATEMENTS statements, as
+            (statement, parameters, executemany, seconds) tuples.
+        template_time (float): Seconds spent rendering templates, nested
+            templates (includes, imported macros) counted in their parent.
+        templates (list): The rendered templates, as (name, seconds) tuples.
+        finishing (bool): Whether the after_request hooks ran, the request being
+            recorded then or when its response is closed.
+    """
+    __slots__ = ("start", "sql_count", "sql_time", "statements", "template_time", "templates",
+                 "template_starts", "finishing")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements = []
+        self.template_time = 0.0
+        self.templates = []
+        self.template_starts = []
+        self.finishing = False
+
+
+def finish_request(response, finish):
+    """
+    Run the end of the measurement of a request once its body is produced.
+
+    Args:
+        response (Response): The response of the request.
+        finish (callable): Called without arguments, now for a buffered response,
+            when the server closes it for a streamed one.
+    """
+    if response.is_streamed:
+        response.call_on_close(finish)
+    else:
+        finish()
+
+
+def _endpoint():
+    # unmatched URLs share a label, so that scanners cannot create series at will
+    return request.endpoint or "unmatched"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append((context, time.perf_counter()))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()[1]
+    timings = g.get("request_timings") if has_request_context() else None
+    if timings is None:
+        return
+    timings.sql_count += 1
+    timings.sql_time += elapsed
+    if len(timings.statements) < MAX_STATEMENTS:
+        timings.statements.append((statement, parameters, executemany, elapsed))
+
+
+@event.listens_for(Engine, "handle_error")
+def _query_failed(context):
+    # a statement that raised never reaches after_cursor_execute
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts and starts[-1][0] is context.execution_context:
+        starts.pop()
+
+
+def _render_started(sender, template, context, **extra):
+    timings = g.get("request_timings")
+    if timings is not None:
+        timings.template_starts.append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra):
+    timings = g.get("request_timings")
+    if timings is None or not timings.template_starts:
+        return
+    elapsed = time.perf_counter() - timings.template_starts.pop()
+    name = template.name or "string"
+    timings.templates.append((name, elapsed))
+    if not timings.template_starts:
+        timings.template_time += elapsed
+    TEMPLATE_RENDER_TIME.labels(name).observe(elapsed)
+
+
+class Metrics:
+    """
+    Flask extension recording the metrics of the requests and serving /metrics.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the request hooks, the template signals and the /metrics view.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(_render_started, app)
+        template_rendered.connect(_render_finished, app)
+        app.add_url_rule("/metrics", "metrics", self.export)
+        app.extensions["metrics"] = self
+
+    @staticmethod
+    def _before():
+        g.request_timings = RequestTimings()
+        IN_PROGRESS.inc()
+
+    @staticmethod
+    def _after(response):
+        timings = g.get("request_timings")
+        if timings is None:
+            return response
+        endpoint, method, status = _endpoint(), request.method, str(response.status_code)
+        timings.finishing = True
+
+        def finish():
+            REQUEST_LATENCY.labels(endpoint, method).observe(time.perf_counter() - timings.start)
+            REQUESTS.labels(endpoint, method, status).inc()
+            REQUEST_QUERIES.labels(endpoint).observe(timings.sql_count)
+            REQUEST_QUERY_TIME.labels(endpoint).observe(timings.sql_time)
+            IN_PROGRESS.dec()
+        finish_request(response, finish)
+        return response
+
+    @staticmethod
+    def _teardown(exc):
+        # a streamed response tears the request down before its body is
+        # rendered, the timings stay in g until it is closed
+        timings = g.get("request_timings")
+        if timings is not None and not timings.finishing:
+            del g.request_timings
+            IN_PROGRESS.dec()
+
+    @staticmethod
+    def export():
+        """
+        Serve the metrics of all the processes in the Prometheus text format.
+
+        Returns:
+            Response: The metrics.
+        """
+        token = current_app.config.get("METRICS_TOKEN")
+        expected = f"Bearer {token}".encode()
+        if token and not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+            abort(401)
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
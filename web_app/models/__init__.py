@@ -5,21 +5,30 @@ Models:
 - User: Represents a user in the application
 - Post: Represents a post created by a user
 - Comment: Represents a comment on a post
+- Counter: Holds an application wide count of users, posts or comments
+- OutgoingMail: Represents an email queued for delivery
 """
 
 from .users import User
 from .posts import Post
 from .comments import Comment
+from .stats import Counter
+from .outbox import OutgoingMail
 from web_app import db
 
 
-User.posts = db.relationship('Post', backref='author', lazy=True, cascade="all, delete-orphan")
-User.comments = db.relationship("Comment", back_populates="author", cascade="all, delete-orphan")
+# the rows of a deleted user, post or comment are deleted by the database
+# (ON DELETE CASCADE), see `stats`; the session neither loads nor deletes them,
+# even when they are already loaded, so that no row is counted twice
+User.posts = db.relationship('Post', backref='author', lazy=True, passive_deletes="all")
+User.comments = db.relationship("Comment", back_populates="author", passive_deletes="all")
 
 
-Post.comments = db.relationship("Comment", back_populates="post", lazy=True, cascade="all, delete-orphan")
+Post.comments = db.relationship("Comment", back_populates="post", lazy=True, passive_deletes="all")
 
 
 
 Comment.post = db.relationship("Post", back_populates="comments")
 Comment.author = db.relationship("User", back_populates="comments")
+Comment.parent = db.relationship("Comment", remote_side=[Comment.id], back_populates="replies")
+Comment.replies = db.relationship("Comment", back_populates="parent", passive_deletes="all")
@@ -1,8 +1,39 @@
 """
 This module comprises Comment model.
+
+Comments are threaded: a reply has the comment it answers as `parent_id`. Each
+comment also stores its materialized path, the ids of its ancestors and its own
+id, zero padded to PATH_DIGITS and concatenated. Ordering the comments of a post
+by path lists every thread depth first, oldest first at every level, and the
+replies under a comment, however deep, are the rows whose path starts with its
+path, so a subtree is read with one range scan of ix_comment_post_id_path.
+
+The path needs the id of the comment, so it is set by an UPDATE right after the
+INSERT; comments inserted without the ORM must call `fill_paths`.
 """
 from datetime import datetime
+from sqlalchemy import bindparam, event, select, update
+from sqlalchemy.orm.attributes import set_committed_value
 from web_app import db
+from .users import User
+
+PATH_DIGITS = 10
+# replies to a comment this deep are attached to its parent instead
+MAX_DEPTH = 20
+
+
+def path_segment(comment_id):
+    """
+    Encode an id as a segment of a path.
+
+    Args:
+        comment_id (int): The id of a comment.
+
+    Returns:
+        str: The id, zero padded so that paths sort like the sequences of ids.
+    """
+    return f"{comment_id:0{PATH_DIGITS}d}"
+
 
 class Comment(db.Model):
     """
@@ -12,27 +43,127 @@ class Comment(db.Model):
         id (int): Primary key.
         content (str): Content of the comment.
         date_commented (datetime): Date and time when the comment was created.
+        updated_at (datetime): Date and time of the last change to the comment.
         user_id (int): Foreign key to the User model.
         author (relationship): Relationship to the User model.
         post_id (int): Foreign key to the Post model.
         post (relationship): Relationship to the Post model.
+        parent_id (int): Foreign key to the comment answered, None for a top level comment.
+        parent (relationship): Relationship to the comment answered.
+        replies (relationship): The direct replies to the comment.
+        path (str): Materialized path of the comment, see the module docstring.
+        depth (int): Number of ancestors, 0 for a top level comment.
+        reply_count (int): Number of direct replies, maintained by `stats`.
+
+    Indexes:
+        ix_comment_post_id_date_commented_id: the comments of a post, oldest first.
+        ix_comment_user_id: the comments of a user, used when deleting an account.
+        ix_comment_post_id_path: the threads of a post, depth first, and the subtree of a comment.
+        ix_comment_parent_id: the replies to a comment, used when deleting it.
+        ix_comment_post_id_parent_id_id: the first replies to each comment of a
+            thread page, and the top level comments of a post, in order.
     """
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.String(100), nullable=False)
     date_commented = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)    
-    post_id = db.Column(db.Integer, db.ForeignKey("post.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)    
+    post_id = db.Column(db.Integer, db.ForeignKey("post.id", ondelete="CASCADE"), nullable=False)
+    parent_id = db.Column(db.Integer, db.ForeignKey("comment.id", ondelete="CASCADE"), nullable=True)
+    path = db.Column(db.String(PATH_DIGITS * (MAX_DEPTH + 1)), nullable=False, default="", server_default="")
+    depth = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    reply_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
+    __table_args__ = (
+        db.Index("ix_comment_post_id_date_commented_id", post_id, date_commented, id),
+        db.Index("ix_comment_user_id", user_id),
+        db.Index("ix_comment_post_id_path", post_id, path),
+        db.Index("ix_comment_parent_id", parent_id),
+        db.Index("ix_comment_post_id_parent_id_id", post_id, parent_id, id),
+    )
+
+    @classmethod
+    def visible(cls):
+        """
+        Condition leaving out the comments of the accounts being purged.
+
+        The replies to such a comment still match it; the thread pages leave
+        them out with the comment they answer.
+
+        Returns:
+            ColumnElement: The condition, for `filter`.
+        """
+        return cls.user_id.not_in(User.being_purged())
 
     def to_dict(self):
         return {
             "id": self.id,
             "content": self.content,
-            "date_commented": self.date_commented,
+            "date_commented": self.date_commented.isoformat(),
             "user_id": self.user_id,
             "post_id": self.post_id,
+            "parent_id": self.parent_id,
+            "depth": self.depth,
+            "reply_count": self.reply_count,
         }
 
     def __repr__(self):
-        return f"Comment('{self.author}', '{self.content}', '{self.post}')"
\ No newline at end of file
+        return f"Comment('{self.author}', '{self.content}', '{self.post}')"
+
+
+@event.listens_for(Comment, "after_insert")
+def set_path(mapper, connection, target):
+    table = Comment.__table__
+    prefix, depth = "", 0
+    if target.parent_id is not None:
+        parent = connection.execute(select(table.c.path, table.c.depth)
+                                    .where(table.c.id == target.parent_id)).one()
+        prefix, depth = parent.path, parent.depth + 1
+    path = prefix + path_segment(target.id)
+    connection.execute(update(table).where(table.c.id == target.id).values(path=path, depth=depth))
+    set_committed_value(target, "path", path)
+    set_committed_value(target, "depth", depth)
+
+
+def fill_paths(connection, post_ids):
+    """
+    Set the path and depth of comments inserted without the ORM, e.g. with executemany.
+
+    Args:
+        connection (Connection): The connection the comments were inserted with.
+        post_ids (iterable): The posts the comments were inserted on.
+    """
+    table = Comment.__table__
+    post_ids = set(post_ids)
+    if not post_ids:
+        return
+    pending = connection.execute(select(table.c.id, table.c.parent_id)
+                                 .where(table.c.post_id.in_(post_ids), table.c.path == "")).all()
+    if not pending:
+        return
+    parent_ids = {row.parent_id for row in pending if row.parent_id is not None}
+    known = {row.id: (row.path, row.depth) for row in connection.execute(
+        select(table.c.id, table.c.path, table.c.depth)
+        .where(table.c.id.in_(parent_ids), table.c.path != ""))} if parent_ids else {}
+    values = []
+    # a reply may come before its parent, resolve the comments level by level
+    while pending:
+        unresolved = []
+        for row in pending:
+            if row.parent_id is None:
+                prefix, depth = "", 0
+            elif row.parent_id in known:
+                prefix, depth = known[row.parent_id]
+                depth += 1
+            else:
+                unresolved.append(row)
+                continue
+            known[row.id] = (prefix + path_segment(row.id), depth)
+            values.append({"comment_id": row.id, "new_path": known[row.id][0], "new_depth": depth})
+        if len(unresolved) == len(pending):
+            break
+        pending = unresolved
+    if values:
+        connection.execute(update(table).where(table.c.id == bindparam("comment_id"))
+                           .values(path=bindparam("new_path"), depth=bindparam("new_depth")), values)
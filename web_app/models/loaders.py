@@ -0,0 +1,56 @@
+"""
+This module defines named loader strategies for the pages of the application.
+
+Every view that renders a list of posts or a post with its comments touches
+relationships (`post.author`, `post.comments`, `comment.author`) that are
+declared with lazy loading. Without eager loading each row triggers its own
+query. A loader strategy bundles the eager loading options a given view needs
+so that the page renders in a constant number of queries.
+
+Strategies:
+- feed: posts with their author, used by the home page
+- post_detail: a post with its author; its comments are loaded a page at a time, see `threads`
+- author_page: posts of a single author, used by the user posts page
+- thread: comments with their author, used by the comment threads
+"""
+from sqlalchemy.orm import joinedload
+from .posts import Post
+from .comments import Comment
+
+
+LOADER_STRATEGIES = {
+    "feed": lambda: [joinedload(Post.author)],
+    "post_detail": lambda: [joinedload(Post.author)],
+    "author_page": lambda: [joinedload(Post.author)],
+    "thread": lambda: [joinedload(Comment.author)],
+}
+
+
+def loader_options(strategy):
+    """
+    Get the eager loading options of a named strategy.
+
+    Args:
+        strategy (str): The name of the loader strategy.
+
+    Returns:
+        list: The loader options to pass to `Query.options`.
+
+    Raises:
+        KeyError: If no strategy is registered under that name.
+    """
+    return LOADER_STRATEGIES[strategy]()
+
+
+def load_with(query, strategy):
+    """
+    Apply a named loader strategy to a query.
+
+    Args:
+        query (Query): The query to apply the strategy to.
+        strategy (str): The name of the loader strategy.
+
+    Returns:
+        Query: The query with the eager loading options applied.
+    """
+    return query.options(*loader_options(strategy))
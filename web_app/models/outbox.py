@@ -0,0 +1,48 @@
+"""
+This module comprises OutgoingMail model, the durable queue of emails waiting for delivery.
+"""
+from datetime import datetime
+from web_app import db
+
+
+class OutgoingMail(db.Model):
+    """
+    OutgoingMail model representing an email queued for delivery by `mail_queue`.
+
+    Attributes:
+        id (int): Primary key.
+        subject (str): Subject of the email.
+        sender (str): Sender address, None for MAIL_DEFAULT_SENDER.
+        recipients (str): Comma separated recipient addresses.
+        body (str): Plain text body.
+        html (str): HTML body, if any.
+        status (str): "pending", "sending", "sent" or "failed".
+        attempts (int): Number of delivery attempts so far.
+        next_attempt_at (datetime): When the email is due, or when the lease of a
+            worker currently sending it expires.
+        last_error (str): Error of the last failed attempt.
+        created_at (datetime): Date and time when the email was queued.
+        sent_at (datetime): Date and time when the email was delivered.
+
+    Indexes:
+        ix_outgoing_mail_status_next_attempt_at: the emails due for delivery.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255))
+    recipients = db.Column(db.Text, nullable=False)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_outgoing_mail_status_next_attempt_at", status, next_attempt_at),
+    )
+
+    def __repr__(self):
+        return f"OutgoingMail('{self.subject}', '{self.recipients}', '{self.status}')"
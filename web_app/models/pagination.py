@@ -0,0 +1,262 @@
+"""
+This module provides keyset (cursor) pagination for ordered queries.
+
+Offset pagination (`Query.paginate`) skips `OFFSET` rows on every request and
+counts the whole table to know the number of pages, so deep pages get slower as
+the table grows. Keyset pagination instead remembers the sort key of the last
+row that was shown and asks the database for the rows that come after it,
+which is served straight from an index whatever the page depth.
+
+Cursors are opaque url-safe strings encoding the direction and the sort key of
+the boundary row, e.g. `(date_posted, id)` for posts.
+
+Count modes:
+- exact: run a `COUNT(*)` over the unpaginated query
+- approximate: use the planner's row estimate on PostgreSQL, exact elsewhere
+- none: skip counting, `total` is None
+"""
+import base64
+import json
+from datetime import datetime
+from flask import abort, current_app, request
+from sqlalchemy import DateTime, text, tuple_
+
+COUNT_MODES = ("exact", "approximate", "none")
+
+
+class KeysetPage:
+    """
+    A page of results returned by `keyset_paginate`.
+
+    Attributes:
+        items (list): The rows of the page, in display order.
+        per_page (int): The maximum number of rows in a page.
+        total (int): The number of rows of the whole query, None when not counted.
+        next_cursor (str): The cursor of the following page, None on the last page.
+        prev_cursor (str): The cursor of the preceding page, None on the first page.
+    """
+    def __init__(self, items, per_page, total, next_cursor, prev_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def meta(self):
+        """
+        Describe the page for the `meta` block of API responses.
+
+        Returns:
+            dict: The page size, the cursors and the total when it was counted.
+        """
+        meta = {
+            "per_page": self.per_page,
+            "next_cursor": self.next_cursor,
+            "prev_cursor": self.prev_cursor,
+        }
+        if self.total is not None:
+            meta["total_items"] = self.total
+        return meta
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(direction, values):
+    """
+    Encode a cursor.
+
+    Args:
+        direction (str): "next" or "prev".
+        values (tuple): The sort key of the boundary row.
+
+    Returns:
+        str: The opaque cursor.
+    """
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps([direction, values], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): The opaque cursor.
+        columns (tuple): The columns making up the sort key.
+
+    Returns:
+        tuple: The direction and the sort key values.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+        if direction not in ("next", "prev") or len(values) != len(columns):
+            raise ValueError("malformed cursor")
+        decoded = []
+        for column, value in zip(columns, values):
+            if isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            decoded.append(value)
+    except (ValueError, TypeError) as e:
+        raise ValueError("malformed cursor") from e
+    return direction, tuple(decoded)
+
+
+def count_query(query, mode="exact"):
+    """
+    Count the rows of a query.
+
+    Args:
+        query (Query): The query to count.
+        mode (str): One of `COUNT_MODES`.
+
+    Returns:
+        int: The number of rows, None when mode is "none".
+    """
+    if mode == "none":
+        return None
+    query = query.order_by(None)
+    bind = query.session.get_bind()
+    if mode == "approximate" and bind.dialect.name == "postgresql":
+        plan = query.session.execute(explain_statement(query.statement, bind.dialect)).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
+    return query.count()
+
+
+def explain_statement(statement, dialect):
+    """
+    Build the EXPLAIN of a statement, whose plan holds the estimated row count.
+
+    Args:
+        statement (Select): The statement.
+        dialect (Dialect): The PostgreSQL dialect of the connection.
+
+    Returns:
+        TextClause: The `EXPLAIN (FORMAT JSON)` statement; its scalar result is
+            the plan, the estimate being `plan[0]["Plan"]["Plan Rows"]`.
+    """
+    compiled = statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+    return text(f"EXPLAIN (FORMAT JSON) {compiled}")
+
+
+def keyset_requested():
+    """
+    Tell whether the current request should be paginated with cursors.
+
+    A `cursor` argument selects keyset pagination and a `page` argument selects
+    offset pagination; otherwise the `PAGINATION_MODE` setting decides.
+
+    Returns:
+        bool: True for keyset pagination.
+    """
+    if "cursor" in request.args:
+        return True
+    if "page" in request.args:
+        return False
+    return current_app.config.get("PAGINATION_MODE") == "keyset"
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=5, descending=True,
+                    count="exact", error_out=True):
+    """
+    Paginate a query on a unique sort key instead of an offset.
+
+    Args:
+        query (Query): The unordered query to paginate.
+        columns (tuple): The columns making up a unique sort key, e.g. (Post.date_posted, Post.id).
+        cursor (str, optional): The cursor of the requested page, None for the first page.
+        per_page (int, optional): The maximum number of rows in a page. Defaults to 5.
+        descending (bool, optional): Whether rows are shown newest first. Defaults to True.
+        count (str, optional): One of `COUNT_MODES`. Defaults to "exact".
+        error_out (bool, optional): Abort with 400 on a malformed cursor or count
+            mode instead of raising ValueError. Defaults to True.
+
+    Returns:
+        KeysetPage: The requested page.
+    """
+    try:
+        if count not in COUNT_MODES:
+            raise ValueError(f"unknown count mode {count!r}")
+        direction, values = decode_cursor(cursor, columns) if cursor else ("next", None)
+    except ValueError:
+        if error_out:
+            abort(400)
+        raise
+    per_page = max(per_page, 1)
+    total = count_query(query, count)
+    rows = keyset_filter(query, columns, direction, values, per_page, descending).all()
+    return keyset_page(rows, columns, direction, values, per_page, total)
+
+
+def keyset_filter(query, columns, direction, values, per_page, descending=True):
+    """
+    Restrict a query to the rows of a keyset page, and the row after them.
+
+    Args:
+        query (Query): The unordered query, or an unordered `select()`.
+        columns (tuple): The columns making up a unique sort key.
+        direction (str): "next" or "prev", from the cursor.
+        values (tuple): The sort key of the cursor, None for the first page.
+        per_page (int): The maximum number of rows in a page.
+        descending (bool, optional): Whether rows are shown newest first. Defaults to True.
+
+    Returns:
+        Query: The query, or statement, selecting up to `per_page` + 1 rows.
+    """
+    key = tuple_(*columns)
+    # walking backwards means flipping both the comparison and the ordering
+    newest_first = descending == (direction == "next")
+    if values is not None:
+        bound = tuple_(*values)
+        query = query.filter(key < bound if newest_first else key > bound)
+    order = [c.desc() if newest_first else c.asc() for c in columns]
+    return query.order_by(*order).limit(per_page + 1)
+
+
+def keyset_page(rows, columns, direction, values, per_page, total):
+    """
+    Make the page of the rows selected by `keyset_filter`.
+
+    Args:
+        rows (list): The rows, which must have an attribute per sort key column.
+        columns (tuple): The columns making up the sort key.
+        direction (str): "next" or "prev", from the cursor.
+        values (tuple): The sort key of the cursor, None for the first page.
+        per_page (int): The maximum number of rows in a page.
+        total (int): The number of rows of the whole query, None when not counted.
+
+    Returns:
+        KeysetPage: The page.
+    """
+    forward = direction == "next"
+    has_more = len(rows) > per_page
+    rows = list(rows[:per_page])
+    if not forward:
+        rows.reverse()
+
+    def boundary(row, direction):
+        return encode_cursor(direction, tuple(getattr(row, c.key) for c in columns))
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or not forward:
+            next_cursor = boundary(rows[-1], "next")
+        if values is not None and (has_more or forward):
+            prev_cursor = boundary(rows[0], "prev")
+    return KeysetPage(rows, per_page, total, next_cursor, prev_cursor)
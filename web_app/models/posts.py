@@ -3,6 +3,7 @@ This module comprises Post model.
 """
 from datetime import datetime
 from web_app import db
+from .users import User
 
 
 class Post(db.Model):
@@ -15,15 +16,39 @@ class Post(db.Model):
         date_posted (datetime): Date and time when the post was created.
         content (str): Content of the post.
         user_id (int): Foreign key to the User model.
+        comment_count (int): Number of comments on the post, maintained by `stats`.
+        updated_at (datetime): Date and time of the last change to the post or to its comment count.
         comments (relationship): a one to many Relationship to the Comment model.
+
+    Indexes:
+        ix_post_date_posted_id: the home feed, newest first.
+        ix_post_user_id_date_posted_id: the posts of a user, newest first.
+        ix_post_updated_at: the last change to any post, for conditional requests.
     """
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     content = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"), nullable=False)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_post_date_posted_id", date_posted.desc(), id.desc()),
+        db.Index("ix_post_user_id_date_posted_id", user_id, date_posted.desc(), id.desc()),
+        db.Index("ix_post_updated_at", updated_at),
+    )
+
 
+    @classmethod
+    def visible(cls):
+        """
+        Condition leaving out the posts of the accounts being purged.
 
+        Returns:
+            ColumnElement: The condition, for `filter`.
+        """
+        return cls.user_id.not_in(User.being_purged())
 
     def to_dict(self):
         return {
@@ -32,6 +57,7 @@ class Post(db.Model):
             "date_posted": self.date_posted.isoformat(),
             "content": self.content,
             "user_id": self.user_id,
+            "comment_count": self.comment_count,
         }
 
 
@@ -0,0 +1,185 @@
+"""
+This module provides precompiled row serializers for the API.
+
+`Model.to_dict` needs a full ORM instance: every column is loaded, the instance
+is registered in the session identity map, and the dict is then built attribute
+by attribute. The API list endpoints only need plain values, so a `Schema`
+selects exactly the columns it serializes, gets them back as rows, and turns
+each row into a dict with a function built once per schema.
+
+The output of a schema matches the `to_dict` method of its model. Clients can
+ask for a subset of the fields, and for extra fields such as the post `excerpt`,
+with `?fields=id,title,excerpt`: only the columns of those fields are selected,
+so a title listing never reads the post bodies.
+"""
+from flask import abort, request
+from sqlalchemy import func
+from web_app import db
+from .users import User
+from .posts import Post
+from .comments import Comment
+
+
+EXCERPT_LENGTH = 200
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _excerpt(value):
+    # one character more than the excerpt is selected to tell whether the text was cut
+    if value is None or len(value) <= EXCERPT_LENGTH:
+        return value
+    cut = value[:EXCERPT_LENGTH]
+    space = cut.rfind(" ")
+    if space > EXCERPT_LENGTH // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+
+def _compile(fields):
+    names = tuple(name for name, _, _ in fields)
+    converted = tuple((i, conv) for i, (_, _, conv) in enumerate(fields) if conv)
+    if not converted:
+        # the selected columns come first: the columns kept after them are dropped by zip
+        return lambda row: dict(zip(names, row))
+
+    def dump(row):
+        values = list(row[:len(names)])
+        for i, conv in converted:
+            values[i] = conv(values[i])
+        return dict(zip(names, values))
+    return dump
+
+
+class Schema:
+    """
+    Serializer of rows of selected columns.
+
+    Args:
+        fields (list): (name, column, converter) tuples, converter being a
+            function applied to the value or None.
+        extra (list, optional): Fields in the same form that are only
+            serialized when asked for.
+        keep (list, optional): Columns selected without being serialized, e.g.
+            the sort key of keyset pagination.
+
+    Attributes:
+        columns (list): The columns to select, labeled with the field names.
+        dump (callable): Turns a row selected with `columns` into a dict.
+    """
+    def __init__(self, fields, extra=(), keep=()):
+        self.fields = list(fields)
+        self.names = [name for name, _, _ in self.fields]
+        self.columns = [column.label(name) for name, column, _ in self.fields]
+        self.columns += [column.label(column.key) for column in keep
+                         if column.key not in self.names]
+        self.dump = _compile(self.fields)
+        self._available = {field[0]: field for field in self.fields + list(extra)}
+        self._subsets = {}
+
+    def only(self, names, keep=()):
+        """
+        Get a schema serializing some of the fields.
+
+        Args:
+            names (iterable): The names of the fields, default or extra.
+            keep (tuple, optional): Columns to select without serializing them.
+
+        Returns:
+            Schema: The schema, shared by all the calls with the same arguments.
+
+        Raises:
+            ValueError: If a name is not a field of this schema.
+        """
+        names = set(names)
+        unknown = names - self._available.keys()
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        # a canonical order bounds the cache to one schema per subset
+        key = (tuple(name for name in self._available if name in names), tuple(keep))
+        subset = self._subsets.get(key)
+        if subset is None:
+            subset = Schema([self._available[name] for name in key[0]], keep=keep)
+            self._subsets[key] = subset
+        return subset
+
+    def for_request(self, keep=(), args=None):
+        """
+        Get the schema of the fields asked for with the `fields` query argument.
+
+        Aborts with 400 if a field is unknown.
+
+        Args:
+            keep (tuple, optional): Columns to select without serializing them.
+            args (MultiDict, optional): The query arguments, those of the Flask
+                request when None, e.g. the arguments of a Quart request.
+
+        Returns:
+            Schema: This schema if no fields were asked for and it selects the `keep` columns.
+        """
+        args = request.args if args is None else args
+        names = [name.strip() for name in args.get("fields", "").split(",") if name.strip()]
+        if not names:
+            if all(column.key in self.names for column in keep):
+                return self
+            names = self.names
+        try:
+            return self.only(names, keep)
+        except ValueError:
+            abort(400)
+
+    def query(self):
+        """
+        Start a query selecting the schema columns.
+
+        Returns:
+            Query: The query, its results are rows for `dump`.
+        """
+        return db.session.query(*self.columns)
+
+    def dump_many(self, rows):
+        """
+        Serialize rows.
+
+        Args:
+            rows (iterable): Rows selected with `columns`.
+
+        Returns:
+            list: The dicts.
+        """
+        dump = self.dump
+        return [dump(row) for row in rows]
+
+
+post_schema = Schema([
+    ("id", Post.id, None),
+    ("title", Post.title, None),
+    ("date_posted", Post.date_posted, _isoformat),
+    ("content", Post.content, None),
+    ("user_id", Post.user_id, None),
+    ("comment_count", Post.comment_count, None),
+], extra=[
+    ("excerpt", func.substr(Post.content, 1, EXCERPT_LENGTH + 1), _excerpt),
+])
+
+user_schema = Schema([
+    ("id", User.id, None),
+    ("username", User.username, None),
+    ("email", User.email, None),
+    ("password", User.password, None),
+    ("is_verified", User.is_verified, None),
+    ("post_count", User.post_count, None),
+])
+
+comment_schema = Schema([
+    ("id", Comment.id, None),
+    ("content", Comment.content, None),
+    ("date_commented", Comment.date_commented, _isoformat),
+    ("user_id", Comment.user_id, None),
+    ("post_id", Comment.post_id, None),
+    ("parent_id", Comment.parent_id, None),
+    ("depth", Comment.depth, None),
+    ("reply_count", Comment.reply_count, None),
+])
@@ -0,0 +1,211 @@
+"""
+This module comprises the Counter model and the listeners keeping the counters up to date.
+
+Counting rows with `COUNT(*)`, or worse by loading them, gets slower as the tables
+grow. Instead, the number of users, posts and comments is kept in the counter
+table, and the number of posts of a user, comments of a post and direct replies
+to a comment in the denormalized `User.post_count`, `Post.comment_count` and
+`Comment.reply_count` columns. They are
+incremented and decremented in the same transaction as the insert or delete,
+through mapper events, so reading them is O(1).
+
+The posts and comments of a deleted user, the comments of a deleted post and the
+replies to a deleted comment are deleted by the database (ON DELETE CASCADE),
+without mapper events. Before the DELETE of a user, post or comment, the rows it
+takes with it are counted with aggregate queries and the counters they affect
+are decremented, however many there are.
+
+Note that bulk `Query.delete()` and raw SQL bypass mapper events and would leave
+the counters stale; Core bulk inserts must call `count_inserted`.
+"""
+from collections import Counter as Tally
+from sqlalchemy import event, exists, func, insert, select, update
+from web_app import db
+from .users import User
+from .posts import Post
+from .comments import Comment
+
+COUNTERS = ("users", "posts", "comments")
+
+
+class Counter(db.Model):
+    """
+    Counter model holding an application wide count.
+
+    Attributes:
+        name (str): Primary key, one of `COUNTERS`.
+        value (int): The current count.
+    """
+    name = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"Counter('{self.name}', '{self.value}')"
+
+
+@event.listens_for(Counter.__table__, "after_create")
+def seed_counters(target, connection, **kw):
+    """
+    Insert the counter rows when the table is created with `db.create_all()`.
+    """
+    connection.execute(insert(target), [{"name": name, "value": 0} for name in COUNTERS])
+
+
+def _bump(connection, name, delta):
+    connection.execute(update(Counter.__table__)
+                       .where(Counter.__table__.c.name == name)
+                       .values(value=Counter.__table__.c.value + delta))
+
+
+def _bump_column(connection, model, column, row_id, delta):
+    table = model.__table__
+    connection.execute(update(table)
+                       .where(table.c.id == row_id)
+                       .values({column: table.c[column] + delta}))
+
+
+@event.listens_for(User, "after_insert")
+def user_inserted(mapper, connection, target):
+    _bump(connection, "users", 1)
+
+
+@event.listens_for(User, "before_delete")
+def user_deleting(mapper, connection, target):
+    post, comment = Post.__table__, Comment.__table__
+    mine = comment.alias("mine")
+    own_posts = select(post.c.id).where(post.c.user_id == target.id)
+    posts, comments = connection.execute(
+        select(func.count(), func.coalesce(func.sum(post.c.comment_count), 0))
+        .where(post.c.user_id == target.id)).one()
+
+    def under_own_comment(strict):
+        # whether a comment is in the subtree of a comment of the user
+        lower = comment.c.path > mine.c.path if strict else comment.c.path >= mine.c.path
+        return exists().where(mine.c.user_id == target.id, mine.c.post_id == comment.c.post_id,
+                              mine.c.path != "", lower, comment.c.path < mine.c.path + ":")
+
+    # on the posts of others, the comments of the user go with their replies
+    elsewhere = connection.execute(
+        select(comment.c.post_id, func.count())
+        .where(comment.c.post_id.not_in(own_posts), under_own_comment(strict=False))
+        .group_by(comment.c.post_id)).all()
+    for post_id, count in elsewhere:
+        _bump_column(connection, Post, "comment_count", post_id, -count)
+        comments += count
+    # and the comments they answer lose a reply, unless they go too
+    answered = connection.execute(
+        select(comment.c.parent_id, func.count())
+        .where(comment.c.user_id == target.id, comment.c.parent_id.is_not(None),
+               comment.c.post_id.not_in(own_posts), ~under_own_comment(strict=True))
+        .group_by(comment.c.parent_id)).all()
+    for parent_id, count in answered:
+        _bump_column(connection, Comment, "reply_count", parent_id, -count)
+    if posts:
+        _bump(connection, "posts", -posts)
+    if comments:
+        _bump(connection, "comments", -comments)
+
+
+@event.listens_for(User, "after_delete")
+def user_deleted(mapper, connection, target):
+    _bump(connection, "users", -1)
+
+
+@event.listens_for(Post, "after_insert")
+def post_inserted(mapper, connection, target):
+    _bump(connection, "posts", 1)
+    _bump_column(connection, User, "post_count", target.user_id, 1)
+
+
+@event.listens_for(Post, "before_delete")
+def post_deleting(mapper, connection, target):
+    table = Post.__table__
+    # read from the database: the comments already deleted with the ORM were counted
+    comments = connection.execute(select(table.c.comment_count).where(table.c.id == target.id)).scalar()
+    if comments:
+        _bump(connection, "comments", -comments)
+
+
+@event.listens_for(Post, "after_delete")
+def post_deleted(mapper, connection, target):
+    _bump(connection, "posts", -1)
+    _bump_column(connection, User, "post_count", target.user_id, -1)
+
+
+@event.listens_for(Comment, "after_insert")
+def comment_inserted(mapper, connection, target):
+    _bump(connection, "comments", 1)
+    _bump_column(connection, Post, "comment_count", target.post_id, 1)
+    if target.parent_id is not None:
+        _bump_column(connection, Comment, "reply_count", target.parent_id, 1)
+
+
+@event.listens_for(Comment, "before_delete")
+def comment_deleting(mapper, connection, target):
+    table = Comment.__table__
+    path = connection.execute(select(table.c.path).where(table.c.id == target.id)).scalar()
+    if not path:
+        return
+    replies = connection.execute(
+        select(func.count()).where(table.c.post_id == target.post_id,
+                                   table.c.path > path, table.c.path < path + ":")).scalar()
+    if replies:
+        _bump(connection, "comments", -replies)
+        _bump_column(connection, Post, "comment_count", target.post_id, -replies)
+
+
+@event.listens_for(Comment, "after_delete")
+def comment_deleted(mapper, connection, target):
+    _bump(connection, "comments", -1)
+    _bump_column(connection, Post, "comment_count", target.post_id, -1)
+    if target.parent_id is not None:
+        _bump_column(connection, Comment, "reply_count", target.parent_id, -1)
+
+
+def count_inserted(connection, model, rows):
+    """
+    Update the counters for rows inserted without the ORM, e.g. with executemany.
+
+    Args:
+        connection (Connection): The connection the rows were inserted with.
+        model: Post or Comment.
+        rows (list): The inserted rows as dicts.
+    """
+    if not rows:
+        return
+    if model is Post:
+        name, parent, column, key = "posts", User, "post_count", "user_id"
+    else:
+        name, parent, column, key = "comments", Post, "comment_count", "post_id"
+    _bump(connection, name, len(rows))
+    for parent_id, delta in Tally(row[key] for row in rows).items():
+        _bump_column(connection, parent, column, parent_id, delta)
+    if model is Comment:
+        replied = Tally(row["parent_id"] for row in rows if row.get("parent_id") is not None)
+        for parent_id, delta in replied.items():
+            _bump_column(connection, Comment, "reply_count", parent_id, delta)
+
+
+def get_stats():
+    """
+    Read all application wide counters in a single query.
+
+    Returns:
+        dict: The value of each counter keyed by name.
+    """
+    stats = dict.fromkeys(COUNTERS, 0)
+    stats.update(db.session.query(Counter.name, Counter.value).all())
+    return stats
+
+
+def get_count(name):
+    """
+    Read a single application wide counter.
+
+    Args:
+        name (str): The counter name, one of `COUNTERS`.
+
+    Returns:
+        int: The counter value.
+    """
+    return db.session.query(Counter.value).filter_by(name=name).scalar() or 0
@@ -0,0 +1,295 @@
+"""
+This module loads comment threads a page at a time.
+
+A page of a thread is a slice of the top level comments of a post, or of the
+direct replies to a comment, each with its replies down to `depth` levels and at
+most `replies` replies per comment. It is read in a single query, a level at a
+time, each level a CTE of ids:
+- the roots are the first `per_page` + 1 children of the parent after the cursor
+- the comments of the next level are the first `replies` children of each
+  comment of the level above, found with ix_comment_post_id_parent_id_id: the id
+  of the `replies`-th child bounds a range scan of the children of the comment
+Siblings are ordered by id, which is the order of their paths. The rows read are
+thus bounded by `per_page`, `depth` and `replies`, whatever the size of the
+thread: a root with 10000 replies costs its first `replies` of them. The rows
+are returned ordered by their materialized path (see `comments`), every thread
+depth first. Where a comment has more replies than are shown,
+`ThreadNode.more_replies` says how many are left and `ThreadNode.replies_cursor`
+continues them.
+
+The comments of the accounts being purged are left out, with their replies.
+
+Cursors are keyset cursors over the path (see `pagination`), forward only.
+
+`stream_thread` reads the same page with a server-side cursor, a chunk of rows
+at a time, and hands out each root once its replies are read: a page can then
+hold any number of roots while only one of them is in memory.
+"""
+from flask import abort
+from sqlalchemy import and_, func, select, union_all
+from sqlalchemy.orm import aliased
+from .comments import Comment, MAX_DEPTH, PATH_DIGITS
+from .pagination import KeysetPage, decode_cursor, encode_cursor
+from .users import User
+
+
+class ThreadNode:
+    """
+    A comment of a thread page and the replies loaded with it.
+
+    Attributes:
+        comment: The comment, an ORM instance or a row, depending on the query.
+        replies (list): The ThreadNode of the replies loaded, oldest first.
+    """
+    def __init__(self, comment):
+        self.comment = comment
+        self.replies = []
+
+    @property
+    def more_replies(self):
+        """
+        int: Number of direct replies that were not loaded.
+        """
+        return self.comment.reply_count - len(self.replies)
+
+    @property
+    def replies_cursor(self):
+        """
+        str: The cursor continuing the replies after the ones loaded, None when
+            none were loaded or there are no more.
+        """
+        if not self.more_replies or not self.replies:
+            return None
+        return encode_cursor("next", (self.replies[-1].comment.path,))
+
+
+def thread_query(query, post_id, parent=None, after=None, per_page=10, depth=3, replies=3):
+    """
+    Build the query of a page of a thread.
+
+    The query reads the roots of the page and, for each comment read, at most
+    `replies` of its replies, down to `depth` levels.
+
+    Args:
+        query (Query): The query selecting the comments, e.g. `Comment.query` or
+            the query of a schema; it must select `Comment.path` and `Comment.depth`.
+        post_id (int): The post of the thread.
+        parent (Comment, optional): The comment whose replies are listed, None for
+            the top level comments of the post.
+        after (str, optional): The path of the last root of the previous page.
+        per_page (int, optional): Number of roots, None for all of them. Defaults to 10.
+        depth (int, optional): Number of levels loaded, 1 for the roots only. Defaults to 3.
+        replies (int, optional): Maximum number of replies loaded per comment. Defaults to 3.
+
+    Returns:
+        Query: The query, ordered by path, returning the rows of the page and the
+            root following it, if any.
+    """
+    roots = select(Comment.id).where(
+        Comment.post_id == post_id,
+        Comment.parent_id == parent.id if parent is not None else Comment.parent_id.is_(None),
+        Comment.user_id.not_in(User.being_purged()))
+    if after:
+        roots = roots.where(Comment.id > int(after[-PATH_DIGITS:]))
+    roots = roots.order_by(Comment.id)
+    if per_page is None:
+        level = roots.cte("thread_level_0")
+        levels = [level]
+    else:
+        # the root following the page tells whether there is a next page, its
+        # replies are not read
+        levels = [roots.limit(per_page + 1).cte("thread_roots")]
+        level = roots.limit(per_page).cte("thread_level_0")
+    if replies > 0:
+        for number in range(1, max(depth, 1)):
+            level = _first_replies(level, post_id, replies).cte(f"thread_level_{number}")
+            levels.append(level)
+    page = union_all(*(select(level.c.id) for level in levels)).subquery()
+    return query.join(page, Comment.id == page.c.id).order_by(Comment.path)
+
+
+def _first_replies(parents, post_id, replies):
+    """
+    Select the ids of the first replies to each of a set of comments.
+
+    Args:
+        parents (CTE): The ids of the comments, as an `id` column.
+        post_id (int): The post of the comments.
+        replies (int): Maximum number of replies per comment.
+
+    Returns:
+        Select: The ids, as an `id` column.
+    """
+    reply, sibling = aliased(Comment), aliased(Comment)
+    siblings = select(sibling.id).where(sibling.post_id == post_id, sibling.parent_id == parents.c.id)
+    # the id of the last reply kept: the `replies`-th visible one, or the last
+    # one when there are fewer
+    nth = (siblings.where(sibling.user_id.not_in(User.being_purged()))
+           .order_by(sibling.id).offset(replies - 1).limit(1).scalar_subquery())
+    last = siblings.with_only_columns(func.max(sibling.id)).scalar_subquery()
+    return (select(reply.id)
+            .join_from(parents, reply, and_(reply.post_id == post_id,
+                                            reply.parent_id == parents.c.id,
+                                            reply.id <= func.coalesce(nth, last)))
+            .where(reply.user_id.not_in(User.being_purged())))
+
+
+def load_thread(query, post_id, parent=None, cursor=None, per_page=10, depth=3, replies=3,
+                error_out=True):
+    """
+    Load a page of a thread.
+
+    Args:
+        query (Query): The query selecting the comments, see `thread_query`. Rows
+            must have the `id`, `parent_id`, `path`, `depth` and `reply_count` attributes.
+        post_id (int): The post of the thread.
+        parent (Comment, optional): The comment whose replies are listed, None for
+            the top level comments of the post.
+        cursor (str, optional): The cursor of the requested page, None for the first page.
+        per_page (int, optional): Number of roots. Defaults to 10.
+        depth (int, optional): Number of levels loaded. Defaults to 3.
+        replies (int, optional): Maximum number of replies loaded per comment. Defaults to 3.
+        error_out (bool, optional): Abort with 400 on a malformed cursor instead
+            of raising ValueError. Defaults to True.
+
+    Returns:
+        KeysetPage: The ThreadNode of the roots, with a next cursor; the total
+            is the number of replies of `parent`, None for a post.
+    """
+    after = _decode_after(cursor, error_out)
+    per_page, depth = max(per_page, 1), min(max(depth, 1), MAX_DEPTH + 1)
+    base = parent.depth + 1 if parent is not None else 0
+    rows = thread_query(query, post_id, parent, after, per_page, depth, max(replies, 0)).all()
+
+    roots, nodes = [], {}
+    for row in rows:
+        node = ThreadNode(row)
+        if row.depth == base:
+            roots.append(node)
+        elif row.parent_id in nodes:
+            nodes[row.parent_id].replies.append(node)
+        else:
+            # the parent was not kept, e.g. beyond the replies limit
+            continue
+        nodes[row.id] = node
+    next_cursor = None
+    if len(roots) > per_page:
+        roots = roots[:per_page]
+        next_cursor = encode_cursor("next", (roots[-1].comment.path,))
+    total = parent.reply_count if parent is not None else None
+    return KeysetPage(roots, per_page, total, next_cursor, None)
+
+
+class ThreadStream:
+    """
+    A page of a thread read while it is iterated, see `stream_thread`.
+
+    It can only be iterated once. Iterating it yields the ThreadNode of the
+    roots, each with its replies, as soon as they are read.
+
+    Attributes:
+        next_cursor (str): The cursor of the following page, known once the
+            iteration is over; None when the page is the last one.
+        total: None, like the total of a page of a post.
+    """
+    def __init__(self, query, base, per_page):
+        self._query = query
+        self._base = base
+        self._per_page = per_page
+        self.next_cursor = None
+        self.total = None
+
+    @property
+    def items(self):
+        """
+        ThreadStream: The stream itself, read like the items of a KeysetPage.
+        """
+        return self
+
+    def __iter__(self):
+        rows = iter(self._query)
+        root, nodes, count = None, {}, 0
+        try:
+            for row in rows:
+                if row.depth == self._base:
+                    if root is not None:
+                        yield root
+                    count += 1
+                    if self._per_page is not None and count > self._per_page:
+                        self.next_cursor = encode_cursor("next", (root.comment.path,))
+                        return
+                    root = ThreadNode(row)
+                    nodes = {row.id: root}
+                elif row.parent_id in nodes:
+                    node = nodes[row.id] = ThreadNode(row)
+                    nodes[row.parent_id].replies.append(node)
+            if root is not None:
+                yield root
+        finally:
+            # release the server-side cursor when the page stops early, or the client left
+            rows.close()
+
+
+def stream_thread(query, post_id, parent=None, cursor=None, per_page=None, depth=3, replies=3,
+                  chunk_size=500, error_out=True):
+    """
+    Read a page of a thread while it is rendered.
+
+    The rows are fetched `chunk_size` at a time from a server-side cursor (on
+    PostgreSQL; SQLite reads them from its cursor lazily anyway), so the memory
+    used does not grow with the number of comments of the page.
+
+    Args:
+        query (Query): The query selecting the comments, see `load_thread`.
+        post_id (int): The post of the thread.
+        parent (Comment, optional): The comment whose replies are listed, None for
+            the top level comments of the post.
+        cursor (str, optional): The cursor of the requested page, None for the first page.
+        per_page (int, optional): Number of roots, None for all of them. Defaults to None.
+        depth (int, optional): Number of levels loaded. Defaults to 3.
+        replies (int, optional): Maximum number of replies loaded per comment. Defaults to 3.
+        chunk_size (int, optional): Rows fetched at a time. Defaults to 500.
+        error_out (bool, optional): Abort with 400 on a malformed cursor instead
+            of raising ValueError. Defaults to True.
+
+    Returns:
+        ThreadStream: The page, read when iterated.
+    """
+    after = _decode_after(cursor, error_out)
+    per_page = max(per_page, 1) if per_page is not None else None
+    depth = min(max(depth, 1), MAX_DEPTH + 1)
+    base = parent.depth + 1 if parent is not None else 0
+    statement = thread_query(query, post_id, parent, after, per_page, depth, max(replies, 0))
+    return ThreadStream(statement.yield_per(max(chunk_size, 1)), base, per_page)
+
+
+def _decode_after(cursor, error_out):
+    # the path of the last root of the previous page
+    try:
+        if cursor:
+            direction, (after,) = decode_cursor(cursor, (Comment.path,))
+            if direction != "next":
+                raise ValueError("threads are only paginated forward")
+            if not isinstance(after, str) or not after.isdigit() or len(after) % PATH_DIGITS:
+                raise ValueError("invalid comment path")
+            return after
+    except ValueError:
+        if error_out:
+            abort(400)
+        raise
+    return None
+
+
+def reply_parent(parent):
+    """
+    Get the comment a reply is attached to.
+
+    Args:
+        parent (Comment): The comment answered.
+
+    Returns:
+        Comment: `parent`, or its own parent when it is already MAX_DEPTH deep.
+    """
+    while parent.depth >= MAX_DEPTH:
+        parent = parent.parent
+    return parent
@@ -1,12 +1,20 @@
 """
-This module comprises User model and a user loader callback.
+This module comprises User model and the user loader callbacks of Flask-Login
+and Flask-JWT-Extended.
 """
+from datetime import datetime
 from itsdangerous import URLSafeTimedSerializer as Serializer
+from sqlalchemy import event, inspect, select
 from flask import current_app, url_for, request, redirect
-from web_app import db, login_manager, bcrypt
+from web_app import db, login_manager, hasher, jwt, identities
+from web_app.identity import UserSnapshot
 from flask_login import current_user
 from flask_login import UserMixin
 
+# the columns of a user the pages of their posts and comments depend on: the
+# profile shown next to them, and whether the account is being purged
+PROFILE_FIELDS = ("username", "image_file", "deleted_at")
+
 @login_manager.user_loader
 def load_user(user_id):
     """
@@ -16,9 +24,26 @@ def load_user(user_id):
         user_id (int): The ID of the user to load.
 
     Returns:
-        User: The user object if found, otherwise None.
+        UserSnapshot: The identity of the user if found, otherwise None.
+    """
+    return identities.get(int(user_id))
+
+@jwt.user_lookup_loader
+def load_jwt_user(jwt_header, jwt_data):
+    """
+    Flask-JWT-Extended user loader callback.
+
+    Args:
+        jwt_header (dict): The header of the token.
+        jwt_data (dict): The payload of the token.
+
+    Returns:
+        UserSnapshot: The identity of the user, from the "user" claim when the
+            token has one, None when the user does not exist.
     """
-    return User.query.get(int(user_id))
+    if "user" in jwt_data:
+        return UserSnapshot.from_claims(jwt_data["sub"], jwt_data["user"])
+    return identities.get(int(jwt_data["sub"]))
 
 class User(db.Model, UserMixin):
     """
@@ -31,8 +56,18 @@ class User(db.Model, UserMixin):
         image_file (str): Filename of the user's profile picture.
         password (str): Hashed password.
         is_verified (bool): Indicates if the user's email is verified.
+        post_count (int): Number of posts of the user, maintained by `stats`.
+        updated_at (datetime): Date and time of the last change to the username,
+            the picture or the deletion of the account, which the pages showing
+            the user depend on.
+        deleted_at (datetime): When the deletion of the account was requested,
+            None for an active account; the rows are then purged in the background.
         posts (relationship): a one to many Relationship to the Post model.
         comments (relationship): a one to many Relationship to the Comment model.
+
+    Indexes:
+        ix_user_deleted_at: the accounts waiting to be purged.
+        ix_user_updated_at: the last change to any user, for conditional requests.
     """
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(20), unique=True, nullable=False)
@@ -40,6 +75,14 @@ class User(db.Model, UserMixin):
     image_file = db.Column(db.String(20), nullable=False, default='default.jpg')
     password = db.Column(db.String(60), nullable=False)
     is_verified = db.Column(db.Boolean, default=False)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_user_deleted_at", deleted_at),
+        db.Index("ix_user_updated_at", updated_at),
+    )
 
 
     def get_reset_token(self):
@@ -55,6 +98,16 @@ class User(db.Model, UserMixin):
         s = Serializer(current_app.config["SECRET_KEY"])
         return s.dumps({"user_id": self.id})
 
+    @classmethod
+    def being_purged(cls):
+        """
+        Select the ids of the accounts marked deleted, waiting for the purge.
+
+        Returns:
+            Select: The statement, e.g. for `not_in`.
+        """
+        return select(cls.id).where(cls.deleted_at.is_not(None))
+
     @staticmethod
     def verify_reset_token(token, expires_sec=1800):
         """
@@ -79,13 +132,20 @@ class User(db.Model, UserMixin):
         """
         hash password
         """
-        self.password = bcrypt.generate_password_hash(password).decode("utf-8")
+        self.password = hasher.hash(password)
 
     def verify_pwd(self, password):
         """
         Verify the password
+
+        When the password matches a hash made at a lower cost than the configured
+        one, it is hashed again; the caller commits the session to store it.
         """
-        return bcrypt.check_password_hash(self.password, password)
+        if not hasher.verify(self.password, password):
+            return False
+        if hasher.needs_rehash(self.password):
+            self.set_pwd(password)
+        return True
 
     def to_dict(self):
         return {
@@ -94,9 +154,19 @@ class User(db.Model, UserMixin):
             "email": self.email,
             "password": self.password,
             "is_verified": self.is_verified,
+            "post_count": self.post_count,
         }
 
 
     def __repr__(self):
         return f"User('{self.username}', '{self.email}', '{self.image_file}')"
 
+
+@event.listens_for(User, "before_update")
+def touch_profile(mapper, connection, target):
+    """
+    Move `updated_at` when the username, the picture or the deletion changes.
+    """
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in PROFILE_FIELDS):
+        target.updated_at = datetime.utcnow()
@@ -0,0 +1,147 @@
+"""
+This module hashes and verifies passwords with bcrypt in a bounded process pool.
+
+bcrypt is deliberately slow: at cost 12 a single hash takes a few hundred
+milliseconds of CPU. Running it in the request thread lets a burst of logins
+take every worker's CPU. Here hashing runs in a pool of processes, so a bounded
+number of hashes are computed at once, whatever the number of logins, and the
+CPU left is there for the other requests. The request thread still waits for its
+hash: the pool bounds the CPU spent on hashing, not the threads waiting for it,
+which gunicorn's GUNICORN_THREADS bounds.
+
+The pools are per process and nothing is shared between them: each of the
+APP_PROCESSES (the gunicorn workers, see gunicorn.conf.py) starts
+PASSWORD_HASH_WORKERS // APP_PROCESSES hashing processes, at least one. The
+host thus computes at most PASSWORD_HASH_WORKERS hashes at once when it is at
+least APP_PROCESSES, and one per app process otherwise; app processes not
+counted in APP_PROCESSES, e.g. of another server, start pools of their own.
+
+The pool processes are spawned, and import the main module of the parent again
+under the name "__mp_main__": a script creating the app, like run.py, must not
+do so under that name.
+
+The cost factor is read from BCRYPT_LOG_ROUNDS. Hashes made at a lower cost are
+replaced on the next successful login, see `User.verify_pwd`.
+
+Configuration:
+- BCRYPT_LOG_ROUNDS: bcrypt cost factor of new hashes
+- PASSWORD_HASH_WORKERS: Number of hashing processes divided among the app processes, 0 to hash in the request thread
+- APP_PROCESSES: Number of app processes it is divided among
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+import bcrypt
+
+# bcrypt only uses the first 72 bytes of a password, older versions of the
+# library silently ignored the rest and newer ones refuse longer passwords
+MAX_PASSWORD_BYTES = 72
+
+
+def _encode(password):
+    if isinstance(password, str):
+        password = password.encode("utf-8")
+    return password[:MAX_PASSWORD_BYTES]
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _verify(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_cost(hashed):
+    """
+    Read the cost factor of a bcrypt hash.
+
+    Args:
+        hashed (str): A hash such as "$2b$12$...".
+
+    Returns:
+        int: The cost factor, None if the hash is not a bcrypt hash.
+    """
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    Flask extension hashing and verifying passwords in a process pool.
+    """
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 0
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Read the cost factor and the size of the pool of this process from the app configuration.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        self.rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+        workers = app.config.get("PASSWORD_HASH_WORKERS", 2)
+        processes = max(app.config.get("APP_PROCESSES", 1), 1)
+        self.workers = max(workers // processes, 1) if workers > 0 else 0
+        app.extensions["password_hasher"] = self
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        with self._lock:
+            # a pool inherited through a fork is unusable, start one per process
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+                self._pid = os.getpid()
+        return self._executor.submit(fn, *args).result()
+
+    def hash(self, password):
+        """
+        Hash a password at the configured cost.
+
+        Args:
+            password (str): The password.
+
+        Returns:
+            str: The bcrypt hash.
+        """
+        return self._run(_hash, _encode(password), self.rounds)
+
+    def verify(self, hashed, password):
+        """
+        Check a password against a hash.
+
+        Args:
+            hashed (str): The bcrypt hash.
+            password (str): The password.
+
+        Returns:
+            bool: True if the password matches.
+        """
+        if hash_cost(hashed) is None:
+            return False
+        return self._run(_verify, _encode(password), hashed.encode("utf-8"))
+
+    def needs_rehash(self, hashed):
+        """
+        Tell whether a hash was made at a lower cost than the configured one.
+
+        Args:
+            hashed (str): The bcrypt hash.
+
+        Returns:
+            bool: True if the password should be hashed again.
+        """
+        cost = hash_cost(hashed)
+        return cost is not None and cost < self.rounds
@@ -3,15 +3,30 @@ This module defines routes for post-related functionalities, including creating,
 viewing, updating, deleting posts, and adding comments.
 """
 from flask import (render_template, url_for, flash,
-                    redirect, request, abort, Blueprint)
+                    redirect, request, abort, Blueprint, current_app)
 from flask_login import current_user, login_required
-from web_app import db
+from web_app import db, cache
+from web_app.conditional import conditional, post_version
 from web_app.models import Post, Comment
+from web_app.models.loaders import load_with
+from web_app.models.threads import ThreadNode, load_thread, reply_parent, stream_thread
 from web_app.posts.forms import PostForm, AddComment
+from web_app.templating import stream_page
 
 
 posts= Blueprint("posts", __name__)
 
+
+def _thread_page(post_id, parent=None):
+    # a page of the comment thread, continued with the `cursor` query argument
+    config = current_app.config
+    return load_thread(load_with(Comment.query, "thread"), post_id, parent=parent,
+                       cursor=request.args.get("cursor"),
+                       per_page=config["COMMENTS_PER_PAGE"],
+                       depth=config["COMMENT_DEPTH"],
+                       replies=config["COMMENT_REPLIES"])
+
+
 @posts.route("/post/new", methods=["GET", "POST"])
 @login_required
 def new_post():
@@ -26,7 +41,7 @@ def new_post():
     """
     form = PostForm()
     if form.validate_on_submit():
-        post = Post(title=form.title.data, content=form.content.data, author=current_user)
+        post = Post(title=form.title.data, content=form.content.data, user_id=current_user.id)
         db.session.add(post)
         db.session.commit()
         flash("Your Post has been created!", "success")
@@ -35,11 +50,16 @@ def new_post():
 
 
 @posts.route("/post/<int:post_id>", strict_slashes=False)
+@conditional(post_version, per_user=True)
+@cache.cached(tags=lambda post_id: [f"post:{post_id}"])
 def post(post_id):
     """
     View a specific post.
 
-    This route allows users to view a specific post by its ID.
+    This route allows users to view a specific post by its ID, with a page of its
+    comment threads; the `cursor` query argument selects the following pages.
+    With POST_STREAMING, the page is streamed: the post is sent at once and the
+    comments as they are read, POST_STREAM_COMMENTS threads per page.
 
     Args:
         post_id (int): The ID of the post to view.
@@ -47,8 +67,42 @@ def post(post_id):
     Returns:
         template: Renders the 'post.html' template with the post data.
     """
-    post = Post.query.get_or_404(post_id)
-    return render_template("post.html", title=post.title, post=post)
+    post = load_with(Post.query, "post_detail").filter(Post.id == post_id, Post.visible()).first_or_404()
+    config = current_app.config
+    if config.get("POST_STREAMING"):
+        comments = stream_thread(load_with(Comment.query, "thread"), post.id,
+                                 cursor=request.args.get("cursor"),
+                                 per_page=config["POST_STREAM_COMMENTS"] or None,
+                                 depth=config["COMMENT_DEPTH"],
+                                 replies=config["COMMENT_REPLIES"],
+                                 chunk_size=config["POST_STREAM_CHUNK_SIZE"])
+        return stream_page("post.html", title=post.title, post=post, comments=comments)
+    return render_template("post.html", title=post.title, post=post, comments=_thread_page(post.id))
+
+
+@posts.route("/post/<int:post_id>/comment/<int:comment_id>/replies")
+@conditional(lambda post_id, comment_id: post_version(post_id), per_user=True)
+@cache.cached(tags=lambda post_id, comment_id: [f"post:{post_id}"])
+def comment_replies(post_id, comment_id):
+    """
+    View the replies to a comment.
+
+    This route continues a thread where the post page stops: the replies beyond
+    the ones shown under a comment, or below the deepest level shown.
+
+    Args:
+        post_id (int): The ID of the post.
+        comment_id (int): The ID of the comment whose replies are shown.
+
+    Returns:
+        template: Renders the 'comment_replies.html' template with the replies.
+    """
+    post = load_with(Post.query, "post_detail").filter(Post.id == post_id, Post.visible()).first_or_404()
+    comment = (load_with(Comment.query, "thread")
+               .filter(Comment.id == comment_id, Comment.post_id == post_id, Comment.visible())
+               .first_or_404())
+    return render_template("comment_replies.html", title=post.title, post=post, comment=comment,
+                           replies=_thread_page(post.id, parent=comment))
 
 
 
@@ -68,7 +122,7 @@ def update_post(post_id):
         template: Renders the 'create_post.html' template with the form.
     """
     post = Post.query.get_or_404(post_id)
-    if post.author != current_user:
+    if post.user_id != current_user.id:
         abort(403)
     form = PostForm()
     if form.validate_on_submit():
@@ -97,7 +151,7 @@ def delete_post(post_id):
         redirect: Redirects to the home page after deletion.
     """
     post = Post.query.get_or_404(post_id)
-    if post.author != current_user:
+    if post.user_id != current_user.id:
         abort(404)
     db.session.delete(post)
     db.session.commit()
@@ -110,7 +164,8 @@ def add_comment(post_id):
     """
     Add a comment to a post.
 
-    This route allows authenticated users to add a comment to a specific post.
+    This route allows authenticated users to add a comment to a specific post, or
+    a reply to one of its comments with the `reply_to` query argument.
 
     Args:
         post_id (int): The ID of the post to comment on.
@@ -118,16 +173,29 @@ def add_comment(post_id):
     Returns:
         template: Renders the 'add_comment.html' template with the form.
     """
-    post = Post.query.get_or_404(post_id)
+    post = load_with(Post.query, "post_detail").filter(Post.id == post_id, Post.visible()).first_or_404()
+    parent = None
+    reply_to = request.args.get("reply_to", type=int)
+    if reply_to is not None:
+        parent = (load_with(Comment.query, "thread")
+                  .filter(Comment.id == reply_to, Comment.post_id == post.id, Comment.visible())
+                  .first_or_404())
     form = AddComment()
     if request.method == "POST":
         if form.validate_on_submit():
-            comment = Comment(content=form.body.data, post_id=post.id, user_id=current_user.id)
+            parent_id = reply_parent(parent).id if parent is not None else None
+            comment = Comment(content=form.body.data, post_id=post.id, user_id=current_user.id,
+                              parent_id=parent_id)
             db.session.add(comment)
             db.session.commit()
             flash("successfully commented", "success")
+            if parent_id is not None:
+                return redirect(url_for("posts.comment_replies", post_id=post.id, comment_id=parent_id))
             return redirect(url_for('posts.post', post_id=post.id))
-    return render_template("add_comment.html", title=post.title, form=form, post=post)
+    # the comment answered, or the first comments of the post
+    thread = [ThreadNode(parent)] if parent is not None else _thread_page(post.id).items
+    return render_template("add_comment.html", title=post.title, form=form, post=post,
+                           parent=parent, thread=thread)
 
 @posts.route("/post/<int:post_id>/comment/<int:comment_id>", methods=["GET", "POST"])
 @login_required
@@ -135,7 +203,8 @@ def delete_comment(post_id=None, comment_id=None):
     """
     Delete a comment from a post.
 
-    This route allows authenticated users to delete their own comments from a specific post.
+    This route allows authenticated users to delete their own comments from a specific post,
+    together with the replies to them.
 
     Args:
         post_id (int): The ID of the post containing the comment.
@@ -146,7 +215,7 @@ def delete_comment(post_id=None, comment_id=None):
     """
     post = Post.query.get_or_404(post_id)
     comment = Comment.query.get_or_404(comment_id)
-    if comment.author != current_user:
+    if comment.user_id != current_user.id:
         abort(404)
     db.session.delete(comment)
     db.session.commit()
@@ -0,0 +1,193 @@
+"""
+This module deletes user accounts, purging the large ones in the background.
+
+Deleting a user deletes their posts, their comments and the replies to those in
+the same statement (ON DELETE CASCADE, see `models.stats` for the counters). For
+an account with many rows that statement would run for long and lock them all,
+so above ACCOUNT_PURGE_THRESHOLD rows the account is only marked deleted: it can
+no longer log in, and a worker removes its rows in transactions of about
+ACCOUNT_PURGE_BATCH_SIZE rows:
+1. the comments of the user on the posts of others, shallowest first, each with
+   its replies
+2. the posts of the user, each with its comments; the comments of a post too
+   commented for one batch are removed a thread at a time beforehand
+3. the user
+Until then, the posts of the account are left out of the feed, the search
+results and the API listings (`Post.visible`), and its page is not found.
+
+Modes (ACCOUNT_PURGE_MODE):
+- thread: a daemon thread in each app process purges the accounts, started by
+  the first request of the process so that the purges cut by a restart resume
+- external: accounts are only marked, `flask purge-accounts` purges them
+- sync: accounts are purged inside the request, batch by batch
+
+Configuration:
+- ACCOUNT_PURGE_THRESHOLD: Number of posts and comments above which an account is purged in the background
+- ACCOUNT_PURGE_BATCH_SIZE: Rows deleted per transaction, about
+- ACCOUNT_PURGE_PAUSE: Pause between two transactions in seconds, leaving the rows to other requests
+- ACCOUNT_PURGE_POLL_INTERVAL: How often the worker looks for accounts to purge in seconds
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class AccountPurger:
+    """
+    Flask extension deleting accounts, in the background for the large ones.
+    """
+    def __init__(self, app=None):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the extension with the app.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        app.extensions["account_purger"] = self
+        if app.config.get("ACCOUNT_PURGE_MODE", "thread") == "thread":
+            app.before_request(lambda: self._start_worker(app))
+
+    def delete_account(self, user):
+        """
+        Delete an account at once, or mark it for the purge if it is too large.
+
+        The change is committed with the current session.
+
+        Args:
+            user (User): The user to delete.
+
+        Returns:
+            bool: True if the account is deleted, False if it is being purged.
+        """
+        from web_app import db
+        from web_app.models import Comment
+        app = current_app._get_current_object()
+        config = app.config
+        comments = db.session.query(Comment.id).filter(Comment.user_id == user.id).count()
+        if user.post_count + comments <= config.get("ACCOUNT_PURGE_THRESHOLD", 1000):
+            db.session.delete(user)
+            db.session.commit()
+            return True
+        user.deleted_at = datetime.utcnow()
+        db.session.commit()
+        mode = config.get("ACCOUNT_PURGE_MODE", "thread")
+        if mode == "sync":
+            self.run(app, once=True)
+        elif mode == "thread":
+            self._start_worker(app)
+            self._wakeup.set()
+        return False
+
+    def _start_worker(self, app):
+        # started lazily so that each gunicorn worker runs its own thread after the fork
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, args=(app,),
+                                                name="account-purge", daemon=True)
+                self._thread.start()
+
+    def run(self, app, once=False):
+        """
+        Purge the marked accounts until stopped, or until none is left.
+
+        Args:
+            app (Flask): The application instance.
+            once (bool, optional): Return when no account is left. Defaults to False.
+        """
+        pause = app.config.get("ACCOUNT_PURGE_PAUSE", 0.1)
+        while True:
+            with app.app_context():
+                try:
+                    while self.purge_batch():
+                        if pause:
+                            time.sleep(pause)
+                except Exception:
+                    logger.exception("account purge failed")
+            if once:
+                return
+            self._wakeup.wait(app.config.get("ACCOUNT_PURGE_POLL_INTERVAL", 60))
+            self._wakeup.clear()
+
+    def purge_batch(self):
+        """
+        Delete a batch of rows of the first marked account, in one transaction.
+
+        Returns:
+            int: The number of rows deleted directly, cascades excluded; 0 when
+                no account is left to purge.
+        """
+        from web_app import db
+        from web_app.models import User
+        user = (User.query
+                .filter(User.deleted_at.is_not(None))
+                .order_by(User.deleted_at)
+                .with_for_update(skip_locked=True)
+                .first())
+        if user is None:
+            db.session.commit()
+            return 0
+        batch_size = max(current_app.config.get("ACCOUNT_PURGE_BATCH_SIZE", 500), 1)
+        rows = (self._comments_elsewhere(user, batch_size)
+                or self._posts(user, batch_size))
+        if not rows:
+            rows = [user]
+            logger.info("purged account %s", user.id)
+        for row in rows:
+            db.session.delete(row)
+        db.session.commit()
+        return len(rows)
+
+    @staticmethod
+    def _comments_elsewhere(user, batch_size):
+        from web_app.models import Post, Comment
+        from web_app.models.comments import PATH_DIGITS
+        comments = (Comment.query
+                    .join(Post, Post.id == Comment.post_id)
+                    .filter(Comment.user_id == user.id, Post.user_id != user.id)
+                    .order_by(Comment.depth, Comment.id)
+                    .limit(batch_size)
+                    .all())
+        # ancestors come first: a comment under another one of the batch goes with it
+        paths = {(c.post_id, c.path) for c in comments}
+        return [c for c in comments
+                if not any((c.post_id, c.path[:end]) in paths
+                           for end in range(PATH_DIGITS, len(c.path), PATH_DIGITS))]
+
+    @staticmethod
+    def _posts(user, batch_size):
+        from web_app.models import Post, Comment
+        posts = (Post.query
+                 .filter(Post.user_id == user.id)
+                 .order_by(Post.id)
+                 .limit(batch_size)
+                 .all())
+        batch, size = [], 0
+        for post in posts:
+            if post.comment_count >= batch_size:
+                if batch:
+                    break
+                # too many comments to go with the post: its threads go first
+                threads = (Comment.query
+                           .filter(Comment.post_id == post.id, Comment.depth == 0)
+                           .order_by(Comment.id)
+                           .limit(batch_size)
+                           .all())
+                return threads or [post]
+            size += post.comment_count + 1
+            if batch and size > batch_size:
+                break
+            batch.append(post)
+        return batch
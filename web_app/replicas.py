@@ -0,0 +1,178 @@
+"""
+This module routes the reads of read-only requests to replica databases.
+
+The replicas listed in DB_REPLICA_URIS are added to SQLALCHEMY_BINDS as
+"replica_<n>". During a GET, HEAD or OPTIONS request the session sends its
+queries to one replica, picked round robin among those that are up and kept for
+the whole request. Everything else goes to the primary:
+- writes, and every query of the request after its first flush
+- requests outside a request context: CLI commands and background threads
+- requests of a client that wrote less than DB_REPLICA_STICKY_SECONDS ago, so
+  that it reads its own writes despite the replication lag; this is tracked in
+  the Flask session cookie
+A replica whose connection fails is left out for DB_REPLICA_RETRY_SECONDS; with
+no replica up, reads go to the primary.
+
+Configuration:
+- DB_REPLICA_URIS: Comma separated URIs of the replicas, none by default
+- DB_REPLICA_STICKY_SECONDS: How long a client reads from the primary after writing
+- DB_REPLICA_RETRY_SECONDS: How long a failing replica is left out
+"""
+import itertools
+import threading
+import time
+from functools import partial
+from flask import current_app, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaSet:
+    """
+    The replicas of an app and their health.
+
+    Args:
+        keys (list): The bind keys of the replicas.
+        retry_seconds (int): How long a failing replica is left out.
+    """
+    def __init__(self, keys, retry_seconds=30):
+        self.keys = keys
+        self.retry_seconds = retry_seconds
+        self.watched = False
+        self._down_until = {}
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def pick(self):
+        """
+        Pick the next replica that is up, round robin.
+
+        Returns:
+            str: The bind key, None if no replica is up.
+        """
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._next)
+            for i in range(len(self.keys)):
+                key = self.keys[(start + i) % len(self.keys)]
+                if self._down_until.get(key, 0) <= now:
+                    return key
+        return None
+
+    def mark_down(self, key):
+        """
+        Leave a replica out for `retry_seconds`.
+
+        Args:
+            key (str): The bind key of the replica.
+        """
+        with self._lock:
+            self._down_until[key] = time.monotonic() + self.retry_seconds
+
+    def status(self):
+        """
+        Tell which replicas are up.
+
+        Returns:
+            dict: True or False for each bind key.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {key: self._down_until.get(key, 0) <= now for key in self.keys}
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session sending the queries of read-only requests to a replica.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("read_only") and not self._flushing:
+            engine = self._replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_engine(self):
+        if "replica" not in self.info:
+            replicas = current_app.extensions.get("replicas")
+            key = replicas.pick() if replicas is not None else None
+            self.info["replica"] = key
+        key = self.info["replica"]
+        return self._db.engines[key] if key is not None else None
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _wrote(session, flush_context):
+    # read the rest of the request from the primary, which has the new rows
+    session.info["read_only"] = False
+    session.info["wrote"] = True
+
+
+class ReplicaRouter:
+    """
+    Flask extension adding the replica binds and routing requests. Must be
+    initialized before Flask-SQLAlchemy, with the session class set to
+    `RoutingSession`.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Add the replicas to SQLALCHEMY_BINDS and register the request hooks.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        uris = app.config.get("DB_REPLICA_URIS") or []
+        if isinstance(uris, str):
+            uris = [uri.strip() for uri in uris.split(",") if uri.strip()]
+        if not uris:
+            return
+        binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+        keys = []
+        for i, uri in enumerate(uris):
+            key = f"replica_{i}"
+            options = {} if uri.startswith("sqlite") else dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+            binds[key] = {**options, "url": uri}
+            keys.append(key)
+        app.config["SQLALCHEMY_BINDS"] = binds
+        app.extensions["replicas"] = ReplicaSet(keys, app.config.get("DB_REPLICA_RETRY_SECONDS", 30))
+        app.before_request(self._route)
+        app.after_request(self._stick)
+
+    @staticmethod
+    def _route():
+        from web_app import db
+        if request.method in READ_METHODS and session.get("_primary_until", 0) < time.time():
+            db.session.info["read_only"] = True
+            _watch_engines(current_app)
+
+    @staticmethod
+    def _stick(response):
+        from web_app import db
+        if db.session.info.get("wrote"):
+            session["_primary_until"] = time.time() + current_app.config.get("DB_REPLICA_STICKY_SECONDS", 5)
+        return response
+
+
+def _watch_engines(app):
+    # the engines are created by Flask-SQLAlchemy after this extension is initialized
+    from web_app import db
+    replicas = app.extensions["replicas"]
+    if replicas.watched:
+        return
+    with replicas._lock:
+        if not replicas.watched:
+            for key in replicas.keys:
+                event.listen(db.engines[key], "handle_error", partial(_replica_failed, replicas, key))
+            replicas.watched = True
+
+
+def _replica_failed(replicas, key, context):
+    # a lost connection or a failed connection attempt, not an error of the query
+    if context.is_disconnect or context.connection is None:
+        replicas.mark_down(key)
@@ -0,0 +1,299 @@
+"""
+This module provides full-text search over the title and content of posts.
+
+Two backends rank the posts matching every word of a query:
+- postgres: the `post.search_vector` tsvector column, generated by PostgreSQL
+  from the title (weight A) and the content (weight B) and indexed with GIN,
+  queried with `websearch_to_tsquery` and ranked with `ts_rank_cd`. The column
+  is created by a migration and is not mapped on the model.
+- python: an inverted index of the posts kept in memory, built on the first
+  search and updated after each commit. Words are only lowercased, not stemmed.
+  Each process has its own index and only sees the writes it makes, so it is
+  meant for SQLite development and test runs.
+
+Configuration:
+- SEARCH_BACKEND: "postgres", "python" or "auto", postgres on a PostgreSQL database
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+from flask import current_app, has_app_context
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import event, func, literal_column
+from sqlalchemy.orm import Session
+
+# PostgreSQL weighs title (A) and content (B) matches 1.0 and 0.4 by default
+TITLE_WEIGHT = 1.0
+CONTENT_WEIGHT = 0.4
+TEXT_SEARCH_CONFIG = "english"
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for if in into is it no not of on or such "
+    "that the their then there these they this to was will with".split())
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Split a text into the words the python backend indexes.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        list: The lowercased words, stop words excluded.
+    """
+    return [word for word in _WORD.findall((text or "").lower()) if word not in STOP_WORDS]
+
+
+class PostgresBackend:
+    """
+    Search backend querying the generated tsvector column.
+    """
+    def search(self, q, offset, limit):
+        """
+        Rank the posts matching a query.
+
+        Args:
+            q (str): The query, in web search syntax ("quoted phrases", -excluded, or).
+            offset (int): Number of results to skip.
+            limit (int): Maximum number of results.
+
+        Returns:
+            tuple: The ids of the matching posts in rank order, and the number of matches.
+        """
+        from web_app import db
+        from web_app.models import Post
+        tsquery = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, q)
+        vector = literal_column("post.search_vector")
+        matches = db.session.query(Post.id).filter(vector.op("@@")(tsquery), Post.visible())
+        ids = [row[0] for row in (matches
+                                  .order_by(func.ts_rank_cd(vector, tsquery).desc(), Post.id.desc())
+                                  .offset(offset).limit(limit))]
+        return ids, matches.order_by(None).count()
+
+
+class InvertedIndex:
+    """
+    Search backend holding an inverted index of the posts in memory.
+
+    Attributes:
+        postings (dict): For each word, the weight of the word in each post keyed by post id.
+        documents (dict): For each post id, the words indexed for it.
+    """
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.built = False
+        self._lock = threading.RLock()
+
+    def _build(self):
+        from web_app import db
+        from web_app.models import Post
+        query = db.session.query(Post.id, Post.title, Post.content).execution_options(yield_per=1000)
+        for post_id, title, content in query:
+            self.add(post_id, title, content)
+        self.built = True
+
+    def add(self, post_id, title, content):
+        """
+        Index a post, replacing its previous entry.
+
+        Args:
+            post_id (int): The post id.
+            title (str): The title.
+            content (str): The content.
+        """
+        weights = defaultdict(float)
+        for word in tokenize(title):
+            weights[word] += TITLE_WEIGHT
+        for word in tokenize(content):
+            weights[word] += CONTENT_WEIGHT
+        with self._lock:
+            self.remove(post_id)
+            for word, weight in weights.items():
+                self.postings[word][post_id] = weight
+            self.documents[post_id] = tuple(weights)
+
+    def remove(self, post_id):
+        """
+        Remove a post from the index.
+
+        Args:
+            post_id (int): The post id.
+        """
+        with self._lock:
+            for word in self.documents.pop(post_id, ()):
+                posting = self.postings[word]
+                posting.pop(post_id, None)
+                if not posting:
+                    del self.postings[word]
+
+    def reset(self):
+        """
+        Drop the index, it is built again on the next search.
+        """
+        with self._lock:
+            self.postings.clear()
+            self.documents.clear()
+            self.built = False
+
+    def search(self, q, offset, limit):
+        """
+        Rank the posts containing every word of a query by tf-idf.
+
+        Args:
+            q (str): The query.
+            offset (int): Number of results to skip.
+            limit (int): Maximum number of results.
+
+        Returns:
+            tuple: The ids of the matching posts in rank order, and the number of matches.
+        """
+        words = set(tokenize(q))
+        with self._lock:
+            if not self.built:
+                self._build()
+            if not words or any(word not in self.postings for word in words):
+                return [], 0
+            # intersect starting from the rarest word
+            postings = sorted((self.postings[word] for word in words), key=len)
+            matches = set(postings[0]).intersection(*postings[1:])
+            total_documents = len(self.documents)
+            scores = dict.fromkeys(matches, 0.0)
+            for posting in postings:
+                idf = math.log(1 + total_documents / len(posting))
+                for post_id in matches:
+                    scores[post_id] += posting[post_id] * idf
+        ranked = sorted(scores, key=lambda post_id: (-scores[post_id], -post_id))
+        return ranked[offset:offset + limit], len(ranked)
+
+
+class SearchPagination(Pagination):
+    """
+    A page of search results, takes `backend`, `q` and `load` arguments in
+    addition to the Pagination arguments. `load` turns the ids of a page into its
+    items, in the same order.
+    """
+    def _query_items(self):
+        ids, self._total = self._query_args["backend"].search(
+            self._query_args["q"], self._query_offset, self.per_page)
+        return self._query_args["load"](ids) if ids else []
+
+    def _query_count(self):
+        return self._total
+
+
+class PostSearch:
+    """
+    Flask extension searching posts with the configured backend.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Select the backend from the app configuration.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        backend = app.config.get("SEARCH_BACKEND", "auto")
+        if backend == "auto":
+            uri = app.config.get("SQLALCHEMY_DATABASE_URI") or ""
+            backend = "postgres" if uri.startswith("postgres") else "python"
+        if backend not in ("postgres", "python"):
+            raise ValueError(f"unknown SEARCH_BACKEND {backend!r}")
+        app.extensions["search"] = PostgresBackend() if backend == "postgres" else InvertedIndex()
+        if not event.contains(Session, "after_flush", self._collect_changes):
+            event.listen(Session, "after_flush", self._collect_changes)
+            event.listen(Session, "after_commit", self._apply_changes)
+            event.listen(Session, "after_soft_rollback", self._discard)
+
+    @property
+    def backend(self):
+        return current_app.extensions["search"]
+
+    def search(self, q, page=1, per_page=10, load=None, error_out=True):
+        """
+        Get a page of the posts matching a query, best match first.
+
+        Args:
+            q (str): The query.
+            page (int, optional): The page number. Defaults to 1.
+            per_page (int, optional): Number of results per page. Defaults to 10.
+            load (callable, optional): Turns a list of post ids into the items of
+                the page, in the same order. Defaults to loading Post instances.
+            error_out (bool, optional): Abort with 404 on an empty page past the first.
+
+        Returns:
+            SearchPagination: The page.
+        """
+        return SearchPagination(page=page, per_page=per_page, error_out=error_out,
+                                backend=self.backend, q=q, load=load or load_posts)
+
+    def _index(self):
+        if not has_app_context():
+            return None
+        index = current_app.extensions.get("search")
+        # only an index that was already built needs to follow the writes
+        return index if isinstance(index, InvertedIndex) and index.built else None
+
+    def _collect_changes(self, session, flush_context):
+        from web_app.models import Post, User
+        if self._index() is None:
+            return
+        changes = session.info.setdefault("search_changes", {})
+        for obj in (*session.new, *session.dirty):
+            if isinstance(obj, Post):
+                changes[obj.id] = (obj.title, obj.content)
+        for obj in session.deleted:
+            if isinstance(obj, Post):
+                changes[obj.id] = None
+            elif isinstance(obj, User):
+                # the database deleted the posts of the user without the session seeing them
+                session.info["search_reset"] = True
+
+    def _apply_changes(self, session):
+        changes = session.info.pop("search_changes", None)
+        index = self._index()
+        if session.info.pop("search_reset", False) and index is not None:
+            index.reset()
+            return
+        if not changes or index is None:
+            return
+        for post_id, values in changes.items():
+            if values is None:
+                index.remove(post_id)
+            else:
+                index.add(post_id, *values)
+
+    def _discard(self, session, previous_transaction):
+        session.info.pop("search_changes", None)
+        session.info.pop("search_reset", None)
+
+    def reset(self):
+        """
+        Forget the python index after writes the session did not see, e.g. bulk inserts.
+        """
+        index = current_app.extensions.get("search")
+        if isinstance(index, InvertedIndex):
+            index.reset()
+
+
+def load_posts(ids, strategy="feed"):
+    """
+    Load posts by id, in the order of the ids.
+
+    Args:
+        ids (list): The post ids.
+        strategy (str, optional): The loader strategy, see `LOADER_STRATEGIES`. Defaults to "feed".
+
+    Returns:
+        list: The Post instances.
+    """
+    from web_app.models import Post
+    from web_app.models.loaders import load_with
+    posts = {post.id: post for post in load_with(Post.query, strategy).filter(Post.id.in_(ids), Post.visible())}
+    return [posts[post_id] for post_id in ids if post_id in posts]
@@ -0,0 +1,173 @@
+"""
+This module logs the requests slower than a threshold with what they spent their time on.
+
+The SQL statements of each request and the render time of its templates are
+timed by the request metrics (`metrics.RequestTimings`), a streamed response
+until it is closed. When a request takes
+longer than SLOW_REQUEST_THRESHOLD_MS, an entry with the endpoint, the total time
+split into SQL, templates and the rest, and the statements with their duration
+and the shape of their parameters (the types, never the values) is:
+- appended as a JSON line to SLOW_REQUEST_LOG, a rotating file, when set
+- kept in memory, the last SLOW_REQUEST_KEEP entries, served to admins at
+  GET /api/v1/slow-requests
+
+A fraction SLOW_REQUEST_PROFILE_RATE of the requests also run under cProfile;
+when one of them is slow, its entry includes the functions that took the most
+cumulative time. Profiling slows the profiled requests down, keep the rate low.
+
+Configuration:
+- SLOW_REQUEST_THRESHOLD_MS: Duration above which a request is logged, 0 to disable
+- SLOW_REQUEST_LOG: Path of the rotating log file, none to keep the entries in memory only
+- SLOW_REQUEST_LOG_MAX_BYTES: Size at which the log file is rotated
+- SLOW_REQUEST_LOG_BACKUPS: Number of rotated log files kept
+- SLOW_REQUEST_KEEP: Number of entries kept in memory
+- SLOW_REQUEST_PROFILE_RATE: Fraction of the requests profiled, between 0 and 1
+"""
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from flask import g, request
+from web_app.metrics import finish_request
+
+logger = logging.getLogger(__name__)
+
+# bounds the size of an entry for requests issuing long queries
+MAX_STATEMENT_LENGTH = 1000
+PROFILE_LINES = 25
+
+
+def parameters_shape(parameters, executemany=False):
+    """
+    Describe query parameters without their values.
+
+    Args:
+        parameters: The DBAPI parameters, a dict, a sequence, or a list of them for executemany.
+        executemany (bool, optional): Whether the parameters are a list of parameter sets.
+
+    Returns:
+        The type names of the parameters, in the same structure.
+    """
+    if executemany:
+        parameters = list(parameters)
+        return {"rows": len(parameters), "row": parameters_shape(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowRequestLog:
+    """
+    Flask extension logging slow requests.
+    """
+    def __init__(self, app=None):
+        self.entries = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self._handler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Register the request hooks and open the log file.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        self.threshold = app.config.get("SLOW_REQUEST_THRESHOLD_MS", 500) / 1000
+        self.profile_rate = app.config.get("SLOW_REQUEST_PROFILE_RATE", 0.0)
+        self.entries = deque(maxlen=app.config.get("SLOW_REQUEST_KEEP", 50))
+        app.extensions["slow_request_log"] = self
+        if not self.threshold:
+            return
+        path = app.config.get("SLOW_REQUEST_LOG")
+        if path and self._handler is None:
+            self._handler = RotatingFileHandler(
+                path, maxBytes=app.config.get("SLOW_REQUEST_LOG_MAX_BYTES", 10 * 1024 * 1024),
+                backupCount=app.config.get("SLOW_REQUEST_LOG_BACKUPS", 5))
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(self._handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        if self.profile_rate:
+            app.before_request(self._before)
+        app.after_request(self._after)
+
+    def _before(self):
+        if random.random() < self.profile_rate:
+            g.slowlog_profiler = profiler = cProfile.Profile()
+            profiler.enable()
+
+    def _after(self, response):
+        profiler = g.pop("slowlog_profiler", None)
+        timings = g.get("request_timings")
+        if timings is None:
+            if profiler is not None:
+                profiler.disable()
+            return response
+        # the request is gone when a streamed response is closed
+        summary = {"endpoint": request.endpoint, "method": request.method,
+                   "path": request.path, "status": response.status_code}
+
+        def finish():
+            if profiler is not None:
+                profiler.disable()
+            duration = time.perf_counter() - timings.start
+            if duration >= self.threshold:
+                self.record(self._entry(timings, duration, summary, profiler))
+        finish_request(response, finish)
+        return response
+
+    @staticmethod
+    def _entry(timings, duration, summary, profiler):
+        entry = {
+            "time": datetime.utcnow().isoformat(),
+            **summary,
+            "duration_ms": round(duration * 1000, 3),
+            "sql_ms": round(timings.sql_time * 1000, 3),
+            "template_ms": round(timings.template_time * 1000, 3),
+            "other_ms": round((duration - timings.sql_time - timings.template_time) * 1000, 3),
+            "sql_count": timings.sql_count,
+            "statements": [{"sql": statement[:MAX_STATEMENT_LENGTH],
+                            "duration_ms": round(elapsed * 1000, 3),
+                            "params": parameters_shape(parameters, executemany)}
+                           for statement, parameters, executemany, elapsed in timings.statements],
+            "templates": [{"name": name, "duration_ms": round(elapsed * 1000, 3)}
+                          for name, elapsed in timings.templates],
+            "profile": None,
+        }
+        if profiler is not None:
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            entry["profile"] = out.getvalue().splitlines()
+        return entry
+
+    def record(self, entry):
+        """
+        Keep an entry in memory and write it to the log file.
+
+        Args:
+            entry (dict): The slow request.
+        """
+        with self._lock:
+            self.entries.append(entry)
+        logger.info(json.dumps(entry, default=str))
+
+    def recent(self):
+        """
+        Get the entries kept in memory.
+
+        Returns:
+            list: The entries, most recent first.
+        """
+        with self._lock:
+            return list(reversed(self.entries))
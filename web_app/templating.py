@@ -0,0 +1,187 @@
+"""
+This module caches compiled templates and rendered template fragments.
+
+Compiled templates: Jinja compiles a template to Python code the first time it
+is used in a process, which every gunicorn worker pays again after a start. The
+bytecode of the compiled templates is stored in TEMPLATE_BYTECODE_CACHE_DIR,
+shared by the workers and kept across restarts; a template whose source changed
+is compiled again. With TEMPLATE_WARMUP, every template is loaded when the app
+is created instead of on the first request using it.
+
+Fragments: a part of a template rendered identically for the same rows, such as
+the card of a post in a listing, is wrapped in a cache block keyed on the values
+it depends on:
+
+    {% cache "post_card", post.id, post.updated_at, post.author.username %}
+      ...
+    {% endcache %}
+
+The rendered markup is kept in a backend like those of the response cache, so a
+row whose key did not change is not rendered again. The key must include every
+value the fragment shows, and the current user when the fragment depends on it;
+a changed row gets a new key, nothing needs invalidating.
+
+Streaming: `stream_page` sends a page while the template renders, so that the
+top of a long page reaches the browser before its end is rendered and the page
+is never held in memory as a whole. The output is sent in chunks of about
+STREAM_BUFFER_SIZE bytes, and at each `{{ flush() }}` of the template, placed
+before a part that is slow to start, e.g. one running a query. The headers are
+sent before the template runs: the flashed messages are read beforehand, and a
+template cannot set cookies nor change the status of the response. The
+request metrics and the slow request log record such a request when the server
+closes its response, the queries and renders of the body included.
+
+Configuration:
+- TEMPLATE_BYTECODE_CACHE_DIR: Directory of the compiled templates, Jinja's
+  temporary directory when unset, "none" to disable
+- TEMPLATE_WARMUP: Compile all the templates when the app is created
+- FRAGMENT_CACHE_TYPE: Fragment cache backend, "lru", "redis" or "null"
+- FRAGMENT_CACHE_TIMEOUT: Time to live of cached fragments in seconds
+- FRAGMENT_CACHE_MAX_ENTRIES: Maximum number of fragments kept by the lru backend
+- STREAM_BUFFER_SIZE: Bytes of a streamed page buffered before they are sent
+"""
+import hashlib
+import os
+from flask import current_app, get_flashed_messages, stream_template
+from flask_login import current_user
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from web_app.cache import LRUCache, NullCache, RedisCache
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Jinja extension adding the `{% cache key, ... %}...{% endcache %}` block.
+    """
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=NullCache(), fragment_cache_timeout=300)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [nodes.List(parts)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        backend = self.environment.fragment_cache
+        key = "fragment:" + hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+        markup = backend.get(key)
+        if markup is None:
+            markup = caller()
+            backend.set(key, str(markup), self.environment.fragment_cache_timeout)
+        return Markup(markup)
+
+
+class TemplateCache:
+    """
+    Flask extension setting up the bytecode and fragment caches of the templates.
+    Must be initialized before anything uses `app.jinja_env`.
+    """
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Add the bytecode cache and the fragment cache extension to the Jinja options.
+
+        Args:
+            app (Flask): The application instance.
+        """
+        options = dict(app.jinja_options)
+        directory = app.config.get("TEMPLATE_BYTECODE_CACHE_DIR")
+        if directory != "none":
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            options["bytecode_cache"] = FileSystemBytecodeCache(directory or None)
+        options["extensions"] = [*options.get("extensions", ()), FragmentCacheExtension]
+        app.jinja_options = options
+
+        env = app.jinja_env
+        cache_type = app.config.get("FRAGMENT_CACHE_TYPE", "lru")
+        if cache_type == "lru":
+            env.fragment_cache = LRUCache(app.config.get("FRAGMENT_CACHE_MAX_ENTRIES", 5000))
+        elif cache_type == "redis":
+            env.fragment_cache = RedisCache.from_url(app.config["CACHE_REDIS_URL"])
+        else:
+            env.fragment_cache = NullCache()
+        env.fragment_cache_timeout = app.config.get("FRAGMENT_CACHE_TIMEOUT", 300)
+        app.extensions["template_cache"] = self
+
+    @staticmethod
+    def warm_up(app):
+        """
+        Load every template of the app, from the bytecode cache when it has them.
+
+        Call once the blueprints are registered, their templates are included.
+
+        Args:
+            app (Flask): The application instance.
+
+        Returns:
+            int: The number of templates loaded.
+        """
+        env = app.jinja_env
+        names = env.list_templates(extensions=("html", "txt", "xml"))
+        for name in names:
+            env.get_template(name)
+        return len(names)
+
+
+class StreamBuffer:
+    """
+    Groups the many small strings of a streamed template into larger chunks.
+
+    Args:
+        size (int): Bytes, about, sent at a time.
+    """
+    def __init__(self, size=8192):
+        self.size = size
+        self._flush = False
+
+    def flush(self):
+        """
+        Send what is buffered as soon as possible, for templates.
+
+        Returns:
+            str: An empty string.
+        """
+        self._flush = True
+        return ""
+
+    def __call__(self, chunks):
+        buffer, length = [], 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            length += len(chunk)
+            if length >= self.size or self._flush:
+                yield "".join(buffer)
+                buffer, length, self._flush = [], 0, False
+        if buffer:
+            yield "".join(buffer)
+
+
+def stream_page(template_name, **context):
+    """
+    Render a template as a streamed response.
+
+    Args:
+        template_name (str): The template.
+        **context: The variables of the template; `flush` is added.
+
+    Returns:
+        Response: The streamed response.
+    """
+    # whatever the session is going to hold is settled before the headers are sent
+    get_flashed_messages(with_categories=True)
+    current_user._get_current_object()
+    buffer = StreamBuffer(current_app.config.get("STREAM_BUFFER_SIZE", 8192))
+    chunks = stream_template(template_name, flush=buffer.flush, **context)
+    return current_app.response_class(buffer(chunks), mimetype="text/html")
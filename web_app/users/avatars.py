@@ -0,0 +1,223 @@
+"""
+This module processes profile pictures off the request thread.
+
+An upload is validated in the request (Pillow only parses the image header for
+that) and then decoded, resized and encoded by a thread pool; Pillow releases the
+GIL while it decodes, resizes and encodes, so the threads run in parallel with the
+request handlers. Each upload is stored as several sizes, each also in WebP, under
+names derived from a hash of its content, so the files never change and can be
+cached forever:
+
+    <hash>.jpg          125px, the name stored in User.image_file
+    <hash>_<size>.jpg   the other sizes of AVATAR_SIZES
+    <hash>_<size>.webp  the WebP variant of every size
+
+Once the files are written the user row is pointed at them and the files of the
+previous picture are removed, unless another user has the same picture.
+
+Configuration:
+- AVATAR_WORKERS: Number of threads processing uploads
+- AVATAR_MAX_PIXELS: Largest accepted width x height, bounds the memory of decoding
+"""
+import glob
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from threading import Lock
+from PIL import Image, ImageOps, UnidentifiedImageError
+from flask import current_app, url_for
+
+logger = logging.getLogger(__name__)
+
+BASE_SIZE = 125
+AVATAR_SIZES = (64, 125, 250)
+FORMATS = {"JPEG": ".jpg", "PNG": ".png"}
+FORMATS_BY_EXT = {ext: fmt for fmt, ext in FORMATS.items()}
+DEFAULT_AVATAR = "default.jpg"
+
+_executor = None
+_executor_lock = Lock()
+
+
+def _pictures_dir(app):
+    return os.path.join(app.root_path, "static", "profile_pics")
+
+
+def _get_executor(app):
+    # created lazily so that each gunicorn worker gets its own threads after the fork
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get("AVATAR_WORKERS", 2),
+                                           thread_name_prefix="avatar")
+        return _executor
+
+
+def open_upload(data, max_pixels):
+    """
+    Parse the header of an uploaded image without decoding it.
+
+    Args:
+        data (bytes): The uploaded file.
+        max_pixels (int): Largest accepted width x height.
+
+    Returns:
+        Image: The lazily loaded image.
+
+    Raises:
+        ValueError: If the file is not a JPEG or PNG image or is too large.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError("The picture could not be read, please upload a JPEG or PNG image.") from e
+    if image.format not in FORMATS:
+        raise ValueError("Please upload a JPEG or PNG image.")
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValueError("The picture is too large, please upload a smaller image.")
+    return image
+
+
+def variant_name(image_file, size, ext=None):
+    """
+    Get the file name of a size of an avatar.
+
+    Args:
+        image_file (str): The name stored in User.image_file.
+        size (int): The size in pixels.
+        ext (str, optional): The extension, e.g. ".webp". Defaults to the one of image_file.
+
+    Returns:
+        str: The file name.
+    """
+    stem, image_ext = os.path.splitext(image_file)
+    if size == BASE_SIZE and ext in (None, image_ext):
+        return image_file
+    return f"{stem}_{size}{ext or image_ext}"
+
+
+def process_avatar(data, directory, max_pixels):
+    """
+    Write all the sizes and formats of an avatar.
+
+    Args:
+        data (bytes): The uploaded file.
+        directory (str): The directory to write the files to.
+        max_pixels (int): Largest accepted width x height.
+
+    Returns:
+        str: The name to store in User.image_file.
+    """
+    image = open_upload(data, max_pixels)
+    ext = FORMATS[image.format]
+    image_file = hashlib.sha256(data).hexdigest()[:16] + ext
+    # let the JPEG decoder downscale by a power of two while decoding
+    image.draft("RGB", (max(AVATAR_SIZES), max(AVATAR_SIZES)))
+    image = ImageOps.exif_transpose(image)
+    if ext == ".jpg":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    for size in sorted(AVATAR_SIZES, reverse=True):
+        # each size is reduced from the previous, larger, one
+        image = image.copy()
+        image.thumbnail((size, size), reducing_gap=2.0)
+        for variant_ext in (ext, ".webp"):
+            path = os.path.join(directory, variant_name(image_file, size, variant_ext))
+            tmp = path + ".tmp"
+            image.save(tmp, format=FORMATS_BY_EXT.get(variant_ext, "WEBP"), quality=85)
+            os.replace(tmp, path)
+    return image_file
+
+
+def remove_avatar(image_file, directory):
+    """
+    Remove all the files of an avatar.
+
+    Args:
+        image_file (str): The name stored in User.image_file.
+        directory (str): The directory holding the files.
+    """
+    if not image_file or image_file == DEFAULT_AVATAR:
+        return
+    stem, _ = os.path.splitext(image_file)
+    paths = [os.path.join(directory, image_file)] + glob.glob(os.path.join(directory, glob.escape(stem) + "_*"))
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _process_and_assign(app, data, user_id):
+    from web_app import db
+    from web_app.models import User
+    with app.app_context():
+        try:
+            directory = _pictures_dir(app)
+            image_file = process_avatar(data, directory,
+                                        app.config.get("AVATAR_MAX_PIXELS", 4096 * 4096))
+            user = db.session.get(User, user_id)
+            if user is None:
+                return
+            previous = user.image_file
+            user.image_file = image_file
+            db.session.commit()
+            if previous != image_file and not User.query.filter_by(image_file=previous).first():
+                remove_avatar(previous, directory)
+        except Exception:
+            logger.exception("processing the avatar of user %s failed", user_id)
+            db.session.rollback()
+
+
+def schedule_avatar(form_picture, user_id):
+    """
+    Validate an uploaded picture and process it in the background.
+
+    Args:
+        form_picture: The uploaded picture file.
+        user_id (int): The id of the user the picture is for.
+
+    Returns:
+        Future: The processing job.
+
+    Raises:
+        ValueError: If the picture is not acceptable, with a message for the user.
+    """
+    app = current_app._get_current_object()
+    data = form_picture.read()
+    open_upload(data, app.config.get("AVATAR_MAX_PIXELS", 4096 * 4096))
+    return _get_executor(app).submit(_process_and_assign, app, data, user_id)
+
+
+@lru_cache(maxsize=4096)
+def _exists(path):
+    # avatar files are immutable once written, their existence can be cached
+    return os.path.exists(path)
+
+
+def avatar_url(image_file, size=BASE_SIZE, ext=None):
+    """
+    Get the URL of a size of an avatar, for templates.
+
+    Pictures uploaded before avatars were processed only exist in one size, their
+    URL is returned whatever the size asked for, unless a specific format is asked.
+
+    Args:
+        image_file (str): The name stored in User.image_file.
+        size (int, optional): The size in pixels. Defaults to 125.
+        ext (str, optional): The extension of the format, e.g. ".webp".
+
+    Returns:
+        str: The URL, None if the format was asked for and does not exist.
+    """
+    name = variant_name(image_file, size, ext)
+    if name == image_file or _exists(os.path.join(_pictures_dir(current_app), name)):
+        return url_for("static", filename="profile_pics/" + name)
+    if ext is not None:
+        return None
+    return url_for("static", filename="profile_pics/" + image_file)
@@ -2,15 +2,20 @@
 This module defines routes for user-related functionalities, including registration,
 login, account management, and password reset.
 """
-from flask import render_template, url_for, flash, redirect, request, abort, Blueprint, session
-from web_app import db, bcrypt
+from flask import (render_template, url_for, flash, redirect, request, abort,
+                   Blueprint, session, current_app)
+from web_app import db, hasher, cache, account_purger
 from web_app.users.forms import (RegistrationForm, LoginForm, UpdateForm,
 RequestResetForm, ResetPasswordForm)
 import email_validator
+from web_app.conditional import conditional, user_posts_version
 from web_app.models import User, Post
+from web_app.models.loaders import load_with
+from web_app.models.pagination import keyset_paginate, keyset_requested
 from flask_login import login_user, current_user, logout_user, login_required
-from web_app.users.utils import (save_picture, send_reset_email,
+from web_app.users.utils import (send_reset_email,
                                 send_confirmation_email, verify_email_token)
+from web_app.users.avatars import avatar_url, schedule_avatar
 
 users = Blueprint("users", __name__)
 
@@ -30,7 +35,7 @@ def register():
         return redirect(url_for('main.home'))
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_pwd = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_pwd = hasher.hash(form.password.data)
         user_data ={
             "username": form.username.data,
             "email": form.email.data,
@@ -95,9 +100,10 @@ def login():
         return redirect(url_for('main.home'))
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        user = User.query.filter_by(email=form.email.data, deleted_at=None).first()
         if user:
             if user.is_verified and user.verify_pwd(form.password.data):
+                db.session.commit()
                 login_user(user, form.remember.data)
                 next_page = request.args.get('next')
                 return redirect(next_page) if next_page else redirect(url_for('main.home'))
@@ -134,17 +140,22 @@ def account():
     if request.method == "POST":
         if form.validate_on_submit():
             if form.picture.data:
-                picture_file = save_picture(form.picture.data)
-                current_user.image_file = picture_file
-            current_user.username = form.username.data
-            current_user.email = form.email.data
+                try:
+                    schedule_avatar(form.picture.data, current_user.id)
+                except ValueError as e:
+                    flash(str(e), "danger")
+                    return redirect(url_for("users.account"))
+            # current_user is a read-only snapshot, the row is updated
+            user = db.session.get(User, current_user.id)
+            user.username = form.username.data
+            user.email = form.email.data
             db.session.commit()
             flash("Your account has been updated!", "success")
             return redirect(url_for("main.home"))
     elif request.method == "GET":
         form.username.data= current_user.username
         form.email.data = current_user.email
-    image_file = url_for('static', filename='profile_pics/' + current_user.image_file)
+    image_file = avatar_url(current_user.image_file, 250)
     return render_template("account.html", title="account",
                                                 image_file=image_file, form=form)
 
@@ -154,19 +165,25 @@ def account_delete():
     """
     Handle account deletion.
 
-    Deletes the current user's account from the database.
+    Deletes the current user's account from the database, or schedules the
+    purge of a large account, and logs the user out.
 
     Returns:
         Redirects to the home page.
     """
     user_id = current_user.id
     user = User.query.get_or_404(user_id)
-    db.session.delete(user)
-    db.session.commit()
-    flash("You have successfully deleted your Account", "success")
+    deleted = account_purger.delete_account(user)
+    logout_user()
+    if deleted:
+        flash("You have successfully deleted your Account", "success")
+    else:
+        flash("Your Account has been deleted, your posts will be removed shortly", "success")
     return redirect(url_for("main.home"))
 
 @users.route("/user/<string:username>")
+@conditional(user_posts_version, per_user=True)
+@cache.cached(tags=lambda username: ["users", f"user:{username}"])
 def user_posts(username):
     """
     Display posts by a specific user.
@@ -177,10 +194,15 @@ def user_posts(username):
     Returns:
         Renders the user posts page with the user's posts.
     """
+    user = User.query.filter_by(username=username, deleted_at=None).first_or_404()
+    query = load_with(Post.query, "author_page").filter_by(author=user)
+    if keyset_requested():
+        posts = keyset_paginate(query, (Post.date_posted, Post.id),
+                                cursor=request.args.get("cursor"), per_page=5,
+                                count=current_app.config["PAGINATION_COUNT"])
+        return render_template("user_posts.html", posts=posts, user=user)
     page = request.args.get("page", 1, type=int)
-    user = User.query.filter_by(username=username).first_or_404()
-    posts = Post.query.filter_by(author=user)\
-    .order_by(Post.date_posted.desc())\
+    posts = query.order_by(Post.date_posted.desc())\
     .paginate(page=page, per_page=5)
     return render_template("user_posts.html", posts=posts, user=user)
 
@@ -228,8 +250,7 @@ def reset_token(token):
         return redirect(url_for("users.reset_request"))
     form = ResetPasswordForm()
     if form.validate_on_submit():
-        hashed_pwd = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
-        user.password = hashed_pwd
+        user.set_pwd(form.password.data)
         db.session.commit()
         flash(f'Your Account has been updated! You are now able to login!', 'success')
         return redirect(url_for("users.login"))
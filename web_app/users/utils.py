@@ -1,46 +1,16 @@
 """
-This module provides utility functions for handling images and sending emails.
+This module provides utility functions for sending emails.
 """
-import os
-import secrets
-from PIL import Image
 from flask import url_for, current_app
 from flask_mail import Message
-from web_app import mail
+from web_app import mail_queue
 from itsdangerous import URLSafeTimedSerializer as Serializer
 
-def save_picture(form_picture):
-    """
-    Save the user's profile picture.
-
-    Generates a random hex to use as the filename, resizes the image to 125x125 pixels,
-    and saves it to the 'static/profile_pics' directory.
-
-    Args:
-        form_picture: The uploaded picture file.
-
-    Returns:
-        str: The filename of the saved picture.
-    """
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(current_app.root_path, "static/profile_pics", picture_fn)
-
-    outpust_size = (125, 125)
-    i = Image.open(form_picture)
-    i.thumbnail(outpust_size)
-
-    i.save(picture_path)
-
-    return picture_fn
-
-
 def send_reset_email(user):
     """
     Send a password reset email to the user.
 
-    Generates a reset token and sends an email with the reset link.
+    Generates a reset token and queues an email with the reset link.
 
     Args:
         user: The user requesting the password reset.
@@ -54,7 +24,7 @@ def send_reset_email(user):
 
 If you did not make this request then simply ignore this email and no change will be made.
 '''
-    mail.send(msg)
+    mail_queue.send(msg)
 
 
 
@@ -100,7 +70,7 @@ def send_confirmation_email(user_data):
     """
     Send an email confirmation email to the user.
 
-    Generates a confirmation token and sends an email with the confirmation link.
+    Generates a confirmation token and queues an email with the confirmation link.
 
     Args:
         user_data: A dictionary containing the user's data (username, email, password).
@@ -112,4 +82,4 @@ def send_confirmation_email(user_data):
 {url_for('users.confirm_email', token=token, _external=True)}
 If you did not make this request then simply ignore this email and no change will be made. Please do not reply to this email
 '''
-    mail.send(msg)
+    mail_queue.send(msg)